@@ -0,0 +1,199 @@
+import logging
+import re
+import threading
+from collections import Counter, defaultdict
+from typing import NamedTuple
+import numpy as np
+import yaml
+
+# -----------------------
+#   Intent prototypes
+# -----------------------
+# Trivial intents never need retrieval or a conversation summary
+PROTOTYPES = {
+    "greeting": ["hi", "hello there", "hey", "good morning", "good evening", "hi how are you"],
+    "thanks": ["thanks", "thank you so much", "thanks a lot", "appreciate it", "great thank you"],
+    "acknowledgement": ["ok", "okay sure", "got it", "sounds good", "cool", "alright noted", "perfect"],
+    "goodbye": ["bye", "see you later", "talk to you soon", "have a nice day", "good night"],
+    "inquiry": [
+        "do you have this car in stock",
+        "what is the price of the suv",
+        "can I book a test drive",
+        "what are your opening hours",
+        "is financing available",
+        "I want to buy a used car",
+        "how many miles does it have",
+        "tell me more about this model",
+    ],
+}
+TRIVIAL_INTENTS = ("greeting", "thanks", "acknowledgement", "goodbye")
+
+TRIVIAL_WORDS = {
+    "greeting": {"hi", "hii", "hello", "hey", "hiya", "morning", "afternoon", "evening", "there", "good"},
+    "thanks": {"thanks", "thank", "you", "thx", "ty", "cheers", "much", "so", "a", "lot"},
+    "acknowledgement": {"ok", "okay", "k", "kk", "sure", "cool", "great", "nice", "awesome", "perfect",
+                        "alright", "fine", "noted", "got", "it", "lol", "haha"},
+    "goodbye": {"bye", "goodbye", "later", "see", "you", "good", "night", "take", "care"},
+}
+
+# "[User: Jane | Mobile: +1555...] hi" -> "hi"
+SENDER_TAG = re.compile(r"^\[User:[^\]]*\]\s*")
+
+
+class IntentDecision(NamedTuple):
+    intent: str
+    fast_path: bool
+    method: str   # "rule" | "prototype" | "default"
+    score: float
+
+
+class IntentRouter:
+    """
+    Cheap pre-classification in front of create_react_agent.
+    Rules catch emoji-only and stock small-talk messages; anything short
+    that the rules don't settle is compared against intent prototypes
+    by embedding similarity. Only trivial intents take the fast path.
+    """
+
+    def __init__(self, config_path: str = "config.yaml", embeddings=None, load_embeddings=None):
+        with open(config_path, "r") as file:
+            config = yaml.safe_load(file)
+        intent_config = config.get("intent") or {}
+
+        self.enabled = intent_config.get("enabled", True)
+        self.max_fast_words = intent_config.get("max_fast_words", 6)
+        self.prototype_threshold = intent_config.get("prototype_threshold", 0.6)
+        self.prototype_margin = intent_config.get("prototype_margin", 0.05)
+        self.config_path = config_path
+        self._embeddings = embeddings
+        self._load_embeddings = load_embeddings
+        self._prototypes = None
+        self._prototypes_lock = threading.Lock()
+
+        self.path_counts = Counter()
+        self.path_latency_ms = defaultdict(float)
+
+    # -----------------------
+    #   Classification
+    # -----------------------
+    @staticmethod
+    def normalize(message: str) -> str:
+        text = SENDER_TAG.sub("", str(message or "")).lower()
+        return " ".join(re.findall(r"[a-z0-9]+", text))
+
+    def classify(self, message: str) -> IntentDecision:
+        if not self.enabled:
+            return IntentDecision("inquiry", False, "default", 0.0)
+
+        raw = SENDER_TAG.sub("", str(message or "")).strip()
+        text = self.normalize(message)
+        words = text.split()
+
+        # Emoji, punctuation or nothing at all: 👍, 🙏, "!!"
+        if not words:
+            return IntentDecision("acknowledgement", True, "rule", 1.0)
+
+        # Questions, numbers (stock ids, prices, years) and long messages need the full path
+        if "?" in raw or any(ch.isdigit() for ch in text) or len(words) > self.max_fast_words:
+            return IntentDecision("inquiry", False, "rule", 1.0)
+
+        for intent, vocabulary in TRIVIAL_WORDS.items():
+            if all(word in vocabulary for word in words):
+                return IntentDecision(intent, True, "rule", 1.0)
+
+        return self._classify_by_prototype(text)
+
+    def _classify_by_prototype(self, text: str) -> IntentDecision:
+        prototypes = self._load_prototypes()
+        if prototypes is None:
+            return IntentDecision("inquiry", False, "default", 0.0)
+
+        labels, matrix = prototypes
+        vector = np.asarray(self._embeddings.embed_query(text), dtype=np.float32)
+        vector /= max(float(np.linalg.norm(vector)), 1e-12)
+        similarities = matrix @ vector
+
+        # Best prototype per intent
+        best = {}
+        for label, similarity in zip(labels, similarities):
+            best[label] = max(best.get(label, -1.0), float(similarity))
+
+        intent = max(best, key=best.get)
+        score = best[intent]
+        fast_path = (
+            intent in TRIVIAL_INTENTS
+            and score >= self.prototype_threshold
+            and score - best.get("inquiry", -1.0) >= self.prototype_margin
+        )
+        return IntentDecision(intent if fast_path else "inquiry", fast_path, "prototype", score)
+
+    def warm(self) -> bool:
+        """Embed the prototypes now rather than on the first unclear message."""
+        return self._load_prototypes() is not None
+
+    def share_embeddings(self, embeddings=None, load_embeddings=None):
+        """Use another component's model instead of loading one, if none is loaded yet."""
+        # No lock: called from the event loop while a thread may be embedding the prototypes
+        if self._embeddings is None and embeddings is not None:
+            self._embeddings = embeddings
+        if load_embeddings is not None:
+            self._load_embeddings = load_embeddings
+
+    def _load_prototypes(self):
+        with self._prototypes_lock:
+            if self._prototypes is None:
+                try:
+                    if self._embeddings is None:
+                        if self._load_embeddings is not None:
+                            self._embeddings = self._load_embeddings()
+                        else:
+                            from rag.utils import Utils
+                            self._embeddings = Utils(self.config_path).initialize_embeddings()
+                    labels = [label for label, phrases in PROTOTYPES.items() for _ in phrases]
+                    phrases = [phrase for phrases in PROTOTYPES.values() for phrase in phrases]
+                    matrix = np.asarray(self._embeddings.embed_documents(phrases), dtype=np.float32)
+                    matrix /= np.clip(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12, None)
+                    self._prototypes = (labels, matrix)
+                except Exception as e:
+                    # Rules keep working; unclear messages fall through to the full path
+                    logging.error(f"Intent prototypes unavailable, using rules only: {e}")
+                    self._prototypes = False
+        return self._prototypes or None
+
+    # -----------------------
+    #   Stats
+    # -----------------------
+    def record(self, decision: IntentDecision, elapsed_ms: float):
+        path = "fast" if decision.fast_path else "full"
+        self.path_counts[path] += 1
+        self.path_latency_ms[path] += elapsed_ms
+
+        total = sum(self.path_counts.values())
+        summary = ", ".join(
+            f"{name}={count} ({count / total:.0%}, avg {self.path_latency_ms[name] / count:.0f}ms)"
+            for name, count in sorted(self.path_counts.items())
+        )
+        logging.info(
+            f"🚦 {path} path for {decision.intent} ({decision.method}, {decision.score:.2f}) "
+            f"in {elapsed_ms:.0f}ms | {summary}"
+        )
+
+
+_router: IntentRouter | None = None
+_router_lock = threading.Lock()
+
+
+def get_intent_router(embeddings=None, load_embeddings=None) -> IntentRouter:
+    """
+    embeddings (or load_embeddings, called on the first unclear message)
+    share another component's model, e.g. the retriever's, instead of
+    loading a second copy. They are attached to the router whenever it
+    has no model yet, not only on first use.
+    """
+    global _router
+    with _router_lock:
+        if _router is None:
+            _router = IntentRouter(embeddings=embeddings, load_embeddings=load_embeddings)
+        elif embeddings is not None or load_embeddings is not None:
+            _router.share_embeddings(embeddings, load_embeddings)
+        return _router
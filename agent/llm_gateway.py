@@ -0,0 +1,267 @@
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+import numpy as np
+
+
+# -----------------------
+#   Circuit breaker
+# -----------------------
+class CircuitBreaker:
+    """
+    closed: calls flow. After `failure_threshold` consecutive failures the
+    breaker opens and the provider is skipped for `reset_timeout` seconds;
+    then one probe call is let through (half-open) and its outcome decides.
+    """
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.probe_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self.probe_in_flight:
+            self.probe_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.probe_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self.probe_in_flight = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+
+class Provider:
+    def __init__(self, name: str, llm, breaker: CircuitBreaker, window: int = 200):
+        self.name = name
+        self.llm = llm
+        self.breaker = breaker
+        self.latencies = deque(maxlen=window)
+        self.calls = 0
+        self.failures = 0
+        self.wins = 0
+
+    def latency_percentile(self, q: float, min_samples: int) -> float | None:
+        if len(self.latencies) < min_samples:
+            return None
+        return float(np.percentile(self.latencies, q))
+
+
+def build_chat_model(spec: dict, defaults: dict, timeout: float):
+    """
+    A chat model for one provider entry. type "groq" uses ChatGroq; "openai"
+    covers any OpenAI-compatible endpoint (set base_url).
+    Client-side retries are off: the gateway decides when to try elsewhere.
+    """
+    settings = {**defaults, **spec}
+    api_key = os.getenv(settings["api_key_env"]) if settings.get("api_key_env") else None
+    provider_type = settings.get("type", "groq")
+
+    if provider_type == "groq":
+        from langchain_groq import ChatGroq
+        return ChatGroq(
+            model=settings["model_name"],
+            temperature=settings["temperature"],
+            max_tokens=settings["max_tokens"],
+            api_key=api_key,
+            base_url=settings.get("base_url"),
+            timeout=timeout,
+            max_retries=0,
+        )
+    if provider_type == "openai":
+        from langchain_openai import ChatOpenAI
+        return ChatOpenAI(
+            model=settings["model_name"],
+            temperature=settings["temperature"],
+            max_tokens=settings["max_tokens"],
+            api_key=api_key or "unused",
+            base_url=settings.get("base_url"),
+            timeout=timeout,
+            max_retries=0,
+        )
+    raise ValueError(f"Unknown LLM provider type '{provider_type}'")
+
+
+# -----------------------
+#   Gateway
+# -----------------------
+class LLMGateway:
+    """
+    Chat-model stand-in (ainvoke) in front of one primary and optional
+    fallback providers:
+
+    - every call has a deadline;
+    - if the first provider has not answered after its recent
+      hedge_percentile latency, the same request is also sent to the next
+      provider and the first answer wins (the other is cancelled);
+    - a provider that fails outright is replaced immediately;
+    - providers whose circuit breaker is open are skipped.
+    """
+
+    def __init__(self, providers: list[Provider], deadline: float = 20.0, hedge_percentile: float = 95,
+                 hedge_min_delay: float = 1.5, hedge_min_samples: int = 20):
+        if not providers:
+            raise ValueError("LLMGateway needs at least one provider")
+        self.providers = providers
+        self.deadline = deadline
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_min_samples = hedge_min_samples
+        self.hedges = 0
+        self.deadline_exceeded = 0
+
+    @classmethod
+    def from_config(cls, config: dict) -> "LLMGateway":
+        gateway_config = config.get("llm_gateway") or {}
+        deadline = gateway_config.get("deadline", 20.0)
+        primary = config["model"]["groq"]
+        defaults = {"temperature": primary["temperature"], "max_tokens": primary["max_tokens"]}
+
+        specs = [{"name": "groq", "type": "groq", **primary}] + list(gateway_config.get("fallbacks") or [])
+        providers = [
+            Provider(
+                spec.get("name") or spec["model_name"],
+                build_chat_model(spec, defaults, deadline),
+                CircuitBreaker(
+                    gateway_config.get("breaker_failures", 3),
+                    gateway_config.get("breaker_reset", 30.0)
+                )
+            )
+            for spec in specs
+        ]
+        return cls(
+            providers,
+            deadline=deadline,
+            hedge_percentile=gateway_config.get("hedge_percentile", 95),
+            hedge_min_delay=gateway_config.get("hedge_min_delay", 1.5),
+            hedge_min_samples=gateway_config.get("hedge_min_samples", 20),
+        )
+
+    def hedge_delay(self, provider: Provider) -> float:
+        observed = provider.latency_percentile(self.hedge_percentile, self.hedge_min_samples)
+        return max(self.hedge_min_delay, observed or self.hedge_min_delay)
+
+    async def _call(self, provider: Provider, messages, kwargs):
+        provider.calls += 1
+        started = time.perf_counter()
+        try:
+            result = await provider.llm.ainvoke(messages, **kwargs)
+        except asyncio.CancelledError:
+            # Lost the hedge race (or the deadline passed); not the provider's fault.
+            # It would have taken at least this long: dropping the sample leaves
+            # only the fast calls, and the hedge delay would keep shrinking
+            provider.latencies.append(time.perf_counter() - started)
+            if provider.breaker.probe_in_flight:
+                provider.breaker.probe_in_flight = False
+            raise
+        except Exception:
+            provider.failures += 1
+            provider.breaker.record_failure()
+            raise
+        provider.latencies.append(time.perf_counter() - started)
+        provider.breaker.record_success()
+        return result
+
+    async def ainvoke(self, input, config=None, **kwargs):
+        if config is not None:
+            kwargs["config"] = config
+        # Lazy, so a half-open breaker only spends its probe when actually called
+        candidates = (provider for provider in self.providers if provider.breaker.allow())
+        loop = asyncio.get_running_loop()
+        deadline_at = loop.time() + self.deadline
+
+        pending = {}
+        errors = []
+
+        def launch() -> bool:
+            provider = next(candidates, None)
+            if provider is None:
+                return False
+            pending[asyncio.create_task(self._call(provider, input, kwargs))] = provider
+            return True
+
+        if not launch():
+            raise RuntimeError("All LLM providers are unavailable (circuit open)")
+
+        try:
+            delay = self.hedge_delay(next(iter(pending.values())))
+            hedge_at = loop.time() + delay
+            while pending:
+                now = loop.time()
+                if now >= deadline_at:
+                    break
+                wake_at = hedge_at if hedge_at is not None else deadline_at
+                done, _ = await asyncio.wait(
+                    pending, timeout=max(0.0, min(wake_at, deadline_at) - now),
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+
+                for task in done:
+                    provider = pending.pop(task)
+                    if task.exception() is None:
+                        provider.wins += 1
+                        return task.result()
+                    errors.append(f"{provider.name}: {task.exception()!r}")
+                    logging.warning(f"LLM provider {provider.name} failed: {task.exception()}")
+
+                if done and not pending:
+                    # Outright failure: go to the next provider straight away
+                    if not launch():
+                        break
+                    delay = self.hedge_delay(next(iter(pending.values())))
+                    hedge_at = loop.time() + delay
+                elif not done and hedge_at is not None and loop.time() >= hedge_at:
+                    # Slow: hedge with the next provider, keep the first one running
+                    if launch():
+                        self.hedges += 1
+                        logging.info(f"🔀 LLM hedge after {delay:.2f}s")
+                    hedge_at = None
+        finally:
+            for task in pending:
+                task.cancel()
+
+        if errors and not pending:
+            raise RuntimeError("All LLM providers failed: " + "; ".join(errors))
+        self.deadline_exceeded += 1
+        for provider in pending.values():
+            provider.failures += 1
+            provider.breaker.record_failure()
+        raise TimeoutError(f"LLM call exceeded its {self.deadline}s deadline")
+
+    def stats(self) -> dict:
+        return {
+            "hedges": self.hedges,
+            "deadline_exceeded": self.deadline_exceeded,
+            "providers": {
+                provider.name: {
+                    "state": provider.breaker.state,
+                    "calls": provider.calls,
+                    "failures": provider.failures,
+                    "wins": provider.wins,
+                    "p50_s": provider.latency_percentile(50, 1),
+                    "p95_s": provider.latency_percentile(95, 1),
+                }
+                for provider in self.providers
+            },
+        }
@@ -1,22 +1,30 @@
 import logging
 import os
 import asyncio
-from pyexpat.errors import messages
+import threading
+import time
 import traceback
 from typing import Annotated, Sequence, TypedDict, Optional
 import yaml
 from langchain_core.messages import (AIMessage, BaseMessage, HumanMessage, SystemMessage)
-from langchain_groq import ChatGroq
-from langgraph.graph import StateGraph
-from langgraph.graph.message import add_messages
-from datetime import datetime, timedelta, timezone
-from database.create_data import patch_lead_sentiment 
-from client.twilio_client import send_whatsapp_message
+from datetime import datetime, timedelta
+from service.sessions import create_session_store
 from rag.retrieve import RagRetriever
+from rag.context import ContextPacker
+from agent.intent import IntentDecision, get_intent_router
+from agent.stages import StageGraph
+from agent.llm_gateway import LLMGateway
+from service.metrics import INTENT_TOTAL, tenant_label, timed
 
 # -----------------------
 #   Lead State
 # -----------------------
+def add_messages(left, right):
+    # LangGraph's reducer, imported when the graph first runs rather than at import
+    from langgraph.graph.message import add_messages as reducer
+    return reducer(left, right)
+
+
 class LeadState(TypedDict):
     messages: Annotated[Sequence[BaseMessage], add_messages]
     client_mobile_number: str
@@ -31,26 +39,51 @@ class LeadState(TypedDict):
 # -----------------------
 #  Global Session Manager
 # -----------------------
-ACTIVE_SESSIONS = {}  # key: user_mobile_number, value: LeadState object
+# Per-user conversation and activity: in this process (memory) or shared
+# by every worker through Postgres, per sessions.backend
+_session_store = None
+_session_settings: dict | None = None
+
+
+def get_session_settings() -> dict:
+    global _session_settings
+    if _session_settings is None:
+        with open("config.yaml", "r") as file:
+            _session_settings = yaml.safe_load(file).get("sessions") or {}
+    return _session_settings
+
+
+def get_session_store():
+    global _session_store
+    if _session_store is None:
+        _session_store = create_session_store({"sessions": get_session_settings()})
+    return _session_store
 
 # -----------------------
 #  Async LLM Provider
 # -----------------------
-async def get_llm_async() -> ChatGroq:
-    try:
-        with open("config.yaml", "r") as file:
-            config = yaml.safe_load(file)
+_llm_gateway: LLMGateway | None = None
 
-        llm = ChatGroq(
-            model=config["model"]["groq"]["model_name"],
-            temperature=config["model"]["groq"]["temperature"],
-            max_tokens=config["model"]["groq"]["max_tokens"],
-            api_key=os.getenv(config["model"]["groq"]["api_key_env"]),
-        )
-        return llm
+
+async def get_llm_async() -> LLMGateway:
+    """
+    The shared LLM gateway: Groq plus any configured fallbacks, with
+    deadlines, hedging and per-provider circuit breakers.
+    """
+    global _llm_gateway
+    try:
+        if _llm_gateway is None:
+            with open("config.yaml", "r") as file:
+                config = yaml.safe_load(file)
+            _llm_gateway = LLMGateway.from_config(config)
+        return _llm_gateway
     except Exception as e:
         logging.error(f"Error loading LLM config or creating LLM instance: {e}")
         raise
+
+
+def llm_gateway_stats() -> dict | None:
+    return _llm_gateway.stats() if _llm_gateway is not None else None
     
 # -----------------------
 #   PROMPTS
@@ -107,7 +140,7 @@ async def summarize_conversation(messages: list[BaseMessage]) -> str:
         logging.error(f"Error summarizing conversation: {e}")
         return ""
 
-async def extract_sentiment_from_summary(summary_text: str, llm: ChatGroq):
+async def extract_sentiment_from_summary(summary_text: str, llm: LLMGateway):
     try:
         prompt = f"""
 Analyze the sentiment of this car dealership lead summary.
@@ -139,6 +172,64 @@ Summary:
         logging.error(f"Failed to parse sentiment JSON or extract sentiment: {e}. Raw output: {raw if 'raw' in locals() else 'N/A'}")
         return "Neutral", 0.0
 
+_rag_retriever: RagRetriever | None = None
+_rag_retriever_lock = threading.Lock()
+
+
+def get_rag_retriever() -> RagRetriever:
+    """
+    One retriever (embedding model, reranker, vector store client) shared
+    by every message instead of loading them per call.
+    """
+    global _rag_retriever
+    with _rag_retriever_lock:
+        if _rag_retriever is None:
+            _rag_retriever = RagRetriever()
+        return _rag_retriever
+
+
+def retrieve_context(query_text: str, customer: str) -> str:
+    """
+    Retrieve, rerank and pack the customer's chunks for one message.
+    Blocking; the agent runs it in a worker thread.
+    """
+    logging.debug(f"Performing RAG retrieval for {customer}: {query_text!r}")
+    rag_retriever = get_rag_retriever()
+    retrieved_text = rag_retriever.query(
+                                            query_text=query_text, 
+                                            customer=customer
+                                        )
+
+    # Dedup overlapping chunks and pack them by rerank score into the token budget
+    retrieved_info, stats = ContextPacker(rag_retriever.config).pack(retrieved_text or [])
+    logging.info(
+        f"📦 Context: {stats['packed']}/{stats['retrieved']} chunks "
+        f"({stats['overlapping']} overlapping, {stats['over_budget']} over budget), "
+        f"{stats['tokens']} tokens vs {stats['naive_tokens']} unpacked, "
+        f"saved {stats['naive_tokens'] - stats['tokens']}"
+    )
+    logging.debug(f"Retrieved info: {retrieved_info}")
+    return retrieved_info
+
+
+FULL_PATH = IntentDecision("inquiry", False, "default", 0.0)
+
+_stage_timeouts = None
+
+
+def get_stage_timeouts() -> dict:
+    global _stage_timeouts
+    if _stage_timeouts is None:
+        with open("config.yaml", "r") as file:
+            stages = yaml.safe_load(file).get("agent_stages") or {}
+        _stage_timeouts = {
+            "intent": stages.get("intent_timeout", 1.0),
+            "retrieval": stages.get("retrieval_timeout", 5.0),
+            "summary": stages.get("summary_timeout", 4.0),
+            "llm": stages.get("llm_timeout", 30.0),
+        }
+    return _stage_timeouts
+
 # -----------------------
 #   react Agent Node (async)
 # -----------------------
@@ -147,55 +238,91 @@ async def create_react_agent(state: LeadState):
         llm = await get_llm_async()
         user_messages = list(state["messages"])
         latest_user_message = None
+        last_bot_message = None
 
-        # Find the latest human message
+        # Find the latest human message, and the bot's last reply before it
         for msg in reversed(user_messages):
-            if isinstance(msg, HumanMessage):
-                latest_user_message = msg.content
+            if latest_user_message is None:
+                if isinstance(msg, HumanMessage):
+                    latest_user_message = msg.content
+            elif isinstance(msg, AIMessage):
+                last_bot_message = msg.content
                 break
 
-        retrieved_info = ""
-        logging.info("Performing RAG retrieval...")
-        logging.info("TYPE OF USER MESSAGE:", type(latest_user_message))
-        logging.info("RAW VALUE:", repr(latest_user_message))
-        rag_retriever = RagRetriever()
-        retrieved_text = rag_retriever.query(
-                                                query_text=str(latest_user_message), 
-                                                customer=state.get("client_mobile_number")
-                                            )
-        retrieved_info = " ".join([doc["document"] for doc in retrieved_text])
-        print("Customer:", state.get("client_mobile_number"))
-        retrieved_info = "\n\nRetrieved info:\n" + retrieved_info
-        logging.info(f"Retrieved info: {retrieved_info}")
-        system_prompt = SYSTEM_PROMPT_TEMPLATE + retrieved_info
-        retrieved_info = ""
-
-        # Prepare messages with system prompt and conversation history
-        messages = [SystemMessage(content=system_prompt)]
-
-        # Add user messages after system and retrieved info
-        summary = await summarize_conversation(user_messages)
-        messages.extend(summary)
-        if latest_user_message:
-            messages.append(HumanMessage(content=latest_user_message))
-
-
-        # Call LLM
-        if hasattr(llm, "ainvoke"):
-            result = await llm.ainvoke(input=messages)
-        else:
-            result = await asyncio.to_thread(llm.invoke, input=messages)
+        # Small talk and acknowledgements skip retrieval and the summary call
+        started = time.perf_counter()
+        # Shares the retriever's embedding model, loading the retriever if a message beats the prewarm
+        intent_router = get_intent_router(load_embeddings=lambda: get_rag_retriever().embeddings)
+        timeouts = get_stage_timeouts()
+
+        async def classify(_):
+            return await asyncio.to_thread(intent_router.classify, str(latest_user_message))
+
+        async def retrieve(inputs):
+            if inputs["intent"].fast_path:
+                return None
+            return await asyncio.to_thread(retrieve_context, str(latest_user_message), state.get("client_mobile_number"))
+
+        async def summarize(inputs):
+            if inputs["intent"].fast_path:
+                return None
+            return await summarize_conversation(user_messages)
+
+        async def answer(inputs):
+            # The system prompt is sent byte-for-byte on every turn so the
+            # provider can cache it; per-turn text goes in later messages
+            messages = [SystemMessage(content=SYSTEM_PROMPT_TEMPLATE)]
+
+            if not inputs["intent"].fast_path:
+                # Conversation summary, then retrieved context, then the message itself
+                if inputs["summary"]:
+                    messages.append(SystemMessage(content=f"Conversation summary:\n{inputs['summary']}"))
+                messages.append(SystemMessage(content=inputs["retrieval"] or "Retrieved info:\nNone"))
+            elif last_bot_message:
+                # "Sure" / "ok" answers the bot's last question; keep that question in view
+                messages.append(AIMessage(content=last_bot_message))
+
+            if latest_user_message:
+                messages.append(HumanMessage(content=latest_user_message))
+
+            # Call LLM
+            if hasattr(llm, "ainvoke"):
+                return await llm.ainvoke(input=messages)
+            return await asyncio.to_thread(llm.invoke, input=messages)
+
+        # Retrieval and summarisation are independent, so they run side by side;
+        # a late one is dropped (answer without summary / without context)
+        graph = StageGraph("react_agent")
+        graph.add("intent", classify, timeout=timeouts["intent"], fallback=FULL_PATH)
+        graph.add("retrieval", retrieve, after=["intent"], timeout=timeouts["retrieval"], fallback="")
+        graph.add("summary", summarize, after=["intent"], timeout=timeouts["summary"], fallback="")
+        graph.add("llm", answer, after=["intent", "retrieval", "summary"], timeout=timeouts["llm"], fallback=None)
+        results = await graph.run()
+        decision = results["intent"]
+
+        result = results["llm"]
+        if result is None:
+            raise RuntimeError(f"LLM stage {graph.timings['llm'].status}")
+
+        ai_content = getattr(result, "content", result)
+        ai_msg = AIMessage(content=str(ai_content))
 
-        # update last active time and reset save flag
-        # 1. Update the Global Manager
+        # Record the turn; the lead monitor enriches the lead once the user goes idle
         user_phone = state.get("user_mobile_number")
         if user_phone:
-            ACTIVE_SESSIONS[user_phone] = state
-        state["last_active"] = datetime.now(timezone.utc)
-        state["insert_lead"] = False
+            try:
+                turn = [msg for msg in user_messages[-1:] if isinstance(msg, HumanMessage)] + [ai_msg]
+                await get_session_store().record_turn(
+                    user_phone, state.get("client_mobile_number"), state.get("username"), turn
+                )
+            except Exception as e:
+                logging.error(f"Session update failed for {user_phone}: {e}")
+
+        intent_router.record(decision, (time.perf_counter() - started) * 1000)
+        INTENT_TOTAL.labels(
+            tenant_label(state.get("client_mobile_number")), decision.intent, "fast" if decision.fast_path else "full"
+        ).inc()
 
-        ai_content = getattr(result, "content", result)
-        ai_msg = AIMessage(content=str(ai_content))
         return {"messages": [ai_msg]}
 
     except Exception as e:
@@ -213,62 +340,99 @@ async def human_response(state: LeadState):
 # -----------------------
 # Build Graph
 # -----------------------
-workflow = StateGraph(LeadState)
+_agent = None
+_agent_lock = threading.Lock()
 
-workflow.add_node("react_agent", create_react_agent)
-workflow.add_node("human_response", human_response)
 
-workflow.set_entry_point("react_agent")
-workflow.add_edge("human_response", "react_agent")
-workflow.add_edge("react_agent", "human_response")
+def get_agent():
+    """
+    The compiled agent graph. LangGraph is imported and the graph compiled
+    on first use (normally by prewarm), keeping it out of app import time.
+    """
+    global _agent
+    with _agent_lock:
+        if _agent is None:
+            from langgraph.graph import StateGraph
+
+            workflow = StateGraph(LeadState)
+
+            workflow.add_node("react_agent", create_react_agent)
+            workflow.add_node("human_response", human_response)
+
+            workflow.set_entry_point("react_agent")
+            workflow.add_edge("human_response", "react_agent")
+            workflow.add_edge("react_agent", "human_response")
+
+            _agent = workflow.compile(
+                interrupt_before=["human_response"]
+            )
+        return _agent
 
-agent = workflow.compile(
-    interrupt_before=["human_response"]
-)
+
+# -----------------------
+#   Prewarm
+# -----------------------
+async def prewarm() -> dict:
+    """
+    Load everything the first message would otherwise wait for: the
+    agent graph, the LLM gateway, the retriever (embedding model,
+    reranker, vector store) and the intent prototypes, which share the
+    retriever's embeddings. Returns seconds per component.
+    """
+    timings = {}
+
+    async def step(name, fn):
+        started = time.perf_counter()
+        result = await asyncio.to_thread(fn)
+        timings[name] = time.perf_counter() - started
+        return result
+
+    await step("agent_graph", get_agent)
+    started = time.perf_counter()
+    await get_llm_async()
+    timings["llm_gateway"] = time.perf_counter() - started
+    retriever = await step("retriever", get_rag_retriever)
+    await step("intent", lambda: get_intent_router(retriever.embeddings).warm())
+    return timings
 
 # -----------------------
 #   Save Task
 # -----------------------
 async def monitor_active_leads():
     """
-    ONE loop that watches EVERYONE in ACTIVE_SESSIONS.
+    Enrich leads whose conversations have gone idle. With the Postgres
+    session store every worker runs this loop; each idle session is
+    leased to one of them, so a lead is summarised once however many
+    workers or replicas are running.
     """
-    logging.info("🚀 Global lead monitor started.")
+    settings = get_session_settings()
+    idle = timedelta(minutes=settings.get("idle_minutes", 2))
+    poll_seconds = settings.get("poll_seconds", 10)
+    batch = settings.get("claim_batch", 10)
+    store = get_session_store()
+    logging.info(f"🚀 Lead monitor started ({type(store).__name__}).")
+
     while True:
         try:
-            now = datetime.now(timezone.utc)
-            # Create a list of keys to avoid 'dict changed size during iteration'
-            for phone in list(ACTIVE_SESSIONS.keys()):
-                state = ACTIVE_SESSIONS[phone]
-                
-                if state.get("insert_lead"): # Already patched
-                    continue
-
-                last_active = state.get("last_active")
-                if not last_active: continue
-
-                # 10 Minute Timeout (or 2 mins as per your recent snippet)
-                if now - last_active > timedelta(minutes=2):
-                    logging.info(f"⏰ Inactivity detected for {phone}. Patching...")
-                    
-                    summary = await summarize_conversation(state["messages"])
-                    llm = await get_llm_async()
-                    label, score = await extract_sentiment_from_summary(summary, llm)
-                    logging.info(f"📝 Summary: {summary}")
-                    logging.info(f"💡 Sentiment for {phone}: {label} ({score})")
-                    
-                    # 🔹 Execute the Patch
-                    await patch_lead_sentiment(
-                        phone_number=phone,
-                        summary=summary,
-                        sentiment_label=label,
-                        sentiment_score=score
-                    )
-                    
-                    state["insert_lead"] = True # Mark as done
-                    logging.info(f"✅ Successfully patched {phone}")
-
-            await asyncio.sleep(10) # Check all users every 10 seconds
+            for session in await store.claim_idle(idle, batch):
+                phone = session.user_phone
+                logging.info(f"⏰ Inactivity detected for {phone}. Patching...")
+                try:
+                    with timed("monitor_enrichment"):
+                        summary = await summarize_conversation(session.messages)
+                        llm = await get_llm_async()
+                        label, score = await extract_sentiment_from_summary(summary, llm)
+                        logging.debug(f"📝 Summary: {summary}")
+                        logging.info(f"💡 Sentiment for {phone}: {label} ({score})")
+
+                        # 🔹 Patch the lead and mark this activity as enriched
+                        if await store.complete(session, summary, label, score):
+                            logging.info(f"✅ Successfully patched {phone}")
+                except Exception as e:
+                    # Left unenriched; a later pass (after the lease expires) retries it
+                    logging.error(f"Enrichment failed for {phone}: {e}")
+
+            await asyncio.sleep(poll_seconds)
         except Exception as e:
             logging.error(f"Monitor error: {e}")
-            await asyncio.sleep(10)
\ No newline at end of file
+            await asyncio.sleep(poll_seconds)
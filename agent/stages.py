@@ -0,0 +1,90 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable
+from service.metrics import AGENT_STAGE_SECONDS
+
+
+@dataclass
+class Stage:
+    name: str
+    fn: Callable[[dict], Awaitable[Any]]
+    after: tuple = ()
+    timeout: float | None = None
+    fallback: Any = None
+
+
+@dataclass
+class StageTiming:
+    status: str       # "ok" | "timeout" | "error"
+    started_ms: float  # offset from the start of the graph
+    elapsed_ms: float
+
+
+class StageGraph:
+    """
+    A small DAG of async stages. A stage starts as soon as the stages it
+    depends on have finished, receives their results as a dict, and is
+    replaced by its fallback value when it times out or raises, so one
+    slow dependency degrades the answer instead of failing it.
+    """
+
+    def __init__(self, name: str = "stages"):
+        self.name = name
+        self.stages: dict[str, Stage] = {}
+        self.timings: dict[str, StageTiming] = {}
+
+    def add(self, name: str, fn, after=(), timeout: float | None = None, fallback=None) -> "StageGraph":
+        missing = [dep for dep in after if dep not in self.stages]
+        if missing:
+            raise ValueError(f"Stage '{name}' depends on unknown stages {missing}")
+        self.stages[name] = Stage(name, fn, tuple(after), timeout, fallback)
+        return self
+
+    async def run(self) -> dict:
+        """
+        Run every stage; returns {stage name: result or fallback}.
+        """
+        started = time.perf_counter()
+        tasks = {}
+
+        async def run_stage(stage: Stage):
+            inputs = {dep: await tasks[dep] for dep in stage.after}
+            stage_started = time.perf_counter()
+            try:
+                result = await asyncio.wait_for(stage.fn(inputs), stage.timeout)
+                status = "ok"
+            except asyncio.TimeoutError:
+                logging.warning(f"⏳ Stage {stage.name} timed out after {stage.timeout}s, using fallback")
+                result, status = stage.fallback, "timeout"
+            except Exception as e:
+                logging.error(f"Stage {stage.name} failed, using fallback: {e}")
+                result, status = stage.fallback, "error"
+            self.timings[stage.name] = StageTiming(
+                status,
+                (stage_started - started) * 1000,
+                (time.perf_counter() - stage_started) * 1000,
+            )
+            AGENT_STAGE_SECONDS.labels(self.name, stage.name, status).observe(self.timings[stage.name].elapsed_ms / 1000)
+            return result
+
+        # Stages are added after their dependencies, so creation order is safe
+        for name, stage in self.stages.items():
+            tasks[name] = asyncio.create_task(run_stage(stage))
+        try:
+            results = dict(zip(tasks, await asyncio.gather(*tasks.values())))
+        finally:
+            for task in tasks.values():
+                task.cancel()
+
+        total_ms = (time.perf_counter() - started) * 1000
+        logging.info(
+            f"⏱️ {self.name}: "
+            + " | ".join(
+                f"{name} {self.timings[name].elapsed_ms:.0f}ms {self.timings[name].status}"
+                for name in self.stages if name in self.timings
+            )
+            + f" | total {total_ms:.0f}ms (sum {sum(t.elapsed_ms for t in self.timings.values()):.0f}ms)"
+        )
+        return results
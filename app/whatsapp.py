@@ -1,32 +1,49 @@
 from fastapi.templating import Jinja2Templates
 import logging
 import asyncio
+import json
+import time
+import yaml
 from fastapi import (
     FastAPI,
     Form,
 
     Request,
-    BackgroundTasks,
     status,
 )
 from fastapi.responses import (
     HTMLResponse,
+    JSONResponse,
     PlainTextResponse,
     RedirectResponse,
+    Response,
+    StreamingResponse,
 )
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
 from starlette.middleware.sessions import SessionMiddleware
 from twilio.twiml.messaging_response import MessagingResponse
 from langchain_core.messages import HumanMessage, AIMessage
-from agent.react_agent import agent, monitor_active_leads
-from client.twilio_client import TWILIO_WHATSAPP_NUMBER
+from agent.react_agent import get_agent, get_session_store, llm_gateway_stats, monitor_active_leads, prewarm
+from client.twilio_client import TWILIO_WHATSAPP_NUMBER, close_twilio_client, valid_twilio_signature
 from contextlib import asynccontextmanager
-from database.initdb import init_pool, init_db, close_pool
+from database.initdb import init_pool, init_db, close_pool, pool_stats
 from service.dashboard import load_template_and_inject_rows
-from database.retrieve_data import fetch_all_leads
+from database.retrieve_data import fetch_all_leads, fetch_onboarding_status
 from service.signup import register_new_customer
+from service.campaigns import (
+    MAX_SINCE_DAYS, cancel_campaign, create_campaign, fetch_campaigns, get_campaign_settings, record_undelivered,
+)
+from service.jobs import JobWorker
+from service.retention import schedule_lead_maintenance
+from service.worker import FAILURE_HANDLERS as JOB_FAILURE_HANDLERS, HANDLERS as JOB_HANDLERS, embedded_worker_enabled
 from service.leads import LeadService
+from service.lead_events import hub as lead_events
 from service.signin import authenticate_user, login_required
+from service.idempotency import WebhookDeduplicator, create_idempotency_store
+from service.admission import AdmissionController, Overloaded
+from service.metrics import WEBHOOK_SECONDS, runtime, tenant_label
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 
 
 # -------------------------------------------------
@@ -39,6 +56,56 @@ logging.basicConfig(
 
 templates = Jinja2Templates(directory="html_templates")
 
+with open("config.yaml", "r") as file:
+    config = yaml.safe_load(file)
+
+# Inbound MessageSid -> reply, so Twilio's retries don't re-run the agent
+deduplicator = WebhookDeduplicator(
+    create_idempotency_store(config),
+    inflight_wait=(config.get("idempotency") or {}).get("inflight_wait", 25.0),
+)
+
+# Per-business concurrency caps and weighted fair queueing in front of the agent
+admission = AdmissionController.from_config(config)
+SHED_REPLY = (config.get("admission") or {}).get(
+    "shed_reply", "Thanks for your message! We're busy right now and will get back to you shortly."
+)
+
+# Stats the components keep themselves, read when /metrics is scraped
+runtime.track(
+    admission=admission.metrics,
+    deduplicator=lambda: deduplicator.stats,
+    llm_gateway=llm_gateway_stats,
+    db_pool=pool_stats,
+    lead_events=lead_events.metrics,
+)
+
+# Live dashboard: seconds between SSE keep-alive comments, and how long one
+# stream lives before the page is told to subscribe again (an open stream
+# would otherwise hold up a graceful shutdown indefinitely)
+SSE_HEARTBEAT = (config.get("dashboard") or {}).get("sse_heartbeat_seconds", 15)
+SSE_MAX_SECONDS = (config.get("dashboard") or {}).get("sse_max_seconds", 300)
+
+
+# -------------------------------------------------
+# Readiness
+# -------------------------------------------------
+# The app serves /healthz as soon as it starts; /readyz only once the
+# database is up and the models are loaded by the prewarm task
+readiness = {"database": False, "models": False, "error": None}
+
+
+async def prewarm_models():
+    try:
+        timings = await prewarm()
+        readiness["models"] = True
+        logging.info(
+            "🔥 Models warm: " + ", ".join(f"{name} {seconds:.1f}s" for name, seconds in timings.items())
+        )
+    except Exception as e:
+        readiness["error"] = str(e)
+        logging.error(f"Prewarm failed: {e}", exc_info=True)
+
 
 # -------------------------------------------------
 # App Lifespan
@@ -46,17 +113,34 @@ templates = Jinja2Templates(directory="html_templates")
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     logging.info("Starting lifespan startup...")
+    # Model loading runs alongside DB setup instead of blocking startup
+    prewarm_task = asyncio.create_task(prewarm_models())
     await init_pool()
     await init_db()
+    readiness["database"] = True
+    lead_events.start()
     monitor_task = asyncio.create_task(monitor_active_leads())
+    # With a shared vector store jobs run in `python -m service.worker`; with a
+    # local one (Chroma/NumPy) onboarding has to run here, next to the reader
+    worker_task = None
+    if embedded_worker_enabled(config):
+        await schedule_lead_maintenance()
+        job_worker = JobWorker(JOB_HANDLERS, config["jobs"], failure_handlers=JOB_FAILURE_HANDLERS)
+        worker_task = asyncio.create_task(job_worker.run())
     logging.info("Finished lifespan startup.")
     yield
     logging.info("Starting lifespan shutdown...")
+    prewarm_task.cancel()
+    if worker_task:
+        job_worker.stop()
+        await worker_task
     monitor_task.cancel()
     try:
         await monitor_task
     except asyncio.CancelledError:
         logging.info("Monitor task stopped.")
+    await lead_events.stop()
+    await close_twilio_client()
     await close_pool()
     logging.info("Finished lifespan shutdown.")
 
@@ -102,8 +186,14 @@ async def get_or_create_state(
     user_mobile_number: str,
     client_mobile_number: str,
 ):
+    # Earlier turns come from the session store, so any worker can continue the conversation
+    try:
+        history = await get_session_store().load_messages(user_mobile_number)
+    except Exception as e:
+        logging.error(f"Could not load session for {user_mobile_number}: {e}")
+        history = []
     return {
-        "messages": [],
+        "messages": history,
         "user_mobile_number": user_mobile_number,
         "client_mobile_number": client_mobile_number,
         "username": username,
@@ -125,22 +215,27 @@ async def whatsapp_webhook(
     From: str = Form(...),
     Body: str = Form(...),
     ProfileName: str = Form(None),
+    MessageSid: str = Form(None),
 ):
+    started = time.perf_counter()
     business_number = To.replace("whatsapp:", "")
     user_number = From.replace("whatsapp:", "")
     username = ProfileName or "User"
     user_message = Body.strip()
 
-    try:
-        await LeadService.capture_initial_contact(
-            client=business_number,
-            user_mobile=user_number,
-            username=username,
-        )
-    except Exception as e:
-        logging.error(f"Lead capture failed: {e}")
+    def observe(outcome: str):
+        WEBHOOK_SECONDS.labels(tenant_label(business_number), outcome).observe(time.perf_counter() - started)
+
+    async def handle_message() -> str:
+        try:
+            await LeadService.capture_initial_contact(
+                client=business_number,
+                user_mobile=user_number,
+                username=username,
+            )
+        except Exception as e:
+            logging.error(f"Lead capture failed: {e}")
 
-    try:
         state = await get_or_create_state(username, user_number, business_number)
 
         state["messages"].append(
@@ -149,29 +244,93 @@ async def whatsapp_webhook(
             )
         )
 
-        if hasattr(agent, "ainvoke"):
-            result = await agent.ainvoke(state)
-        else:
-            result = await asyncio.to_thread(agent.invoke, state)
+        # Fair share of agent slots per business; raises Overloaded when shed
+        async with admission.admit(business_number):
+            agent = get_agent()
+            if hasattr(agent, "ainvoke"):
+                result = await agent.ainvoke(state)
+            else:
+                result = await asyncio.to_thread(agent.invoke, state)
 
         ai_reply = result["messages"][-1].content
         state["messages"].append(AIMessage(content=ai_reply))
+        return ai_reply
+
+    try:
+        # Twilio retries slow webhooks with the same MessageSid; run the agent once
+        ai_reply = await deduplicator.run(MessageSid, handle_message)
 
         resp = MessagingResponse()
         resp.message(ai_reply)
+        observe("ok")
 
         return PlainTextResponse(
             str(resp),
             media_type="application/xml",
         )
 
+    except Overloaded:
+        resp = MessagingResponse()
+        resp.message(SHED_REPLY)
+        observe("shed")
+        return PlainTextResponse(str(resp), media_type="application/xml")
+
     except Exception as e:
         logging.error(f"WhatsApp webhook error: {e}", exc_info=True)
         resp = MessagingResponse()
         resp.message("Sorry, something went wrong.")
+        observe("error")
         return PlainTextResponse(str(resp), media_type="application/xml")
 
 
+
+@app.post("/twilio/status")
+async def twilio_status(
+    request: Request,
+    campaign: int,
+    source: str = "personalised",
+    MessageStatus: str = Form(...),
+    To: str = Form(...),
+    ErrorCode: str = Form(None),
+):
+    """
+    StatusCallback for campaign messages (campaigns.status_callback_url).
+    A message Twilio accepted but could not deliver reopens its lead.
+    Only requests signed with our Twilio auth token are acted on.
+    """
+    # Twilio signs the URL it was given; behind a proxy that is the configured one, not request.url
+    callback_url = get_campaign_settings().get("status_callback_url")
+    url = f"{callback_url}?{request.url.query}" if callback_url else str(request.url)
+    form = await request.form()
+    if not valid_twilio_signature(url, dict(form), request.headers.get("X-Twilio-Signature")):
+        logging.warning(f"Rejected /twilio/status callback with a bad signature for campaign {campaign}")
+        return PlainTextResponse("Invalid signature", status_code=status.HTTP_403_FORBIDDEN)
+
+    if MessageStatus in ("undelivered", "failed"):
+        await record_undelivered(campaign, To.replace("whatsapp:", ""), source, ErrorCode)
+    return PlainTextResponse("")
+
+
+# -------------------------------------------------
+# Health and Metrics
+# -------------------------------------------------
+@app.get("/healthz")
+async def healthz():
+    return {"status": "alive"}
+
+
+@app.get("/readyz")
+async def readyz():
+    if readiness["database"] and readiness["models"]:
+        return {"status": "ready"}
+    return JSONResponse({"status": "starting", **readiness}, status_code=503)
+
+
+@app.get("/metrics")
+def metrics():
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
 # -------------------------------------------------
 # Website Routes
 # -------------------------------------------------
@@ -220,7 +379,6 @@ async def signup_page(request: Request):
 
 @app.post("/signup")
 async def handle_signup(
-    background_tasks: BackgroundTasks,
     phone: str = Form(...),
     password: str = Form(...),
     url: str = Form(...),
@@ -232,7 +390,6 @@ async def handle_signup(
             password,
             url,
             location,
-            background_tasks,
         )
     except Exception as e:
         logging.error(f"Signup error: {e}")
@@ -257,7 +414,8 @@ async def dashboard(request: Request):
     # 3. Fetch data for the dashboard
     logging.info(f"Fetching dashboard for {username}...")
     leads = await fetch_all_leads(str(username))
-    print(leads)
+    onboarding = await fetch_onboarding_status(str(username))
+    campaigns = await fetch_campaigns(str(username))
 
     # 4. Render the page
     return templates.TemplateResponse(
@@ -265,11 +423,93 @@ async def dashboard(request: Request):
         {
             "request": request, 
             "leads": leads, 
+            "onboarding": onboarding,
+            "campaigns": campaigns,
             "username": username
         }
     )
 
 
+@app.post("/login/dashboard/campaigns")
+async def start_campaign(
+    request: Request,
+    brief: str = Form(...),
+    sentiments: list[str] = Form(["Positive"]),
+    since_days: int = Form(30, ge=1, le=MAX_SINCE_DAYS),
+):
+    """
+    Queue a follow-up campaign to the business's uncontacted leads with
+    the chosen sentiments from the last since_days; a job worker sends it.
+    """
+    auth_redirect = login_required(request)
+    if auth_redirect:
+        return auth_redirect
+
+    username = str(request.session.get("user").get("username"))
+    await create_campaign(username, brief.strip(), sentiments, since_days)
+    return RedirectResponse(url="/login/dashboard", status_code=status.HTTP_303_SEE_OTHER)
+
+
+@app.get("/login/dashboard/campaigns")
+async def list_campaigns(request: Request):
+    """Progress of the business's recent campaigns, for polling."""
+    auth_redirect = login_required(request)
+    if auth_redirect:
+        return auth_redirect
+
+    username = str(request.session.get("user").get("username"))
+    return JSONResponse(jsonable_encoder(await fetch_campaigns(username)))
+
+
+@app.post("/login/dashboard/campaigns/{campaign_id}/cancel")
+async def stop_campaign(request: Request, campaign_id: int):
+    auth_redirect = login_required(request)
+    if auth_redirect:
+        return auth_redirect
+
+    username = str(request.session.get("user").get("username"))
+    await cancel_campaign(username, campaign_id)
+    return RedirectResponse(url="/login/dashboard", status_code=status.HTTP_303_SEE_OTHER)
+
+
+@app.get("/login/dashboard/events")
+async def dashboard_events(request: Request):
+    """
+    Server-Sent Events for the logged-in business: a `lead` event with the
+    row whenever one of its leads is inserted or patched, `resync` when
+    changes may have been missed, and `reconnect` when the stream is about
+    to end after SSE_MAX_SECONDS.
+    """
+    auth_redirect = login_required(request)
+    if auth_redirect:
+        return auth_redirect
+
+    username = str(request.session.get("user").get("username"))
+    queue = lead_events.subscribe(username)
+
+    async def stream():
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + SSE_MAX_SECONDS
+        try:
+            yield "retry: 3000\n\n"
+            while (remaining := deadline - loop.time()) > 0:
+                try:
+                    event = await asyncio.wait_for(queue.get(), min(SSE_HEARTBEAT, remaining))
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: {event['type']}\ndata: {json.dumps(event.get('lead') or {})}\n\n"
+            yield "event: reconnect\ndata: {}\n\n"
+        finally:
+            lead_events.unsubscribe(username, queue)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @app.get("/logout")
 async def logout(request: Request):
     request.session.clear()
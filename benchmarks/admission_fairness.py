@@ -0,0 +1,104 @@
+"""
+AdmissionController under a flooding tenant.
+
+    python -m benchmarks.admission_fairness [--flood 200] [--agent-ms 100]
+
+One dealership bursts --flood messages at once (a campaign's replies) while
+a quiet dealership sends one message every 50ms. Each agent run takes
+--agent-ms. Compares the quiet tenant's reply latency when every message
+shares one FIFO of max_concurrency slots (the old behaviour, bounded only
+by the LLM) with the admission controller's per-tenant caps and weighted
+fair queue, and reports shed counts. Then --churn messages arrive from as
+many distinct numbers (the To field is unsigned). Exits non-zero if the
+quiet tenant's p95 under admission control isn't below its FIFO p95, or if
+the controller still holds state for idle tenants afterwards.
+"""
+import argparse
+import asyncio
+import logging
+import sys
+import time
+from benchmarks.fixtures import percentile
+from service.admission import AdmissionController, Overloaded
+
+FLOODER, QUIET = "whatsapp:+15550000001", "whatsapp:+15550000002"
+
+
+async def run(args, admit) -> dict:
+    latencies = {FLOODER: [], QUIET: []}
+    shed = {FLOODER: 0, QUIET: 0}
+
+    async def message(tenant):
+        started = time.perf_counter()
+        try:
+            async with admit(tenant):
+                await asyncio.sleep(args.agent_ms / 1000)
+        except Overloaded:
+            shed[tenant] += 1
+        latencies[tenant].append((time.perf_counter() - started) * 1000)
+
+    async def quiet():
+        tasks = []
+        for _ in range(args.quiet):
+            tasks.append(asyncio.create_task(message(QUIET)))
+            await asyncio.sleep(0.05)
+        await asyncio.gather(*tasks)
+
+    await asyncio.gather(*(message(FLOODER) for _ in range(args.flood)), quiet())
+    return {"latencies": latencies, "shed": shed}
+
+
+def fifo(concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    def admit(tenant):
+        return semaphore
+    return admit
+
+
+def report(name: str, outcome: dict):
+    for tenant, label in ((FLOODER, "flooder"), (QUIET, "quiet")):
+        values = outcome["latencies"][tenant]
+        print(f"{name:<10} {label:<8} n={len(values):4d} p50={percentile(values, 50):7.1f}ms "
+              f"p95={percentile(values, 95):7.1f}ms shed={outcome['shed'][tenant]}")
+
+
+async def main(args) -> bool:
+    logging.disable(logging.WARNING)
+    baseline = await run(args, fifo(args.concurrency))
+    report("fifo", baseline)
+
+    controller = AdmissionController(
+        max_concurrency=args.concurrency, tenant_concurrency=args.tenant_concurrency,
+        queue_budget=args.budget, max_queue=args.flood,
+    )
+    fair = await run(args, controller.admit)
+    report("admission", fair)
+    print(controller.metrics())
+
+    # One message each from many numbers; none of them should be remembered once done
+    async def one(tenant):
+        try:
+            async with controller.admit(tenant):
+                await asyncio.sleep(0.001)
+        except Overloaded:
+            pass
+    await asyncio.gather(*(one(f"whatsapp:+1999{i:07d}") for i in range(args.churn)))
+    tracked = len(controller.metrics()["tenants"])
+    print(f"churn      {args.churn} distinct tenants, {tracked} still tracked when idle "
+          f"(admitted {controller.admitted}, shed {controller.shed} in total)")
+
+    return percentile(fair["latencies"][QUIET], 95) < percentile(baseline["latencies"][QUIET], 95) \
+        and fair["shed"][QUIET] == 0 and tracked == 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--flood", type=int, default=200)
+    parser.add_argument("--quiet", type=int, default=20)
+    parser.add_argument("--agent-ms", type=float, default=100)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--tenant-concurrency", type=int, default=8)
+    parser.add_argument("--budget", type=float, default=1.0)
+    parser.add_argument("--churn", type=int, default=5000)
+    sys.exit(0 if asyncio.run(main(parser.parse_args())) else 1)
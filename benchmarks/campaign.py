@@ -0,0 +1,325 @@
+"""
+Follow-up campaigns against a real Postgres, a fake Twilio and a fake LLM.
+
+    python -m benchmarks.campaign --database-url postgresql://... [--leads 2000] [--rate 200] [--llm-ms 400] [--fetch-size 500]
+
+Scenarios (asserted; exits non-zero on failure):
+  select     - only the client's uncontacted leads with a chosen sentiment
+               from the window are messaged, each exactly once, as the
+               configured Content Template with a status callback, and
+               marked is_contacted; one LLM call per batch, unparseable
+               answers fall back to the template
+  window     - without a Content Template only leads who wrote in within
+               session_window_hours are messaged (free-form)
+  undelivered - a status callback for an accepted but undelivered message
+               reopens the lead and is counted once; one naming another
+               business's contact reopens nothing
+  resume     - the job is killed mid-campaign and retried: every lead is
+               reached, and at most one batch is sent twice
+  cancel     - cancelling a running campaign stops it after the batch in flight
+  dead       - a worker that dies on the job's final attempt leaves the
+               campaign failed (via the worker's failure hook), not running
+  since_days - out-of-range windows are refused
+Also reports campaign throughput against the per-lead pattern (one LLM
+call and one send at a time). Uses (and empties) the leads, lead_phones,
+campaigns and jobs tables of the given database.
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+CLIENT = "+15550000001"
+BATCH = 20
+
+
+class FakeLLM:
+    """Answers a batch prompt after `delay`; every `garble_every`th call returns no JSON."""
+
+    def __init__(self, delay: float, garble_every: int = 7):
+        self.delay = delay
+        self.garble_every = garble_every
+        self.calls = 0
+
+    async def ainvoke(self, messages):
+        from langchain_core.messages import AIMessage
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.garble_every and self.calls % self.garble_every == 0:
+            return AIMessage(content="Sorry, I can't help with that.")
+        indexes = [int(i) for i in re.findall(r'"i": (\d+)', messages[-1].content)]
+        return AIMessage(content=json.dumps([{"i": i, "message": f"Personal note {i}"} for i in indexes]))
+
+
+class FakeJob:
+    def __init__(self, attempts: int = 1, max_attempts: int = 5):
+        self.attempts = attempts
+        self.max_attempts = max_attempts
+
+    async def progress(self, **fields):
+        pass
+
+
+async def seed(get_db_conn, client: str, count: int, prefix: str) -> tuple[set[str], set[str]]:
+    """
+    count leads for client, a third each Positive / Neutral / Negative;
+    every 10th is 90 days old, every 15th already contacted and every 4th
+    wrote in an hour ago. Returns the phones a Positive+Neutral,
+    last-30-days campaign should reach with a template, and those it
+    may reach free-form.
+    """
+    now = datetime.now(timezone.utc)
+    rows, expected, recent = [], set(), set()
+    for i in range(count):
+        phone = f"{prefix}{i:06d}"
+        label = ("Positive", "Neutral", "Negative")[i % 3]
+        created = now - timedelta(days=90 if i % 10 == 0 else 1, seconds=i)
+        contacted = i % 15 == 0
+        rows.append((client, phone, f"Lead {i}", "Asked about a Camry", label, 0.5, contacted, created))
+        if label != "Negative" and i % 10 != 0 and not contacted:
+            expected.add(f"whatsapp:{phone}")
+            if i % 4 == 0:
+                recent.add(f"whatsapp:{phone}")
+    async with get_db_conn() as conn:
+        async with conn.cursor() as cur:
+            await cur.executemany(
+                """
+                INSERT INTO leads (client, phone_number, username, summary, sentiment_label,
+                                   sentiment_score, is_contacted, created_at)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+                """,
+                rows,
+            )
+            await cur.execute(
+                """
+                INSERT INTO lead_phones (phone_number, lead_id, created_at, last_inbound_at)
+                SELECT phone_number, id, created_at,
+                       CASE WHEN right(phone_number, 6)::int %% 4 = 0 THEN now() - interval '1 hour'
+                            ELSE created_at END
+                FROM leads WHERE client = %s
+                """,
+                (client,),
+            )
+        await conn.commit()
+    return expected, recent
+
+
+async def main(args) -> bool:
+    os.environ["DATABASE_URL"] = args.database_url
+    from benchmarks.twilio_fake import ACCOUNT, reset, start_fake, state
+    from client.twilio_client import AsyncTwilioClient
+    from database.create_data import get_db_conn
+    from database.initdb import close_pool, init_db, init_pool
+    from service.campaigns import (
+        _claim_campaign, cancel_campaign, campaign_job, create_campaign, record_undelivered,
+    )
+    from service.jobs import JobWorker
+    from service.worker import FAILURE_HANDLERS
+
+    await init_pool()
+    await init_db()
+    async with get_db_conn() as conn:
+        await conn.execute("TRUNCATE leads, lead_phones, campaigns, jobs")
+        await conn.commit()
+
+    base_url = start_fake()
+    twilio = AsyncTwilioClient(ACCOUNT, "token", {
+        "base_url": base_url, "rate_per_second": args.rate, "burst": max(1, args.rate // 10),
+        "backoff_base": 0.05, "backoff_max": 0.5, "bulk_concurrency": 50,
+    })
+    import service.campaigns
+    service.campaigns._campaign_settings = {
+        **service.campaigns.get_campaign_settings(), "batch_size": BATCH, "fetch_size": args.fetch_size,
+        "content_sid": "HXbench", "status_callback_url": "https://example.com/twilio/status",
+    }
+    results = []
+
+    async def campaign_row(campaign_id: int) -> dict:
+        async with get_db_conn() as conn:
+            cur = await conn.execute(
+                "SELECT status, selected, accepted, undelivered, failed, fallbacks FROM campaigns WHERE id = %s",
+                (campaign_id,),
+            )
+            row = await cur.fetchone()
+            await conn.commit()
+        return dict(zip(("status", "selected", "accepted", "undelivered", "failed", "fallbacks"), row))
+
+    async def contacted(client: str) -> set[str]:
+        async with get_db_conn() as conn:
+            cur = await conn.execute(
+                "SELECT phone_number FROM leads WHERE client = %s AND is_contacted AND created_at > now() - interval '30 days'"
+                " AND sentiment_label <> 'Negative'", (client,),
+            )
+            phones = {f"whatsapp:{phone}" for (phone,) in await cur.fetchall()}
+            await conn.commit()
+        return phones
+
+    # -- select --
+    reset()
+    expected, _ = await seed(get_db_conn, CLIENT, args.leads, "+1777")
+    await seed(get_db_conn, "+15550000009", 200, "+1666")  # another business's leads
+    llm = FakeLLM(args.llm_ms / 1000)
+    campaign_id = await create_campaign(CLIENT, "Spring sale until Saturday", ["Positive", "Neutral"], 30)
+    started = time.perf_counter()
+    await campaign_job({"campaign_id": campaign_id}, FakeJob(), llm=llm, twilio=twilio)
+    elapsed = time.perf_counter() - started
+    row = await campaign_row(campaign_id)
+    recipients = state["recipients"]
+    batches = -(-len(expected) // BATCH)
+    templated = all(
+        message["ContentSid"] == "HXbench" and message["Body"] is None
+        and json.loads(message["ContentVariables"])["2"]
+        and message["StatusCallback"].startswith(f"https://example.com/twilio/status?campaign={campaign_id}&")
+        for message in state["messages"].values()
+    )
+    ok = (
+        set(recipients) == expected and set(recipients.values()) == {1} and templated
+        and await contacted(CLIENT) >= expected and row["status"] == "done" and row["accepted"] == len(expected)
+        and llm.calls == batches and 0 < row["fallbacks"] < len(expected)
+    )
+    campaign_rate = len(expected) / elapsed
+    print(f"{'PASS' if ok else 'FAIL'} select   {len(expected)} of {args.leads} leads selected, "
+          f"{sum(recipients.values())} sends to {len(recipients)} numbers, {llm.calls} LLM calls for {batches} batches, "
+          f"{row['fallbacks']} fallbacks, all as template HXbench={templated}; "
+          f"{elapsed:.2f}s ({campaign_rate:.0f} msg/s, send rate limit {args.rate}/s)")
+    results.append(ok)
+
+    # -- undelivered --
+    phone = sorted(expected)[0].replace("whatsapp:", "")
+    first = await record_undelivered(campaign_id, phone, "personalised", "63016")
+    repeat = await record_undelivered(campaign_id, phone, "personalised", "63016")
+    # A callback naming this campaign but another business's contact changes nothing
+    async with get_db_conn() as conn:
+        cur = await conn.execute(
+            "UPDATE leads SET is_contacted = TRUE WHERE id = (SELECT min(id) FROM leads WHERE client = %s) RETURNING phone_number",
+            ("+15550000009",),
+        )
+        (other_phone,) = await cur.fetchone()
+        await conn.commit()
+    foreign = await record_undelivered(campaign_id, other_phone, "personalised", "63016")
+    async with get_db_conn() as conn:
+        cur = await conn.execute("SELECT bool_and(is_contacted) FROM leads WHERE phone_number = %s", (other_phone,))
+        (foreign_kept,) = await cur.fetchone()
+        await conn.commit()
+    row = await campaign_row(campaign_id)
+    reopened = f"whatsapp:{phone}" not in await contacted(CLIENT)
+    ok = first and not repeat and reopened and row["undelivered"] == 1 and not foreign and foreign_kept
+    print(f"{'PASS' if ok else 'FAIL'} undelivered  callback counted={first}, repeat counted={repeat}, "
+          f"lead reopened={reopened}, campaign undelivered={row['undelivered']}; "
+          f"other business's lead counted={foreign}, kept contacted={foreign_kept}")
+    results.append(ok)
+
+    # -- window --
+    reset()
+    client = "+15550000005"
+    _, recent = await seed(get_db_conn, client, args.leads // 2, "+1555")
+    service.campaigns._campaign_settings["content_sid"] = ""
+    campaign_id = await create_campaign(client, "Spring sale until Saturday", ["Positive", "Neutral"], 30)
+    await campaign_job({"campaign_id": campaign_id}, FakeJob(), llm=FakeLLM(args.llm_ms / 1000), twilio=twilio)
+    service.campaigns._campaign_settings["content_sid"] = "HXbench"
+    free_form = all(message["Body"] and not message["ContentSid"] for message in state["messages"].values())
+    ok = set(state["recipients"]) == recent and free_form
+    print(f"{'PASS' if ok else 'FAIL'} window   no template: {len(state['recipients'])} messaged, "
+          f"{len(recent)} wrote in within the window, free-form={free_form}")
+    results.append(ok)
+
+    # -- resume --
+    reset()
+    client = "+15550000002"
+    expected, _ = await seed(get_db_conn, client, args.leads // 2, "+1888")
+    campaign_id = await create_campaign(client, "Spring sale until Saturday", ["Positive", "Neutral"], 30)
+    first = asyncio.create_task(campaign_job({"campaign_id": campaign_id}, FakeJob(1), llm=FakeLLM(args.llm_ms / 1000), twilio=twilio))
+    while sum(state["recipients"].values()) < len(expected) * 0.4:
+        await asyncio.sleep(0.01)
+    first.cancel()  # the worker dies; its lease runs out and the job is retried
+    await asyncio.gather(first, return_exceptions=True)
+    sent_before = sum(state["recipients"].values())
+    await campaign_job({"campaign_id": campaign_id}, FakeJob(2), llm=FakeLLM(args.llm_ms / 1000), twilio=twilio)
+    recipients = state["recipients"]
+    duplicates = sum(count - 1 for count in recipients.values())
+    row = await campaign_row(campaign_id)
+    ok = set(recipients) == expected and duplicates <= BATCH and row["status"] == "done"
+    print(f"{'PASS' if ok else 'FAIL'} resume   killed after {sent_before} of {len(expected)} sends, "
+          f"retry reached {len(recipients)}, {duplicates} sent twice (batch size {BATCH}), status={row['status']}")
+    results.append(ok)
+
+    # -- cancel --
+    reset()
+    client = "+15550000003"
+    expected, _ = await seed(get_db_conn, client, args.leads // 2, "+1999")
+    campaign_id = await create_campaign(client, "Spring sale until Saturday", ["Positive", "Neutral"], 30)
+    run = asyncio.create_task(campaign_job({"campaign_id": campaign_id}, FakeJob(), llm=FakeLLM(args.llm_ms / 1000), twilio=twilio))
+    while sum(state["recipients"].values()) < len(expected) * 0.3:
+        await asyncio.sleep(0.01)
+    cancelled = await cancel_campaign(client, campaign_id)
+    at_cancel = sum(state["recipients"].values())
+    await run
+    row = await campaign_row(campaign_id)
+    sent = sum(state["recipients"].values())
+    ok = cancelled and row["status"] == "cancelled" and sent - at_cancel <= BATCH and sent < len(expected)
+    print(f"{'PASS' if ok else 'FAIL'} cancel   cancelled at {at_cancel} sends, stopped at {sent} of {len(expected)}, "
+          f"status={row['status']}")
+    results.append(ok)
+
+    # -- dead --
+    client = "+15550000004"
+    async with get_db_conn() as conn:
+        await conn.execute("TRUNCATE jobs")  # the jobs queued above were run directly
+        await conn.commit()
+    campaign_id = await create_campaign(client, "Spring sale until Saturday", ["Positive"], 30)
+    async with get_db_conn() as conn:
+        await conn.execute("UPDATE jobs SET max_attempts = 1")
+        await conn.commit()
+    dying = JobWorker({"campaign": None}, {"lease_seconds": 1}, worker_id="dying")
+    await dying.claim()
+    await _claim_campaign(campaign_id)  # started sending, then the process was killed
+    await asyncio.sleep(1.2)
+    rescuer = JobWorker({"campaign": campaign_job}, {"lease_seconds": 30}, failure_handlers=FAILURE_HANDLERS)
+    job = await rescuer.claim()
+    await rescuer.execute(job)
+    row = await campaign_row(campaign_id)
+    ok = job.attempts == 2 and row["status"] == "failed"
+    print(f"{'PASS' if ok else 'FAIL'} dead     worker died on the final attempt: campaign status={row['status']}")
+    results.append(ok)
+
+    # -- since_days --
+    refused = []
+    for days in (0, -5, 10 ** 9):
+        try:
+            await create_campaign(client, "Spring sale", ["Positive"], days)
+        except ValueError:
+            refused.append(days)
+    ok = refused == [0, -5, 10 ** 9]
+    print(f"{'PASS' if ok else 'FAIL'} since_days  refused {refused}")
+    results.append(ok)
+
+    # -- per-lead baseline --
+    reset()
+    llm = FakeLLM(args.llm_ms / 1000, garble_every=0)
+    sample = sorted(expected)[:args.baseline]
+    started = time.perf_counter()
+    for to in sample:
+        await llm.ainvoke([type("Prompt", (), {"content": '"i": 0'})()])
+        await twilio.send(to, "Personal note", from_=f"whatsapp:{client}")
+    baseline_rate = len(sample) / (time.perf_counter() - started)
+    print(f"per-lead baseline {baseline_rate:.1f} msg/s ({args.llm_ms:.0f}ms LLM call + send per lead); "
+          f"campaign {campaign_rate / baseline_rate:.0f}x faster")
+
+    await twilio.aclose()
+    await close_pool()
+    return all(results)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=os.getenv("DATABASE_URL"), required=not os.getenv("DATABASE_URL"))
+    parser.add_argument("--leads", type=int, default=2000)
+    parser.add_argument("--rate", type=int, default=200, help="Twilio sends per second per sender")
+    parser.add_argument("--llm-ms", type=float, default=400, help="fake LLM latency per call")
+    parser.add_argument("--fetch-size", type=int, default=500, help="leads per page query")
+    parser.add_argument("--baseline", type=int, default=30, help="leads sent the per-lead way")
+    sys.exit(0 if asyncio.run(main(parser.parse_args())) else 1)
@@ -0,0 +1,198 @@
+"""
+Chunking strategies compared on a sample dealer site: semantic (the
+default), token-bounded recursive and HTML-section splitting.
+
+    python -m benchmarks.chunking_eval [--pages 200] [--queries 300] [--top-k 3] [--model]
+    python -m benchmarks.chunking_eval --strategies recursive html --chunk-tokens 120
+
+The pages are rendered as HTML and saved through scrape.text_from_html,
+as the crawler does, then ingested once per strategy. Reports chunks
+produced, texts and characters sent to the embedding model, ingest time
+and hit@k: the share of questions whose top k chunks (vector search, no
+reranker) hold the whole answer, e.g. both the stock number and the
+price of the listing asked about.
+"""
+import argparse
+import os
+import random
+import time
+from benchmarks.fixtures import COLORS, FOOTER, MAKES, TRIMS, bench_config, load_embeddings, make_workdir
+from benchmarks.hybrid_retrieval import SkipReranker
+from rag.chunking import CHUNKING_STRATEGIES
+from rag.context import count_tokens
+from rag.ingest import RagIngest
+from rag.retrieve import RagRetriever
+from scrape.scrape import text_from_html
+
+CUSTOMER = "+15550000001"
+
+SERVICES = {
+    "Oil changes": "Synthetic and conventional oil changes in under an hour, no appointment needed on weekdays.",
+    "Brake inspections": "Free brake inspections with every visit; pads and rotors replaced with genuine parts.",
+    "Tyre rotation": "Tyre rotation and balancing every 5,000 miles keeps tread wear even.",
+    "Shuttle": "A complimentary shuttle runs to anywhere within ten miles while your car is serviced.",
+}
+SERVICE_QUESTIONS = {
+    "Oil changes": ("Do I need an appointment for an oil change?", "no appointment"),
+    "Brake inspections": ("Do you check brakes for free?", "Free brake inspections"),
+    "Tyre rotation": ("How often should I rotate my tyres?", "every 5,000 miles"),
+    "Shuttle": ("Is there a shuttle while my car is in service?", "within ten miles"),
+}
+
+
+# -----------------------
+#   Corpus
+# -----------------------
+def listing(rng: random.Random) -> dict:
+    make = rng.choice(list(MAKES))
+    return {
+        "year": rng.randint(2019, 2025),
+        "make": make,
+        "model": rng.choice(MAKES[make]),
+        "trim": rng.choice(TRIMS),
+        "color": rng.choice(COLORS),
+        "stock": f"STK{rng.randint(10000, 99999)}",
+        "price": f"${rng.randint(18, 65) * 1000 + rng.choice([0, 495, 995]):,}",
+        "miles": f"{rng.randint(5, 60)},{rng.randint(100, 999)}",
+    }
+
+
+def inventory_html(listings: list[dict]) -> str:
+    cards = "".join(
+        f"<div class='vehicle'><h3>{car['year']} {car['make']} {car['model']} {car['trim']}</h3>"
+        f"<ul><li>Exterior: {car['color']}</li><li>Stock number {car['stock']}</li>"
+        f"<li>Price {car['price']}</li><li>{car['miles']} miles, clean history report</li></ul>"
+        f"<a href='/vehicle/{car['stock']}'>View details</a></div>"
+        for car in listings
+    )
+    return (
+        "<html><head><title>Inventory</title><script>window.dataLayer=[];</script></head><body>"
+        "<header><nav><a href='/'>Home</a><a href='/service'>Service</a></nav></header>"
+        "<main><h1>Used vehicles</h1><p>Every pre-owned vehicle passes a 150-point inspection.</p>"
+        f"{cards}<p class='disclaimer'>{FOOTER}</p></main></body></html>"
+    )
+
+
+def service_html() -> str:
+    sections = "".join(f"<section><h2>{name}</h2><p>{text}</p></section>" for name, text in SERVICES.items())
+    return f"<html><body><main><h1>Service centre</h1>{sections}<p>{FOOTER}</p></main></body></html>"
+
+
+def write_html_corpus(directory: str, pages: int, seed: int = 7) -> list[dict]:
+    """
+    Render the site, save each page the way the crawler does and return
+    every listing on it.
+    """
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    listings = []
+    for i in range(pages):
+        if i % 10 == 0:
+            html = service_html()
+        else:
+            page_listings = [listing(rng) for _ in range(rng.randint(4, 10))]
+            listings.extend(page_listings)
+            html = inventory_html(page_listings)
+        with open(os.path.join(directory, f"page_{i:04d}.txt"), "w", encoding="utf-8") as f:
+            f.write(text_from_html(html))
+    return listings
+
+
+def questions(listings: list[dict], count: int, seed: int = 5) -> list[tuple[str, tuple[str, ...]]]:
+    """(question, strings the answering chunk must all contain)"""
+    rng = random.Random(seed)
+    asked = []
+    for car in rng.sample(listings, min(count, len(listings))):
+        name = f"{car['year']} {car['make']} {car['model']} {car['trim']}"
+        kind = rng.random()
+        if kind < 0.4:
+            asked.append((f"How much is stock number {car['stock']}?", (car["stock"], car["price"])))
+        elif kind < 0.8:
+            asked.append((f"What's the price of the {name} in {car['color']}?", (car["color"], car["price"])))
+        else:
+            asked.append((f"How many miles are on the {name} in {car['color']}?", (car["color"], car["miles"])))
+    for question, expected in SERVICE_QUESTIONS.values():
+        asked.append((question, (expected,)))
+    return asked
+
+
+# -----------------------
+#   Measurement
+# -----------------------
+class CountingEmbeddings:
+    """Tallies what reaches the embedding model during ingest."""
+
+    def __init__(self, embeddings):
+        self.embeddings = embeddings
+        self.texts = 0
+        self.chars = 0
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        self.texts += len(texts)
+        self.chars += sum(len(text) for text in texts)
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embeddings.embed_query(text)
+
+
+def evaluate(strategy: str, args, embeddings, pages_dir: str, asked) -> dict:
+    workdir = make_workdir()
+    chunking = {"strategy": strategy, "chunk_tokens": args.chunk_tokens, "overlap_tokens": args.overlap_tokens}
+    config_path = bench_config(
+        workdir,
+        ingest={"workers": 1},
+        retrieval={"hybrid": False},
+        chunking=chunking,
+        document_loader={"directory": pages_dir},
+    )
+    counting = CountingEmbeddings(embeddings)
+    ingest = RagIngest(config_path, embeddings=counting)
+    started = time.perf_counter()
+    chunks = ingest.ingest_directory(CUSTOMER)
+    ingest_seconds = time.perf_counter() - started
+
+    stored = [document for _, document in ingest.store.iter_documents(CUSTOMER)]
+    retriever = RagRetriever(config_path, embeddings=embeddings, reranker=SkipReranker())
+    hits = 0
+    for question, expected in asked:
+        candidates, _ = retriever.retrieve_candidates(question, CUSTOMER, top_k=args.top_k)
+        hits += any(all(part in doc["document"] for part in expected) for doc in candidates[:args.top_k])
+    return {
+        "chunks": chunks,
+        "mean_tokens": sum(map(count_tokens, stored)) / len(stored) if stored else 0.0,
+        "texts_embedded": counting.texts,
+        "chars_embedded": counting.chars,
+        "ingest_s": ingest_seconds,
+        "hit_rate": hits / len(asked),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--chunk-tokens", type=int, default=200)
+    parser.add_argument("--overlap-tokens", type=int, default=30)
+    parser.add_argument("--strategies", nargs="+", default=list(CHUNKING_STRATEGIES), choices=CHUNKING_STRATEGIES)
+    parser.add_argument("--model", action="store_true", help="use the configured embedding model")
+    args = parser.parse_args()
+
+    pages_dir = os.path.join(make_workdir(), "pages")
+    listings = write_html_corpus(os.path.join(pages_dir, CUSTOMER), args.pages)
+    asked = questions(listings, args.queries)
+    embeddings = load_embeddings(args.model)
+    print(f"{args.pages} pages, {len(listings)} listings, {len(asked)} questions, top_k={args.top_k}")
+
+    for strategy in args.strategies:
+        result = evaluate(strategy, args, embeddings, pages_dir, asked)
+        print(
+            f"{strategy:<10} chunks={result['chunks']:<6} tokens/chunk={result['mean_tokens']:6.1f}  "
+            f"embedded={result['texts_embedded']:<6} texts {result['chars_embedded'] / 1000:8.1f}k chars  "
+            f"ingest={result['ingest_s']:6.2f}s  hit@{args.top_k}={result['hit_rate']:.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Prompt tokens per turn: the old unbounded " ".join of retrieved chunks
+vs ContextPacker (overlap dedup + token budget).
+
+    python -m benchmarks.context_packing [--pages 300] [--queries 200] [--top-k 5] [--max-tokens 800]
+"""
+import argparse
+import os
+from benchmarks.fixtures import bench_config, load_embeddings, make_workdir, percentile, sample_queries, write_sample_corpus
+from benchmarks.hybrid_retrieval import SkipReranker
+from rag.context import ContextPacker, count_tokens
+from rag.ingest import RagIngest
+from rag.retrieve import RagRetriever
+
+CUSTOMER = "+15550000001"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, default=300)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--max-tokens", type=int, default=800)
+    parser.add_argument("--model", action="store_true", help="use the configured embedding and reranker models")
+    args = parser.parse_args()
+
+    workdir = make_workdir()
+    config_path = bench_config(workdir, ingest={"workers": 1}, context={"max_tokens": args.max_tokens})
+    write_sample_corpus(os.path.join(workdir, "pages"), CUSTOMER, pages=args.pages)
+
+    embeddings = load_embeddings(args.model)
+    RagIngest(config_path, embeddings=embeddings).ingest_directory(CUSTOMER)
+    retriever = RagRetriever(config_path, embeddings=embeddings, reranker=None if args.model else SkipReranker())
+    packer = ContextPacker(retriever.config)
+
+    with open("prompts/system_prompt.txt", "r", encoding="utf-8") as file:
+        prefix_tokens = count_tokens(file.read())
+
+    naive, packed, overlapping = [], [], 0
+    for query in sample_queries(args.queries):
+        docs = retriever.query(query, CUSTOMER, top_k=args.top_k) or []
+        _, stats = packer.pack(docs)
+        naive.append(stats["naive_tokens"])
+        packed.append(stats["tokens"])
+        overlapping += stats["overlapping"]
+
+    saved = sum(naive) - sum(packed)
+    print(f"{len(naive)} turns, top_k={args.top_k}, budget={args.max_tokens} tokens, "
+          f"static system prompt prefix={prefix_tokens} tokens")
+    print(f"unpacked context  mean={sum(naive) / len(naive):7.1f}  p95={percentile(naive, 95):7.1f} tokens/turn")
+    print(f"packed context    mean={sum(packed) / len(packed):7.1f}  p95={percentile(packed, 95):7.1f} tokens/turn")
+    print(f"saved {saved} tokens ({saved / max(sum(naive), 1):.0%}), {overlapping} overlapping chunks dropped")
+
+
+if __name__ == "__main__":
+    main()
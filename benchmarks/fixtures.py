@@ -0,0 +1,179 @@
+import hashlib
+import os
+import random
+import re
+import tempfile
+import numpy as np
+import yaml
+
+# -----------------------
+#   Sample dealer corpus
+# -----------------------
+MAKES = {
+    "Toyota": ["Camry", "Corolla", "RAV4", "Highlander", "Tacoma"],
+    "Honda": ["Civic", "Accord", "CR-V", "Pilot", "Odyssey"],
+    "Ford": ["F-150", "Escape", "Explorer", "Mustang", "Bronco"],
+    "Hyundai": ["Elantra", "Sonata", "Tucson", "Santa Fe", "Kona"],
+}
+TRIMS = ["LE", "SE", "XLE", "Sport", "Touring", "Limited", "EX-L", "Platinum"]
+COLORS = ["Midnight Black", "Pearl White", "Celestial Silver", "Ruby Red", "Blueprint"]
+
+FOOTER = (
+    "Prices exclude tax, title, license and dealer fees. "
+    "All vehicles are subject to prior sale. "
+    "Visit our showroom Monday to Saturday from 9am to 7pm. "
+    "Financing is available on approved credit."
+)
+
+SERVICE_PAGE = (
+    "Our service centre offers oil changes, tyre rotation and brake inspections. "
+    "Book an appointment online or call us to schedule a visit. "
+    "Certified technicians use genuine parts on every repair. "
+    "Complimentary shuttle service is available within ten miles."
+)
+
+
+def inventory_page(rng: random.Random, listings: int = 6) -> str:
+    sentences = []
+    for _ in range(listings):
+        make = rng.choice(list(MAKES))
+        model = rng.choice(MAKES[make])
+        year = rng.randint(2019, 2025)
+        stock = f"STK{rng.randint(10000, 99999)}"
+        price = rng.randint(18, 65) * 1000 + rng.choice([0, 495, 995])
+        sentences.append(
+            f"{year} {make} {model} {rng.choice(TRIMS)} in {rng.choice(COLORS)}, "
+            f"stock number {stock}, priced at ${price:,}."
+        )
+        sentences.append(
+            f"This {model} has {rng.randint(5, 60)},{rng.randint(100, 999)} miles "
+            f"and a clean history report."
+        )
+    return " ".join(sentences) + " " + FOOTER
+
+
+def write_sample_corpus(directory: str, customer: str, pages: int = 200, seed: int = 7) -> str:
+    """
+    Write a synthetic dealership site into directory/customer, shaped like
+    the scraper output (one visible-text .txt file per page).
+    """
+    rng = random.Random(seed)
+    customer_dir = os.path.join(directory, customer)
+    os.makedirs(customer_dir, exist_ok=True)
+    for i in range(pages):
+        text = SERVICE_PAGE + " " + FOOTER if i % 10 == 0 else inventory_page(rng)
+        with open(os.path.join(customer_dir, f"page_{i:04d}.txt"), "w", encoding="utf-8") as f:
+            f.write(text)
+    return customer_dir
+
+
+def sample_queries(count: int = 200, seed: int = 11) -> list[str]:
+    """
+    Customer-style questions about the sample inventory.
+    """
+    rng = random.Random(seed)
+    templates = [
+        "Do you have a {make} {model} in stock?",
+        "What is the price of the {year} {model} {trim}?",
+        "Is the {model} available in {color}?",
+        "How many miles on the {year} {make} {model}?",
+        "Can I book a service appointment?",
+        "What are your opening hours?",
+    ]
+    queries = []
+    for _ in range(count):
+        make = rng.choice(list(MAKES))
+        queries.append(rng.choice(templates).format(
+            make=make,
+            model=rng.choice(MAKES[make]),
+            year=rng.randint(2019, 2025),
+            trim=rng.choice(TRIMS),
+            color=rng.choice(COLORS),
+        ))
+    return queries
+
+
+def percentile(values: list[float], q: float) -> float:
+    return float(np.percentile(values, q)) if values else 0.0
+
+
+def rss_mib(field: str = "VmRSS") -> float:
+    """Resident (VmRSS) or peak resident (VmHWM) MiB of this process."""
+    with open("/proc/self/status") as f:
+        return next(int(line.split()[1]) for line in f if line.startswith(field)) / 1024
+
+
+def directory_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, f)) for f in files)
+    return total
+
+
+# -----------------------
+#   Deterministic embeddings
+# -----------------------
+class HashingEmbeddings:
+    """
+    Offline stand-in for HuggingFaceEmbeddings: hashed bag of words,
+    L2-normalised. Counts calls and texts so benchmarks can report how
+    much work would reach the real model.
+    """
+
+    def __init__(self, dimensions: int = 384):
+        self.dimensions = dimensions
+        self.calls = 0
+        self.texts_embedded = 0
+
+    def _embed(self, text: str) -> list[float]:
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for token in re.findall(r"\w+", text.lower()):
+            digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+            index = int.from_bytes(digest[:4], "little") % self.dimensions
+            vector[index] += 1.0 if digest[4] & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        self.calls += 1
+        self.texts_embedded += len(texts)
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        self.calls += 1
+        self.texts_embedded += 1
+        return self._embed(text)
+
+
+def load_embeddings(use_model: bool):
+    if use_model:
+        from rag.utils import Utils
+        return Utils().initialize_embeddings()
+    return HashingEmbeddings()
+
+
+# -----------------------
+#   Config
+# -----------------------
+def bench_config(workdir: str, **overrides) -> str:
+    """
+    Copy config.yaml into workdir with the vector store and document
+    directories pointed inside it. Returns the new config path.
+    """
+    with open("config.yaml", "r") as file:
+        config = yaml.safe_load(file)
+
+    config["vectorstore"]["persist_directory"] = os.path.join(workdir, "chroma")
+    config["document_loader"]["directory"] = os.path.join(workdir, "pages")
+    for section, values in overrides.items():
+        config.setdefault(section, {}).update(values)
+
+    path = os.path.join(workdir, "config.yaml")
+    with open(path, "w") as file:
+        yaml.safe_dump(config, file)
+    return path
+
+
+def make_workdir() -> str:
+    os.environ.setdefault("GROQ_API_KEY", "benchmark")
+    return tempfile.mkdtemp(prefix="rag_bench_")
@@ -0,0 +1,139 @@
+"""
+Vector-only vs hybrid (BM25 + vector, reciprocal rank fusion) retrieval
+on exact-token questions: stock numbers and full listing descriptions.
+
+    python -m benchmarks.hybrid_retrieval [--pages 300] [--queries 200] [--top-k 5] [--model]
+        [--backend chroma|numpy|pgvector --database-url postgresql://...]
+
+Reports hit@k (the chunk holding the asked-about listing is in the top k),
+candidate latency and how often the cross-encoder would be skipped.
+Then drops the stored BM25 index, as a replica that never ran the ingest
+sees it, and checks the retriever rebuilds it (exits non-zero if not).
+"""
+import argparse
+import glob
+import os
+import random
+import re
+import shutil
+import sys
+import time
+from benchmarks.fixtures import bench_config, load_embeddings, make_workdir, percentile, write_sample_corpus
+from rag.ingest import RagIngest
+from rag.retrieve import RagRetriever
+
+CUSTOMER = "+15550000001"
+LISTING = re.compile(r"(\d{4} \w+ [\w-]+(?: \w+)? \w[\w-]* in [\w ]+), stock number (STK\d+)")
+
+
+def exact_token_queries(directory: str, count: int, seed: int = 5) -> list[tuple[str, str]]:
+    """
+    (question, text that must appear in the answering chunk)
+    """
+    listings = []
+    for path in sorted(glob.glob(os.path.join(directory, "*.txt"))):
+        with open(path, encoding="utf-8") as f:
+            listings.extend(LISTING.findall(f.read()))
+
+    rng = random.Random(seed)
+    queries = []
+    for description, stock in rng.sample(listings, min(count, len(listings))):
+        if rng.random() < 0.5:
+            queries.append((f"Is stock number {stock} still available?", stock))
+        else:
+            queries.append((f"How much is the {description}?", stock))
+    return queries
+
+
+class SkipReranker:
+    """Keeps vector order; the benchmark measures the candidate stage."""
+
+    def predict(self, pairs):
+        return [0.0] * len(pairs)
+
+
+def evaluate(retriever: RagRetriever, queries, top_k: int):
+    hits, latencies, decisive_count = 0, [], 0
+    for question, expected in queries:
+        started = time.perf_counter()
+        candidates, decisive = retriever.retrieve_candidates(question, CUSTOMER, top_k=top_k)
+        latencies.append((time.perf_counter() - started) * 1000)
+        hits += any(expected in doc["document"] for doc in candidates[:top_k])
+        decisive_count += decisive
+    return hits / len(queries), latencies, decisive_count / len(queries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, default=300)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--model", action="store_true", help="use the configured embedding and reranker models")
+    parser.add_argument("--backend", default="chroma", choices=["chroma", "numpy", "pgvector"])
+    parser.add_argument("--database-url", help="pgvector: Postgres to use (its rag_chunks/rag_lexical rows for the customer are replaced)")
+    args = parser.parse_args()
+
+    workdir = make_workdir()
+    if args.backend == "pgvector":
+        os.environ["DATABASE_URL"] = args.database_url
+    config_path = bench_config(
+        workdir, ingest={"workers": 1}, retrieval={"hybrid": True}, vectorstore={"type": args.backend},
+    )
+    directory = write_sample_corpus(os.path.join(workdir, "pages"), CUSTOMER, pages=args.pages)
+
+    embeddings = load_embeddings(args.model)
+    ingest = RagIngest(config_path, embeddings=embeddings)
+    if args.backend == "pgvector":
+        drop_customer(ingest.store)
+    ingest.ingest_directory(CUSTOMER)
+
+    reranker = None if args.model else SkipReranker()
+    retriever = RagRetriever(config_path, embeddings=embeddings, reranker=reranker)
+    queries = exact_token_queries(directory, args.queries)
+
+    results = {}
+    print(f"{retriever.store.count(CUSTOMER)} chunks, {len(queries)} exact-token queries, top_k={args.top_k}")
+    for name, hybrid in (("vector", False), ("hybrid", True)):
+        retriever.hybrid = hybrid
+        evaluate(retriever, queries[:10], args.top_k)  # warm caches
+        hit_rate, latencies, skipped = evaluate(retriever, queries, args.top_k)
+        print(
+            f"{name:<7} hit@{args.top_k}={hit_rate:.3f}  p50={percentile(latencies, 50):6.3f}ms  "
+            f"p95={percentile(latencies, 95):6.3f}ms  rerank skipped={skipped:.0%}"
+        )
+        results[name] = hit_rate
+
+    # A process that never ran the ingest: no file (local stores), no row (pgvector)
+    if args.backend == "pgvector":
+        ingest.store._run(delete_lexical(ingest.store))
+    else:
+        shutil.rmtree(os.path.join(workdir, "chroma", "bm25"))
+    fresh = RagRetriever(config_path, embeddings=embeddings, reranker=reranker)
+    started = time.perf_counter()
+    hit_rate, _, _ = evaluate(fresh, queries, args.top_k)
+    rebuilt = fresh.lexical.get(CUSTOMER) is not None
+    ok = rebuilt and hit_rate == results["hybrid"]
+    print(
+        f"missing index: rebuilt={rebuilt} hit@{args.top_k}={hit_rate:.3f} "
+        f"(first pass incl. rebuild {time.perf_counter() - started:.1f}s)  {'PASS' if ok else 'FAIL'}"
+    )
+    return ok
+
+
+def drop_customer(store):
+    async def drop():
+        async with store._writer() as conn:
+            await conn.execute("DELETE FROM rag_chunks WHERE customer = %s", (CUSTOMER,))
+            await conn.commit()
+        await delete_lexical(store)
+    store._run(drop())
+
+
+async def delete_lexical(store):
+    async with store._writer() as conn:
+        await conn.execute("DELETE FROM rag_lexical WHERE customer = %s", (CUSTOMER,))
+        await conn.commit()
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,64 @@
+"""
+Import-time budget for the app module uvicorn loads.
+
+    python -m benchmarks.import_time [--budget 2.0] [--runs 5]
+
+Imports app.whatsapp in fresh interpreters and fails (exit 1) if the
+median import takes longer than --budget seconds, or if any module that
+should only load lazily (models, vector store, LangGraph, LLM SDKs, the
+crawler) was imported. Model loading belongs in the lifespan prewarm,
+behind /readyz, not in the import.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+LAZY_MODULES = [
+    "torch", "transformers", "sentence_transformers", "onnxruntime", "chromadb", "langchain_chroma",
+    "langgraph", "langchain_openai", "openai", "langchain_experimental", "langchain_community",
+    "playwright", "bs4", "redis",
+]
+
+PROBE = f"""
+import json, sys, time
+started = time.perf_counter()
+import app.whatsapp
+elapsed = time.perf_counter() - started
+print(json.dumps({{"seconds": elapsed, "loaded": [m for m in {LAZY_MODULES!r} if m in sys.modules]}}))
+"""
+
+
+def probe() -> dict:
+    env = {**os.environ, "PYTHONPATH": os.getcwd(), "GROQ_API_KEY": os.environ.get("GROQ_API_KEY", "benchmark")}
+    output = subprocess.run([sys.executable, "-c", PROBE], env=env, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget", type=float, default=2.0, help="median seconds allowed for import app.whatsapp")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    # The first run also pays for cold .pyc compilation and page cache; report it separately
+    cold = probe()
+    runs = [probe() for _ in range(args.runs)]
+    median = statistics.median(run["seconds"] for run in runs)
+    loaded = sorted({module for run in [cold] + runs for module in run["loaded"]})
+
+    print(f"import app.whatsapp: cold {cold['seconds']:.2f}s, warm median {median:.2f}s "
+          f"over {args.runs} runs (budget {args.budget:.2f}s)")
+    ok = median <= args.budget and not loaded
+    if loaded:
+        print(f"FAIL eagerly imported: {', '.join(loaded)}")
+    if median > args.budget:
+        print("FAIL over budget")
+    print("PASS" if ok else "FAIL")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Ingestion throughput: legacy per-file SemanticChunker + add_documents
+versus the batched RagIngest that reuses sentence embeddings, serial and
+with a process pool.
+
+    python -m benchmarks.ingest_throughput [--pages 200] [--workers 4] [--model]
+
+Without --model a deterministic hashing embedder is used, so the numbers
+show pipeline overhead and how many texts reach the embedding model
+rather than MiniLM latency.
+"""
+import argparse
+import os
+import time
+from langchain_chroma import Chroma
+from langchain_community.document_loaders import TextLoader
+from langchain_experimental.text_splitter import SemanticChunker
+from benchmarks.fixtures import bench_config, load_embeddings, make_workdir, write_sample_corpus
+from rag.ingest import RagIngest
+
+CUSTOMER = "+15550000001"
+
+
+def run_legacy(config_path: str, embeddings, directory: str) -> int:
+    # The pre-batching pipeline: chunk one file, embed its chunks again, write
+    from rag.utils import Utils
+    config = Utils(config_path).config
+    vectorstore = Chroma(
+        collection_name="rag_documents",
+        embedding_function=embeddings,
+        persist_directory=config["vectorstore"]["persist_directory"] + "_legacy"
+    )
+    chunker = SemanticChunker(embeddings, breakpoint_threshold_type="percentile", breakpoint_threshold_amount=90)
+
+    total = 0
+    for filename in sorted(os.listdir(directory)):
+        docs = TextLoader(os.path.join(directory, filename), encoding="utf-8").load()
+        chunks = chunker.create_documents(
+            texts=[d.page_content for d in docs],
+            metadatas=[d.metadata for d in docs]
+        )
+        for c in chunks:
+            c.metadata.update({"customer": CUSTOMER, "filename": filename})
+        vectorstore.add_documents(chunks)
+        total += len(chunks)
+    return total
+
+
+def report(name: str, chunks: int, elapsed: float, embeddings):
+    texts = getattr(embeddings, "texts_embedded", None)
+    calls = getattr(embeddings, "calls", None)
+    line = f"{name:<8} {chunks:>6} chunks  {elapsed:7.2f}s  {chunks / elapsed:8.1f} chunks/s"
+    if texts is not None:
+        line += f"  embed calls={calls}  texts embedded={texts}"
+    print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--model", action="store_true", help="use the configured embedding model")
+    args = parser.parse_args()
+
+    workdir = make_workdir()
+    config_path = bench_config(workdir, ingest={"workers": 1})
+    directory = write_sample_corpus(os.path.join(workdir, "pages"), CUSTOMER, pages=args.pages)
+
+    embeddings = load_embeddings(args.model)
+    started = time.perf_counter()
+    chunks = run_legacy(config_path, embeddings, directory)
+    report("before", chunks, time.perf_counter() - started, embeddings)
+
+    embeddings = load_embeddings(args.model)
+    ingest = RagIngest(config_path, embeddings=embeddings)
+    started = time.perf_counter()
+    chunks = ingest.ingest_directory(CUSTOMER)
+    report("after", chunks, time.perf_counter() - started, embeddings)
+    print(f"stored chunks: {ingest.store.count(CUSTOMER)}")
+
+    # Re-ingesting the same site must not grow the collection
+    embedded = embeddings.texts_embedded if hasattr(embeddings, "texts_embedded") else None
+    ingest.ingest_directory(CUSTOMER)
+    print(f"stored chunks after re-ingest: {ingest.store.count(CUSTOMER)}")
+    if embedded is not None:
+        print(f"texts embedded by re-ingest: {embeddings.texts_embedded - embedded}")
+
+    # Same corpus, chunked and embedded by a process pool into a fresh store
+    parallel_dir = make_workdir()
+    parallel_config = bench_config(parallel_dir, ingest={"workers": args.workers})
+    write_sample_corpus(os.path.join(parallel_dir, "pages"), CUSTOMER, pages=args.pages)
+    ingest = RagIngest(parallel_config, embeddings=None if args.model else load_embeddings(False))
+    started = time.perf_counter()
+    chunks = ingest.ingest_directory(CUSTOMER)
+    report(f"{args.workers} procs", chunks, time.perf_counter() - started, None)
+
+
+if __name__ == "__main__":
+    main()
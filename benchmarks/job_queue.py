@@ -0,0 +1,190 @@
+"""
+Durable job queue against a real Postgres.
+
+    python -m benchmarks.job_queue --database-url postgresql://... [--jobs 300] [--workers 4]
+
+Checks, exiting non-zero on failure:
+  - exactly-once: --jobs jobs shared by --workers JobWorkers (each its own
+    LISTEN connection and worker id) run once each and end up done
+  - retries: a job that fails twice is retried with backoff and succeeds;
+    one that always fails stops at max_attempts with its last error
+  - notify: an idle worker polling every 30s starts a new job within
+    milliseconds of the enqueue commit
+  - lease expiry: a job whose worker stops heartbeating is claimed again,
+    and the first worker's late result is ignored
+  - shutdown: a worker stopped while its only slot is busy finishes that
+    job and leaves the next one queued
+Uses (and empties) the jobs table of the given database.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from collections import Counter
+
+FAST = {"concurrency": 4, "poll_seconds": 1, "lease_seconds": 30, "backoff_base": 0.2, "backoff_max": 1}
+
+
+async def run_until(workers, done: asyncio.Event, timeout: float = 60):
+    tasks = [asyncio.create_task(worker.run()) for worker in workers]
+    try:
+        await asyncio.wait_for(done.wait(), timeout)
+    finally:
+        for worker in workers:
+            worker.stop()
+        await asyncio.gather(*tasks)
+
+
+async def main(args) -> bool:
+    os.environ["DATABASE_URL"] = args.database_url
+    from database.create_data import get_db_conn
+    from database.initdb import close_pool, init_db, init_pool
+    from service.jobs import JobWorker, enqueue_job
+
+    await init_pool()
+    await init_db()
+    async with get_db_conn() as conn:
+        await conn.execute("TRUNCATE jobs")
+        await conn.commit()
+
+    async def job_rows(kind: str):
+        async with get_db_conn() as conn:
+            cur = await conn.execute(
+                "SELECT status, attempts, progress, last_error FROM jobs WHERE kind = %s ORDER BY id", (kind,),
+            )
+            return await cur.fetchall()
+
+    results = []
+
+    # Exactly once across workers
+    runs = Counter()
+    all_done = asyncio.Event()
+
+    async def bench(payload, job):
+        runs[payload["n"]] += 1
+        await job.progress(step="halfway")
+        await asyncio.sleep(args.job_ms / 1000)
+        if sum(runs.values()) >= args.jobs:
+            all_done.set()
+
+    for n in range(args.jobs):
+        await enqueue_job("bench", {"n": n})
+    workers = [JobWorker({"bench": bench}, FAST, worker_id=f"worker-{i}") for i in range(args.workers)]
+    started = time.perf_counter()
+    await run_until(workers, all_done)
+    elapsed = time.perf_counter() - started
+    rows = await job_rows("bench")
+    ok = (len(runs) == args.jobs and set(runs.values()) == {1}
+          and all(status == "done" and progress == {"step": "halfway"} for status, _, progress, _ in rows))
+    per_worker = [worker.stats["done"] for worker in workers]
+    print(f"{'PASS' if ok else 'FAIL'} exactly-once  {args.jobs} jobs, {args.workers} workers x {FAST['concurrency']}: "
+          f"max runs per job {max(runs.values())}, done per worker {per_worker}, {elapsed:.2f}s "
+          f"({args.jobs / elapsed:.0f} jobs/s at {args.job_ms:.0f}ms per job)")
+    results.append(ok)
+
+    # Retries with backoff, then give up at max_attempts
+    attempts = Counter()
+    finished = asyncio.Event()
+    outcomes = {}
+
+    async def flaky(payload, job):
+        attempts[payload["name"]] += 1
+        if payload["name"] == "hopeless" or attempts[payload["name"]] < 3:
+            if payload["name"] == "hopeless" and job.attempts == job.max_attempts:
+                outcomes["hopeless"] = True
+            raise RuntimeError(f"attempt {job.attempts} failed")
+        outcomes["flaky"] = True
+
+    async def watch():
+        while len(outcomes) < 2 or (await job_rows("flaky"))[1][0] != "failed":
+            await asyncio.sleep(0.1)
+        finished.set()
+
+    await enqueue_job("flaky", {"name": "flaky"}, max_attempts=5)
+    await enqueue_job("flaky", {"name": "hopeless"}, max_attempts=3)
+    watcher = asyncio.create_task(watch())
+    started = time.perf_counter()
+    await run_until([JobWorker({"flaky": flaky}, FAST)], finished)
+    watcher.cancel()
+    (flaky_row, hopeless_row) = await job_rows("flaky")
+    ok = flaky_row[:2] == ("done", 3) and hopeless_row[:2] == ("failed", 3) and "attempt 3" in hopeless_row[3]
+    print(f"{'PASS' if ok else 'FAIL'} retries  flaky={flaky_row[0]} after {flaky_row[1]} attempts, "
+          f"hopeless={hopeless_row[0]} after {hopeless_row[1]} ({hopeless_row[3]!r}), {time.perf_counter() - started:.2f}s")
+    results.append(ok)
+
+    # NOTIFY wakes an idle worker long before its next poll
+    woke = asyncio.Event()
+    latencies = []
+    enqueued_at = {}
+
+    async def ping(payload, job):
+        latencies.append((time.perf_counter() - enqueued_at[payload["n"]]) * 1000)
+        if len(latencies) == 5:
+            woke.set()
+
+    async def enqueue_slowly():
+        await asyncio.sleep(0.5)
+        for n in range(5):
+            enqueued_at[n] = time.perf_counter()
+            await enqueue_job("ping", {"n": n})
+            await asyncio.sleep(0.2)
+
+    idle_worker = JobWorker({"ping": ping}, dict(FAST, poll_seconds=30))
+    producer = asyncio.create_task(enqueue_slowly())
+    await run_until([idle_worker], woke, timeout=20)
+    await producer
+    ok = max(latencies) < 1000
+    print(f"{'PASS' if ok else 'FAIL'} notify  enqueue-to-start with a 30s poll: "
+          f"{', '.join(f'{ms:.1f}' for ms in latencies)} ms")
+    results.append(ok)
+
+    # A worker that stops heartbeating loses the job to another
+    await enqueue_job("lease", {})
+    stalled = JobWorker({"lease": None}, dict(FAST, lease_seconds=1), worker_id="stalled")
+    rescuer = JobWorker({"lease": None}, FAST, worker_id="rescuer")
+    first = await stalled.claim()
+    blocked = await rescuer.claim()
+    await asyncio.sleep(1.2)
+    second = await rescuer.claim()
+    await rescuer._finish(second, "done")
+    await stalled._finish(first, "failed", "late result")
+    (row,) = await job_rows("lease")
+    ok = blocked is None and second is not None and second.attempts == 2 and row[0] == "done" and row[3] is None
+    print(f"{'PASS' if ok else 'FAIL'} lease-expiry  held lease blocked others={blocked is None}, "
+          f"reclaimed on attempt {second.attempts if second else None}, final status={row[0]!r}, "
+          f"late result ignored={row[3] is None}")
+    results.append(ok)
+
+    # stop() while the only slot is busy: the queued job is left for the next worker
+    started_jobs = []
+    first_running = asyncio.Event()
+
+    async def slow(payload, job):
+        started_jobs.append(payload["n"])
+        first_running.set()
+        await asyncio.sleep(0.5)
+
+    await enqueue_job("slow", {"n": 1})
+    await enqueue_job("slow", {"n": 2})
+    stopping = JobWorker({"slow": slow}, dict(FAST, concurrency=1))
+    run = asyncio.create_task(stopping.run())
+    await first_running.wait()
+    stopping.stop()
+    await run
+    rows = await job_rows("slow")
+    ok = started_jobs == [1] and [row[0] for row in rows] == ["done", "queued"]
+    print(f"{'PASS' if ok else 'FAIL'} shutdown  jobs started {started_jobs}, statuses {[row[0] for row in rows]}")
+    results.append(ok)
+
+    await close_pool()
+    return all(results)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=os.getenv("DATABASE_URL"), required=not os.getenv("DATABASE_URL"))
+    parser.add_argument("--jobs", type=int, default=300)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--job-ms", type=float, default=20)
+    sys.exit(0 if asyncio.run(main(parser.parse_args())) else 1)
@@ -0,0 +1,99 @@
+"""
+Lease-based lead monitor against a real Postgres.
+
+    python -m benchmarks.lead_monitor --database-url postgresql://... [--sessions 500] [--workers 8]
+
+Records --sessions idle conversations, then runs --workers monitors
+concurrently, each with its own PostgresSessionStore (its own lease
+owner) and a fake enrichment that takes --enrich-ms. Asserts that every
+lead was patched exactly once, then that a session whose lease expired
+mid-enrichment is taken over and the slow worker's late result is
+discarded. Exits non-zero on failure. Uses (and empties) the
+conversation_sessions, leads and lead_phones tables of the given database.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from collections import Counter
+from datetime import timedelta
+
+
+async def main(args) -> bool:
+    os.environ["DATABASE_URL"] = args.database_url
+    from langchain_core.messages import AIMessage, HumanMessage
+    from database.create_data import get_db_conn, insert_lead
+    from database.initdb import close_pool, init_db, init_pool
+    from service.sessions import PostgresSessionStore
+
+    await init_pool()
+    await init_db()
+    async with get_db_conn() as conn:
+        await conn.execute("TRUNCATE conversation_sessions, leads, lead_phones")
+        await conn.commit()
+
+    phones = [f"+1777{i:07d}" for i in range(args.sessions)]
+    recorder = PostgresSessionStore()
+    for phone in phones:
+        await insert_lead("+15550000001", phone, "Load Test", "Conversation in progress...", "Neutral", 0.0)
+        await recorder.record_turn(phone, "+15550000001", "Load Test",
+                                   [HumanMessage(content="Is the Camry available?"), AIMessage(content="Yes!")])
+
+    patched = Counter()
+    results = []
+
+    async def worker(n: int):
+        store = PostgresSessionStore(owner=f"worker-{n}", lease_seconds=30)
+        while True:
+            sessions = await store.claim_idle(timedelta(0), args.batch)
+            if not sessions:
+                return
+            for session in sessions:
+                await asyncio.sleep(args.enrich_ms / 1000)
+                if await store.complete(session, f"summary by worker-{n}", "Positive", 0.5):
+                    patched[session.user_phone] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(n) for n in range(args.workers)))
+    elapsed = time.perf_counter() - started
+    async with get_db_conn() as conn:
+        cur = await conn.execute("SELECT count(*) FROM leads WHERE summary LIKE 'summary by worker-%'")
+        (db_patched,) = await cur.fetchone()
+    ok = len(patched) == len(phones) and set(patched.values()) == {1} and db_patched == len(phones)
+    print(f"{'PASS' if ok else 'FAIL'} exactly-once  {len(phones)} sessions, {args.workers} workers: "
+          f"{sum(patched.values())} patches, {db_patched} leads patched, max per lead {max(patched.values())}, "
+          f"{elapsed:.2f}s ({len(phones) / elapsed:.0f} sessions/s at {args.enrich_ms:.0f}ms per enrichment)")
+    results.append(ok)
+
+    # A slow worker's lease expires; another takes the session over and the slow result is discarded
+    phone = phones[0]
+    await recorder.record_turn(phone, "+15550000001", "Load Test", [HumanMessage(content="One more question")])
+    slow = PostgresSessionStore(owner="slow", lease_seconds=1)
+    fast = PostgresSessionStore(owner="fast", lease_seconds=30)
+    (slow_session,) = await slow.claim_idle(timedelta(0), 1)
+    none_yet = await fast.claim_idle(timedelta(0), 1)
+    await asyncio.sleep(1.2)
+    (fast_session,) = await fast.claim_idle(timedelta(0), 1)
+    fast_ok = await fast.complete(fast_session, "summary by fast", "Positive", 0.9)
+    slow_ok = await slow.complete(slow_session, "summary by slow", "Negative", -0.9)
+    async with get_db_conn() as conn:
+        cur = await conn.execute("SELECT summary FROM leads WHERE phone_number = %s", (phone,))
+        (summary,) = await cur.fetchone()
+    ok = not none_yet and fast_ok and not slow_ok and summary == "summary by fast"
+    print(f"{'PASS' if ok else 'FAIL'} lease-expiry  held lease blocked others={not none_yet}, "
+          f"takeover completed={fast_ok}, late result discarded={not slow_ok}, lead summary={summary!r}")
+    results.append(ok)
+
+    await close_pool()
+    return all(results)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=os.getenv("DATABASE_URL"), required=not os.getenv("DATABASE_URL"))
+    parser.add_argument("--sessions", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--batch", type=int, default=10)
+    parser.add_argument("--enrich-ms", type=float, default=20)
+    sys.exit(0 if asyncio.run(main(parser.parse_args())) else 1)
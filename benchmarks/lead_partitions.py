@@ -0,0 +1,169 @@
+"""
+Schema migrations and the partitioned leads table against a real Postgres.
+
+    python -m benchmarks.lead_partitions --database-url postgresql://... [--leads 200000] [--clients 50]
+
+Drops the leads, lead_phones, campaigns, schema_migrations and leads_archive objects of the given
+database, rebuilds the pre-migration schema (plain leads table, no
+indexes) with --leads rows spread over the last 36 months, and times the
+dashboard query and the sentiment patch. Then runs init_db from three
+"replicas" at once and checks, exiting non-zero on failure:
+  - each migration applied exactly once, every row kept, nothing in leads_default
+  - insert_lead still keeps one lead per phone under concurrent inserts
+  - lead maintenance archives the partitions past the retention window
+  - with a month's partition missing, init_db from three replicas and two
+    maintenance runs at once all succeed and create it once
+and times the same two queries on the migrated table.
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+DASHBOARD = """
+    SELECT id, phone_number, username, summary, sentiment_label, sentiment_score, created_at
+    FROM leads WHERE client = %s ORDER BY id DESC
+"""
+# patch_lead_sentiment's lookup before and after the migration
+PATCH_BEFORE = """
+    UPDATE leads SET summary = %s
+    WHERE id = (SELECT id FROM leads WHERE phone_number = %s ORDER BY created_at DESC LIMIT 1)
+"""
+PATCH_AFTER = """
+    UPDATE leads SET summary = %s
+    WHERE (id, created_at) = (SELECT lead_id, created_at FROM lead_phones WHERE phone_number = %s)
+"""
+
+
+async def time_queries(conn, patch: str, clients: list[str], phones: list[str], repeat: int) -> dict:
+    timings = {"dashboard": [], "patch": []}
+    for i in range(repeat):
+        started = time.perf_counter()
+        await (await conn.execute(DASHBOARD, (clients[i % len(clients)],))).fetchall()
+        timings["dashboard"].append((time.perf_counter() - started) * 1000)
+        started = time.perf_counter()
+        await conn.execute(patch, ("patched", phones[i * 7919 % len(phones)]))
+        await conn.commit()
+        timings["patch"].append((time.perf_counter() - started) * 1000)
+    return {name: sorted(values)[len(values) // 2] for name, values in timings.items()}
+
+
+async def main(args) -> bool:
+    os.environ["DATABASE_URL"] = args.database_url
+    from database.create_data import get_db_conn, insert_lead
+    from database.initdb import close_pool, init_db, init_pool
+    from database.migrations import MIGRATIONS, baseline
+    import service.retention as retention
+
+    await init_pool()
+    rng = random.Random(5)
+    now = datetime.now(timezone.utc)
+    clients = [f"+1555{c:07d}" for c in range(args.clients)]
+    phones = [f"+1888{i:07d}" for i in range(args.leads)]
+
+    async with get_db_conn() as conn:
+        await conn.execute("DROP TABLE IF EXISTS leads, lead_phones, schema_migrations, campaigns CASCADE")
+        await conn.execute("DROP SCHEMA IF EXISTS leads_archive CASCADE")
+        async with conn.cursor() as cur:
+            await baseline(cur)
+            async with cur.copy("COPY leads (client, phone_number, username, summary, sentiment_label, "
+                                "sentiment_score, created_at) FROM STDIN") as copy:
+                for phone in phones:
+                    created = now - timedelta(days=rng.uniform(0, 36 * 30))
+                    await copy.write_row((rng.choice(clients), phone, "Bench", "Conversation in progress...",
+                                          "Neutral", 0.0, created))
+        await conn.execute("ANALYZE leads")
+        await conn.commit()
+        before = await time_queries(conn, PATCH_BEFORE, clients, phones, args.repeat)
+    print(f"before: {args.leads} leads, plain table  dashboard p50={before['dashboard']:.2f}ms  "
+          f"patch p50={before['patch']:.2f}ms")
+
+    results = []
+    started = time.perf_counter()
+    await asyncio.gather(*(init_db() for _ in range(3)))
+    elapsed = time.perf_counter() - started
+    async with get_db_conn() as conn:
+        versions = [v for (v,) in await (await conn.execute("SELECT version FROM schema_migrations ORDER BY 1")).fetchall()]
+        (rows,) = await (await conn.execute("SELECT count(*) FROM leads")).fetchone()
+        (stray,) = await (await conn.execute("SELECT count(*) FROM leads_default")).fetchone()
+        (partitions,) = await (await conn.execute(
+            "SELECT count(*) FROM pg_inherits WHERE inhparent = 'leads'::regclass")).fetchone()
+    ok = versions == [v for v, _, _ in MIGRATIONS] and rows == args.leads and stray == 0
+    print(f"{'PASS' if ok else 'FAIL'} migrate  3 concurrent init_db in {elapsed:.1f}s: versions {versions}, "
+          f"{rows} rows kept, {partitions} partitions, {stray} rows in leads_default")
+    results.append(ok)
+
+    await asyncio.gather(*(insert_lead(clients[0], "+19990000001", "Dup", "hi", "Neutral", 0.0) for _ in range(20)))
+    await insert_lead(clients[0], phones[0], "Existing", "hi", "Neutral", 0.0)
+    async with get_db_conn() as conn:
+        (new_count,) = await (await conn.execute(
+            "SELECT count(*) FROM leads WHERE phone_number = '+19990000001'")).fetchone()
+        (old_count,) = await (await conn.execute(
+            "SELECT count(*) FROM leads WHERE phone_number = %s", (phones[0],))).fetchone()
+    ok = new_count == 1 and old_count == 1
+    print(f"{'PASS' if ok else 'FAIL'} one-lead-per-phone  20 concurrent inserts -> {new_count} row, "
+          f"repeat contact -> {old_count} row")
+    results.append(ok)
+
+    async with get_db_conn() as conn:
+        after = await time_queries(conn, PATCH_AFTER, clients, phones, args.repeat)
+    print(f"after: partitioned + indexed  dashboard p50={after['dashboard']:.2f}ms "
+          f"({before['dashboard'] / after['dashboard']:.1f}x)  patch p50={after['patch']:.2f}ms "
+          f"({before['patch'] / after['patch']:.1f}x)")
+
+    retention._retention_settings = {"months": 24, "archive_schema": "leads_archive"}
+    outcome = await retention.run_lead_maintenance()
+    async with get_db_conn() as conn:
+        (live,) = await (await conn.execute("SELECT count(*) FROM leads")).fetchone()
+        (archived,) = await (await conn.execute(
+            "SELECT count(*) FROM pg_tables WHERE schemaname = 'leads_archive'")).fetchone()
+        (oldest,) = await (await conn.execute("SELECT min(created_at) FROM leads")).fetchone()
+        (claimed,) = await (await conn.execute("SELECT count(*) FROM lead_phones")).fetchone()
+    ok = (len(outcome["archived"]) == archived and archived >= 11 and claimed == live
+          and oldest > now - timedelta(days=25 * 31))
+    print(f"{'PASS' if ok else 'FAIL'} retention  archived {archived} monthly partitions "
+          f"({outcome['archived'][0]} .. {outcome['archived'][-1]}), {live} leads live, oldest {oldest:%Y-%m}, "
+          f"{claimed} phones still claimed")
+    results.append(ok)
+
+    async with get_db_conn() as conn:
+        cur = await conn.execute("SELECT phone_number FROM lead_phones")
+        live_phones = [phone for (phone,) in await cur.fetchall()]
+        retained = await time_queries(conn, PATCH_AFTER, clients, live_phones, args.repeat)
+    print(f"after retention: dashboard p50={retained['dashboard']:.2f}ms "
+          f"({before['dashboard'] / retained['dashboard']:.1f}x)  patch p50={retained['patch']:.2f}ms "
+          f"({before['patch'] / retained['patch']:.1f}x)")
+
+    # A missing partition raced by starting replicas and the maintenance job
+    from database.initdb import LEAD_PARTITIONS_AHEAD
+    from database.partitions import month_start, partition_name
+    missing = partition_name(month_start(now.date(), LEAD_PARTITIONS_AHEAD))
+    async with get_db_conn() as conn:
+        await conn.execute(f"DROP TABLE {missing}")
+        await conn.commit()
+    outcomes = await asyncio.gather(
+        *(init_db() for _ in range(3)), *(retention.run_lead_maintenance() for _ in range(2)),
+        return_exceptions=True,
+    )
+    errors = [outcome for outcome in outcomes if isinstance(outcome, Exception)]
+    async with get_db_conn() as conn:
+        (exists,) = await (await conn.execute("SELECT to_regclass(%s)", (missing,))).fetchone()
+    ok = not errors and exists is not None
+    print(f"{'PASS' if ok else 'FAIL'} partition-race  3 init_db + 2 maintenance runs with {missing} missing: "
+          f"{len(errors)} failed {errors[:1]}, recreated={exists is not None}")
+    results.append(ok)
+
+    await close_pool()
+    return all(results)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=os.getenv("DATABASE_URL"), required=not os.getenv("DATABASE_URL"))
+    parser.add_argument("--leads", type=int, default=200_000)
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=50)
+    sys.exit(0 if asyncio.run(main(parser.parse_args())) else 1)
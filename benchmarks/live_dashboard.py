@@ -0,0 +1,190 @@
+"""
+Live dashboard updates (SSE fed by LISTEN/NOTIFY) against a real Postgres.
+
+    python -m benchmarks.live_dashboard --database-url postgresql://... [--subscribers 500] [--clients 50]
+
+Serves app.whatsapp with uvicorn on a local port, signs a business in and
+checks, exiting non-zero on failure:
+  - end to end: the /login/dashboard/events stream delivers a `lead` event
+    for the business's new lead and for the sentiment patch, and nothing
+    for another business's lead
+  - fan-out: --subscribers streams spread over --clients businesses each
+    receive exactly their own business's changes, all from one LISTEN
+    connection
+  - bounded: a stream ends with a `reconnect` event after SSE_MAX_SECONDS
+    even with no changes to send, and an open stream doesn't hold up
+    server shutdown past that
+Reports write-to-delivery latency and, for comparison, what a dashboard
+refresh (fetch_all_leads) costs for a business with --leads leads. Adds
+rows to customers and leads of the given database.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import socket
+import sys
+import time
+import httpx
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def read_events(response: httpx.Response, events: list, arrived: asyncio.Event):
+    name = None
+    async for line in response.aiter_lines():
+        if line.startswith("event: "):
+            name = line[7:]
+        elif line.startswith("data: ") and name:
+            events.append((time.perf_counter(), name, json.loads(line[6:])))
+            arrived.set()
+            name = None
+
+
+async def main(args) -> bool:
+    os.environ["DATABASE_URL"] = args.database_url
+    os.environ.setdefault("GROQ_API_KEY", "benchmark")
+    import uvicorn
+    import app.whatsapp as whatsapp
+    from database.create_data import get_db_conn, insert_customers, insert_lead, patch_lead_sentiment
+    from database.retrieve_data import fetch_all_leads
+    from service.lead_events import hub
+    from service.security import hash_password
+
+    run = int(time.time()) % 100000
+    business = f"+1556{run:05d}00"
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(whatsapp.app, port=port, log_level="warning", lifespan="on"))
+    serving = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+    await asyncio.wait_for(hub.connected.wait(), 10)
+    results = []
+
+    # End to end through the SSE endpoint
+    await insert_customers(business, hash_password("secret"), "https://example.com", "Austin")
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=30) as http:
+        await http.post("/login", data={"username": business, "password": "secret"})
+        events, arrived = [], asyncio.Event()
+        async with http.stream("GET", "/login/dashboard/events") as response:
+            reader = asyncio.create_task(read_events(response, events, arrived))
+            await asyncio.sleep(0.2)
+            phone = f"+1777{run:05d}01"
+            started = time.perf_counter()
+            await insert_lead(business, phone, "Live Test", "Conversation in progress...", "Neutral", 0.0)
+            await insert_lead("+15550000001", f"+1777{run:05d}02", "Other", "hi", "Neutral", 0.0)
+            await asyncio.wait_for(arrived.wait(), 5)
+            insert_ms = (events[0][0] - started) * 1000
+            arrived.clear()
+            started = time.perf_counter()
+            await patch_lead_sentiment(phone, "Wants a test drive", "Positive", 0.8)
+            await asyncio.wait_for(arrived.wait(), 5)
+            patch_ms = (events[1][0] - started) * 1000
+            await asyncio.sleep(0.3)
+            reader.cancel()
+    ok = (len(events) == 2 and [e[1] for e in events] == ["lead", "lead"]
+          and events[0][2]["phone_number"] == phone and events[1][2]["sentiment_label"] == "Positive")
+    print(f"{'PASS' if ok else 'FAIL'} end-to-end  SSE events {[(e[1], e[2].get('sentiment_label')) for e in events]}, "
+          f"insert->browser {insert_ms:.1f}ms, patch->browser {patch_ms:.1f}ms")
+    results.append(ok)
+
+    # Streams end on a timer (with a reconnect event) instead of living forever
+    whatsapp.SSE_MAX_SECONDS = 1.0
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=30) as http:
+        await http.post("/login", data={"username": business, "password": "secret"})
+        ended, arrived = [], asyncio.Event()
+        started = time.perf_counter()
+        async with http.stream("GET", "/login/dashboard/events") as response:
+            await read_events(response, ended, arrived)
+        lifetime = time.perf_counter() - started
+    ok = [e[1] for e in ended] == ["reconnect"] and 1.0 <= lifetime < 2.0
+    print(f"{'PASS' if ok else 'FAIL'} bounded  idle stream ended after {lifetime:.2f}s with {[e[1] for e in ended]} "
+          f"(SSE_MAX_SECONDS=1, heartbeat {whatsapp.SSE_HEARTBEAT}s)")
+    results.append(ok)
+
+    # Fan-out from the one listener
+    clients = [f"+1557{run:05d}{c:02d}" for c in range(args.clients)]
+    queues = [(clients[i % len(clients)], hub.subscribe(clients[i % len(clients)])) for i in range(args.subscribers)]
+    received_before = hub.stats["received"]
+    written_at, latencies, misrouted = {}, [], []
+
+    async def subscriber(client: str, queue: asyncio.Queue):
+        event = await asyncio.wait_for(queue.get(), 10)
+        latencies.append((time.perf_counter() - written_at[event["lead"]["phone_number"]]) * 1000)
+        misrouted.append(event["lead"]["client"] != client)
+
+    consumers = asyncio.gather(*(subscriber(client, queue) for client, queue in queues))
+    started = time.perf_counter()
+    for c, client in enumerate(clients):
+        lead_phone = f"+1778{run:05d}{c:02d}"
+        written_at[lead_phone] = time.perf_counter()
+        await insert_lead(client, lead_phone, "Fan-out", "hi", "Neutral", 0.0)
+    await consumers
+    await asyncio.sleep(0.2)
+    wrong = sum(misrouted) + sum(not queue.empty() for _, queue in queues)
+    elapsed = time.perf_counter() - started
+    for client, queue in queues:
+        hub.unsubscribe(client, queue)
+    async with get_db_conn() as conn:
+        cur = await conn.execute(
+            "SELECT count(*) FROM pg_stat_activity WHERE query LIKE 'LISTEN lead_changes%%' AND pid <> pg_backend_pid()"
+        )
+        (listeners,) = await cur.fetchone()
+    latencies.sort()
+    ok = wrong == 0 and listeners == 1 and hub.stats["received"] - received_before == len(clients)
+    print(f"{'PASS' if ok else 'FAIL'} fan-out  {len(clients)} lead inserts -> {len(queues)} subscribers over "
+          f"{listeners} LISTEN connection in {elapsed * 1000:.0f}ms: write->queue p50={latencies[len(latencies) // 2]:.1f}ms "
+          f"p95={latencies[int(len(latencies) * 0.95)]:.1f}ms, misrouted={wrong}")
+    results.append(ok)
+
+    # What each refresh used to cost
+    busy = f"+1558{run:05d}00"
+    async with get_db_conn() as conn:
+        async with conn.cursor() as cur:
+            async with cur.copy("COPY leads (client, phone_number, username, summary, sentiment_label, "
+                                "sentiment_score) FROM STDIN") as copy:
+                for i in range(args.leads):
+                    await copy.write_row((busy, f"+1779{run:05d}{i:06d}", "Bench", "Asked about financing " * 5,
+                                          "Neutral", 0.0))
+        await conn.commit()
+    timings = []
+    for _ in range(20):
+        started = time.perf_counter()
+        rows = await fetch_all_leads(busy)
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    payload = len(json.dumps(events[1][2]))
+    print(f"refresh  fetch_all_leads for {len(rows)} leads p50={timings[10]:.1f}ms per refresh "
+          f"vs one SSE event of {payload} bytes per change")
+
+    # Shutdown with a dashboard still open waits at most for its stream to end
+    whatsapp.SSE_MAX_SECONDS = 2.0
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=30) as http:
+        await http.post("/login", data={"username": business, "password": "secret"})
+        async with http.stream("GET", "/login/dashboard/events") as response:
+            reader = asyncio.create_task(read_events(response, [], asyncio.Event()))
+            await asyncio.sleep(0.2)
+            started = time.perf_counter()
+            server.should_exit = True
+            await asyncio.wait_for(serving, 10)
+            shutdown = time.perf_counter() - started
+            reader.cancel()
+    ok = shutdown < 3.0
+    print(f"{'PASS' if ok else 'FAIL'} shutdown  with an open stream took {shutdown:.2f}s (SSE_MAX_SECONDS=2)")
+    results.append(ok)
+    return all(results)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=os.getenv("DATABASE_URL"), required=not os.getenv("DATABASE_URL"))
+    parser.add_argument("--subscribers", type=int, default=500)
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--leads", type=int, default=5000, help="leads of the business whose refresh is timed")
+    logging.disable(logging.WARNING)
+    sys.exit(0 if asyncio.run(main(parser.parse_args())) else 1)
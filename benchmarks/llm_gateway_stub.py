@@ -0,0 +1,157 @@
+"""
+LLMGateway against a local OpenAI-compatible stub server.
+
+    python -m benchmarks.llm_gateway_stub
+
+Scenarios (each asserts its expected behaviour and prints latencies):
+  healthy    - primary answers quickly, no hedges
+  tail       - 1 in 5 primary calls stalls; the hedge to the fallback answers
+  drift      - primary latency is spread out (30-480ms); the hedge delay
+               tracks its real p95 instead of shrinking to the fast calls
+               that won, so most calls are not hedged
+  failing    - primary returns 500s; calls fail over, the breaker opens and
+               later calls skip the primary until a half-open probe succeeds
+  deadline   - every provider stalls; the call fails at the deadline
+Exits non-zero if any scenario misbehaves.
+"""
+import asyncio
+import socket
+import sys
+import threading
+import time
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from langchain_core.messages import HumanMessage
+import uvicorn
+from agent.llm_gateway import CircuitBreaker, LLMGateway, Provider, build_chat_model
+from benchmarks.fixtures import percentile
+
+# model name -> fn(call number) -> (delay seconds, HTTP status)
+BEHAVIOUR = {}
+CALLS = {}
+
+stub = FastAPI()
+
+
+@stub.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    model = body["model"]
+    CALLS[model] = CALLS.get(model, 0) + 1
+    delay, status = BEHAVIOUR[model](CALLS[model])
+    await asyncio.sleep(delay)
+    if status != 200:
+        return JSONResponse({"error": {"message": "stub failure", "type": "server_error"}}, status_code=status)
+    return {
+        "id": f"stub-{CALLS[model]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": f"answer from {model}"}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": 5, "completion_tokens": 3, "total_tokens": 8},
+    }
+
+
+def start_stub() -> str:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(stub, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}/v1"
+
+
+def make_gateway(base_url: str, models: list[str], deadline: float = 2.0, reset: float = 1.0) -> LLMGateway:
+    defaults = {"temperature": 0.0, "max_tokens": 16}
+    providers = [
+        Provider(model, build_chat_model({"type": "openai", "model_name": model, "base_url": base_url}, defaults, deadline),
+                 CircuitBreaker(failure_threshold=3, reset_timeout=reset))
+        for model in models
+    ]
+    return LLMGateway(providers, deadline=deadline, hedge_percentile=95, hedge_min_delay=0.15, hedge_min_samples=10)
+
+
+async def run_calls(gateway: LLMGateway, count: int):
+    latencies, answers, errors = [], [], []
+    for _ in range(count):
+        started = time.perf_counter()
+        try:
+            result = await gateway.ainvoke([HumanMessage(content="hi")])
+            answers.append(result.content)
+        except Exception as e:
+            errors.append(type(e).__name__)
+        latencies.append((time.perf_counter() - started) * 1000)
+    return latencies, answers, errors
+
+
+def report(name: str, latencies, answers, errors, gateway: LLMGateway, ok: bool) -> bool:
+    winners = {model: sum(answer.endswith(model) for answer in answers) for model in CALLS}
+    print(
+        f"{'PASS' if ok else 'FAIL'} {name:<9} p50={percentile(latencies, 50):7.1f}ms p99={percentile(latencies, 99):7.1f}ms "
+        f"hedges={gateway.hedges} errors={len(errors)} answered_by={winners} "
+        f"breakers={ {p.name: p.breaker.state for p in gateway.providers} }"
+    )
+    return ok
+
+
+async def main() -> bool:
+    base_url = start_stub()
+    results = []
+
+    # healthy: no hedging once the primary's p95 is known
+    BEHAVIOUR.update(primary=lambda n: (0.03, 200), fallback=lambda n: (0.03, 200))
+    CALLS.clear()
+    gateway = make_gateway(base_url, ["primary", "fallback"])
+    latencies, answers, errors = await run_calls(gateway, 40)
+    results.append(report("healthy", latencies, answers, errors, gateway,
+                          not errors and gateway.hedges == 0 and CALLS.get("fallback", 0) == 0))
+
+    # tail: every 5th primary call stalls for 1.5s; without hedging p99 would be ~1500ms
+    BEHAVIOUR.update(primary=lambda n: (1.5 if n % 5 == 0 else 0.03, 200), fallback=lambda n: (0.05, 200))
+    CALLS.clear()
+    gateway = make_gateway(base_url, ["primary", "fallback"])
+    latencies, answers, errors = await run_calls(gateway, 40)
+    results.append(report("tail", latencies, answers, errors, gateway,
+                          not errors and gateway.hedges >= 7 and percentile(latencies, 99) < 600))
+
+    # drift: calls that lose the hedge race still count (as lower bounds) towards the primary's p95
+    BEHAVIOUR.update(primary=lambda n: (0.03 + 0.05 * (n % 10), 200), fallback=lambda n: (0.03, 200))
+    CALLS.clear()
+    gateway = make_gateway(base_url, ["primary", "fallback"])
+    latencies, answers, errors = await run_calls(gateway, 150)
+    hedge_delay = gateway.hedge_delay(gateway.providers[0])
+    print(f"     drift     hedge delay {hedge_delay * 1000:.0f}ms (primary's true p95 ~455ms), "
+          f"{gateway.hedges} of {len(latencies)} calls hedged")
+    results.append(report("drift", latencies, answers, errors, gateway,
+                          not errors and hedge_delay > 0.35 and gateway.hedges < len(latencies) // 2))
+
+    # failing: 500s from the primary open its breaker; then it is skipped
+    BEHAVIOUR.update(primary=lambda n: (0.01, 500), fallback=lambda n: (0.03, 200))
+    CALLS.clear()
+    gateway = make_gateway(base_url, ["primary", "fallback"], reset=2.0)
+    latencies, answers, errors = await run_calls(gateway, 20)
+    primary_calls = CALLS.get("primary", 0)
+    ok = not errors and primary_calls == 3 and gateway.providers[0].breaker.state == "open"
+
+    # after the reset timeout a single probe goes through and closes the breaker
+    BEHAVIOUR["primary"] = lambda n: (0.01, 200)
+    await asyncio.sleep(2.1)
+    probe_latencies, probe_answers, probe_errors = await run_calls(gateway, 5)
+    ok = ok and not probe_errors and gateway.providers[0].breaker.state == "closed" and probe_answers[0].endswith("primary")
+    results.append(report("failing", latencies + probe_latencies, answers + probe_answers, errors + probe_errors, gateway, ok))
+
+    # deadline: nobody answers in time
+    BEHAVIOUR.update(primary=lambda n: (3.0, 200), fallback=lambda n: (3.0, 200))
+    CALLS.clear()
+    gateway = make_gateway(base_url, ["primary", "fallback"], deadline=0.5)
+    latencies, answers, errors = await run_calls(gateway, 3)
+    results.append(report("deadline", latencies, answers, errors, gateway,
+                          errors == ["TimeoutError"] * 3 and max(latencies) < 700))
+
+    return all(results)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(main()) else 1)
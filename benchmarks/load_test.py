@@ -0,0 +1,226 @@
+"""
+Load test: synthetic multi-tenant WhatsApp conversations replayed against
+app.whatsapp's /whatsapp endpoint, in-process and offline.
+
+    python -m benchmarks.load_test [--tenants 3] [--users 60] [--messages 5] [--llm-ms 300]
+
+Each user is a closed loop: send a message, wait for the TwiML reply,
+think for --think-ms, send the next. The real FastAPI app, agent graph,
+intent router, retriever, context packer, dedup and admission control
+run as in production; only the edges are replaced:
+  - the LLM gateway's provider is a deterministic fake chat model
+    (--llm-ms mean latency, reply derived from the prompt)
+  - Twilio's REST API is an httpx MockTransport, so nothing is sent
+  - each tenant gets a fixture Chroma index of the sample dealer corpus,
+    embedded with the hashing embedder (--model for the real models)
+  - lead upserts take --db-ms unless --database-url points at Postgres
+Reports p50/p95/p99 latency, messages/s, shed replies, where the time went
+(from the Prometheus registry) and RSS sampled every second.
+"""
+import argparse
+import asyncio
+import hashlib
+import itertools
+import logging
+import os
+import random
+import time
+import httpx
+from langchain_core.messages import AIMessage
+from benchmarks.fixtures import (
+    bench_config, load_embeddings, make_workdir, percentile, rss_mib, sample_queries, write_sample_corpus,
+)
+
+SMALL_TALK = ["hi", "thanks!", "ok", "👍", "hello there", "great, thank you"]
+
+
+# -----------------------
+#   Fakes at the edges
+# -----------------------
+class FakeChatModel:
+    """
+    Deterministic stand-in for ChatGroq: the reply and the latency
+    (0.5x to 1.5x the mean) are derived from the prompt.
+    """
+
+    def __init__(self, mean_latency: float):
+        self.mean_latency = mean_latency
+        self.calls = 0
+
+    async def ainvoke(self, messages, **kwargs):
+        self.calls += 1
+        prompt = "\n".join(str(getattr(message, "content", message)) for message in messages)
+        digest = hashlib.blake2b(prompt.encode("utf-8"), digest_size=8).digest()
+        await asyncio.sleep(self.mean_latency * (0.5 + digest[0] / 255))
+        return AIMessage(content=f"Happy to help! Reference {digest.hex()[:8]}.")
+
+
+def fake_twilio_transport(sent: list) -> httpx.MockTransport:
+    sids = itertools.count(1)
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        sent.append(request.content)
+        return httpx.Response(201, json={"sid": f"SM{next(sids):032d}", "status": "queued"})
+
+    return httpx.MockTransport(handler)
+
+
+# -----------------------
+#   Setup
+# -----------------------
+def build_fixture_retriever(args, workdir: str, tenants: list[str]):
+    from rag.ingest import RagIngest
+    from rag.retrieve import RagRetriever
+    from benchmarks.hybrid_retrieval import SkipReranker
+
+    config_path = bench_config(workdir, ingest={"workers": 1})
+    embeddings = load_embeddings(args.model)
+    for tenant in tenants:
+        write_sample_corpus(os.path.join(workdir, "pages"), tenant, pages=args.pages, seed=int(tenant[-4:]))
+        RagIngest(config_path, embeddings=embeddings).ingest_directory(tenant)
+    reranker = None if args.model else SkipReranker()
+    return config_path, embeddings, RagRetriever(config_path, embeddings=embeddings, reranker=reranker)
+
+
+def install_fakes(args, config_path: str, embeddings, retriever, twilio_sent: list) -> FakeChatModel:
+    import agent.intent as intent
+    import agent.react_agent as react_agent
+    import client.twilio_client as twilio_client
+    from agent.llm_gateway import CircuitBreaker, LLMGateway, Provider
+    from service.leads import LeadService
+
+    chat_model = FakeChatModel(args.llm_ms / 1000)
+    react_agent._llm_gateway = LLMGateway(
+        [Provider("fake", chat_model, CircuitBreaker())], deadline=30.0, hedge_min_delay=30.0,
+    )
+    react_agent._rag_retriever = retriever
+    intent._router = intent.IntentRouter(config_path, embeddings=embeddings)
+
+    twilio = twilio_client.AsyncTwilioClient("ACfake", "token", {"rate_per_second": 1e6, "burst": 1e6})
+    twilio.http = httpx.AsyncClient(base_url=twilio.base_url, transport=fake_twilio_transport(twilio_sent))
+    twilio_client._client = twilio
+
+    if not args.database_url:
+        async def capture_initial_contact(client: str, user_mobile: str, username: str):
+            await asyncio.sleep(args.db_ms / 1000)
+
+        LeadService.capture_initial_contact = staticmethod(capture_initial_contact)
+    return chat_model
+
+
+# -----------------------
+#   Traffic
+# -----------------------
+async def user_session(http: httpx.AsyncClient, tenant: str, user: str, messages: list[str], think: float,
+                       results: list, sids):
+    for body in messages:
+        started = time.perf_counter()
+        response = await http.post("/whatsapp", data={
+            "To": f"whatsapp:{tenant}", "From": f"whatsapp:{user}", "Body": body,
+            "ProfileName": "Load Test", "MessageSid": f"SM{next(sids):032d}",
+        })
+        results.append((tenant, (time.perf_counter() - started) * 1000, response.status_code, response.text))
+        await asyncio.sleep(think)
+
+
+async def sample_rss(samples: list, started: float, interval: float = 1.0):
+    while True:
+        samples.append((time.perf_counter() - started, rss_mib()))
+        await asyncio.sleep(interval)
+
+
+def step_breakdown() -> list[tuple[str, int, float]]:
+    """(metric, count, mean ms) for each step and agent stage seen during the run."""
+    from prometheus_client import REGISTRY
+    totals = {}
+    for family in REGISTRY.collect():
+        if family.name not in ("whatsapp_step_seconds", "whatsapp_agent_stage_seconds", "whatsapp_db_pool_wait_seconds"):
+            continue
+        for sample in family.samples:
+            if sample.name.endswith(("_count", "_sum")):
+                key = sample.labels.get("step") or sample.labels.get("stage") or f"db_pool_wait_{sample.labels['pool']}"
+                entry = totals.setdefault(key, [0, 0.0])
+                entry[0 if sample.name.endswith("_count") else 1] += sample.value
+    return [(name, int(count), total / count * 1000) for name, (count, total) in totals.items() if count]
+
+
+async def run(args):
+    workdir = make_workdir()
+    tenants = [f"+1555000{i:04d}" for i in range(args.tenants)]
+    config_path, embeddings, retriever = build_fixture_retriever(args, workdir, tenants)
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+
+    import app.whatsapp as whatsapp
+    twilio_sent = []
+    chat_model = install_fakes(args, config_path, embeddings, retriever, twilio_sent)
+
+    rng = random.Random(args.seed)
+    queries = sample_queries(args.users * args.messages, seed=args.seed)
+    sessions = []
+    for u in range(args.users):
+        conversation = [
+            rng.choice(SMALL_TALK) if rng.random() < args.small_talk else queries[u * args.messages + m]
+            for m in range(args.messages)
+        ]
+        sessions.append((tenants[u % len(tenants)], f"+1666{u:07d}", conversation))
+
+    results, rss = [], []
+    sids = itertools.count(1)
+    started = time.perf_counter()
+    sampler = asyncio.create_task(sample_rss(rss, started))
+    if args.database_url:
+        from database.initdb import init_db, init_pool
+        await init_pool()
+        await init_db()
+
+    transport = httpx.ASGITransport(app=whatsapp.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://load-test", timeout=120) as http:
+        await asyncio.gather(*(
+            user_session(http, tenant, user, conversation, args.think_ms / 1000, results, sids)
+            for tenant, user, conversation in sessions
+        ))
+    elapsed = time.perf_counter() - started
+    sampler.cancel()
+    rss.append((elapsed, rss_mib()))
+
+    latencies = [latency for _, latency, _, _ in results]
+    shed = sum(whatsapp.SHED_REPLY in text for _, _, _, text in results)
+    errors = sum(status != 200 or "something went wrong" in text for _, _, status, text in results)
+    print(f"{len(results)} messages from {args.users} users across {args.tenants} tenants in {elapsed:.1f}s "
+          f"= {len(results) / elapsed:.1f} msgs/s (LLM {args.llm_ms:.0f}ms mean, think {args.think_ms:.0f}ms)")
+    print(f"latency ms  p50={percentile(latencies, 50):.1f}  p95={percentile(latencies, 95):.1f}  "
+          f"p99={percentile(latencies, 99):.1f}  max={max(latencies):.1f}")
+    print(f"shed={shed}  errors={errors}  llm calls={chat_model.calls}  twilio sends={len(twilio_sent)}")
+    admission = whatsapp.admission.metrics()["tenants"]
+    for tenant in tenants:
+        tenant_latencies = [latency for t, latency, _, _ in results if t == tenant]
+        wait = admission.get(tenant, {}).get("wait_p95_s", 0.0) * 1000
+        print(f"  {tenant}  n={len(tenant_latencies)}  p95={percentile(tenant_latencies, 95):.1f}ms  "
+              f"admission wait p95={wait:.1f}ms")
+
+    print("time per step (mean ms):")
+    for name, count, mean_ms in sorted(step_breakdown(), key=lambda row: -row[1] * row[2]):
+        print(f"  {name:<20} n={count:<6} {mean_ms:8.2f}")
+
+    print("RSS MiB over time: " + "  ".join(f"{t:.0f}s={mib:.0f}" for t, mib in rss))
+    print(f"peak RSS {rss_mib('VmHWM'):.0f} MiB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tenants", type=int, default=3)
+    parser.add_argument("--users", type=int, default=60)
+    parser.add_argument("--messages", type=int, default=5, help="messages per user")
+    parser.add_argument("--small-talk", type=float, default=0.3, help="share of greetings/acknowledgements")
+    parser.add_argument("--llm-ms", type=float, default=300)
+    parser.add_argument("--think-ms", type=float, default=200)
+    parser.add_argument("--db-ms", type=float, default=2)
+    parser.add_argument("--pages", type=int, default=60, help="fixture pages per tenant")
+    parser.add_argument("--database-url", help="use a real Postgres for lead upserts")
+    parser.add_argument("--model", action="store_true", help="use the configured embedding and reranker models")
+    parser.add_argument("--seed", type=int, default=3)
+    args = parser.parse_args()
+    os.environ.setdefault("GROQ_API_KEY", "benchmark")
+    logging.disable(logging.WARNING)
+    asyncio.run(run(args))
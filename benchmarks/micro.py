@@ -0,0 +1,128 @@
+"""
+Micro-benchmarks for the hot functions behind a reply and an onboarding:
+RagRetriever.query, RagIngest.add_document and scrape.text_from_html.
+
+    python -m benchmarks.micro [--repeat 200] [--pages 200] [--model]
+    python -m benchmarks.micro --save micro_baseline.json
+    python -m benchmarks.micro --compare micro_baseline.json [--tolerance 0.5]
+
+Without --model the hashing embedder and a no-op reranker are used, so
+query and add_document time the pipeline around the models (vector store,
+fusion, packing, chunking, upserts). --compare exits non-zero if any p50
+is more than --tolerance slower than the saved baseline; compare runs
+from the same machine, shared CI hosts vary by tens of percent.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from benchmarks.fixtures import (
+    FOOTER, bench_config, inventory_page, load_embeddings, make_workdir, percentile, sample_queries,
+    write_sample_corpus,
+)
+
+CUSTOMER = "+15550000001"
+
+
+def sample_html(rng: random.Random) -> str:
+    """A dealer inventory page with the chrome text_from_html has to strip."""
+    listings = "".join(f"<div class='vehicle'><p>{sentence}.</p></div>" for sentence in inventory_page(rng).split(". "))
+    return (
+        "<html><head><title>Inventory</title><style>.vehicle{margin:0}</style>"
+        "<script>window.dataLayer=[];</script></head><body>"
+        "<header><nav><a href='/'>Home</a><a href='/inventory'>Inventory</a></nav></header>"
+        f"<main><h1>Used vehicles</h1>{listings}<!-- tracking --></main>"
+        "<form><input name='q'><button>Search</button></form>"
+        f"<footer><p>{FOOTER}</p></footer></body></html>"
+    )
+
+
+def measure(fn, repeat: int, warmup: int = 10) -> dict:
+    for i in range(warmup):
+        fn(repeat + i)
+    timings = []
+    for i in range(repeat):
+        started = time.perf_counter()
+        fn(i)
+        timings.append((time.perf_counter() - started) * 1000)
+    return {"n": repeat, "p50_ms": percentile(timings, 50), "p95_ms": percentile(timings, 95),
+            "mean_ms": sum(timings) / len(timings)}
+
+
+def run(args) -> dict:
+    from rag.ingest import RagIngest
+    from rag.retrieve import RagRetriever
+    from scrape.scrape import text_from_html
+    from benchmarks.hybrid_retrieval import SkipReranker
+
+    workdir = make_workdir()
+    config_path = bench_config(workdir, ingest={"workers": 1})
+    write_sample_corpus(os.path.join(workdir, "pages"), CUSTOMER, pages=args.pages)
+    embeddings = load_embeddings(args.model)
+    ingest = RagIngest(config_path, embeddings=embeddings)
+    ingest.ingest_directory(CUSTOMER)
+    retriever = RagRetriever(config_path, embeddings=embeddings, reranker=None if args.model else SkipReranker())
+
+    results = {}
+    queries = sample_queries(args.repeat + 10)
+    results["RagRetriever.query"] = measure(lambda i: retriever.query(queries[i], CUSTOMER), args.repeat)
+
+    # Fresh content each time; a page already stored would be skipped by its content hash
+    rng = random.Random(17)
+    new_pages = os.path.join(workdir, "new_pages")
+    os.makedirs(new_pages)
+
+    def add_document(i):
+        filename = f"new_{i:04d}.txt"
+        path = os.path.join(new_pages, filename)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(inventory_page(rng))
+        ingest.add_document(path, filename, CUSTOMER)
+
+    results["RagIngest.add_document"] = measure(add_document, max(1, args.repeat // 4), warmup=2)
+
+    html_rng = random.Random(23)
+    pages = [sample_html(html_rng) for _ in range(args.repeat + 10)]
+    results["text_from_html"] = measure(lambda i: text_from_html(pages[i]), args.repeat)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--pages", type=int, default=200, help="fixture pages already in the index")
+    parser.add_argument("--model", action="store_true", help="use the configured embedding and reranker models")
+    parser.add_argument("--save", help="write results to this JSON file")
+    parser.add_argument("--compare", help="baseline JSON written by --save")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="allowed p50 slowdown vs the baseline")
+    args = parser.parse_args()
+
+    results = run(args)
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    regressed = []
+    for name, stats in results.items():
+        line = f"{name:<24} n={stats['n']:<5} p50={stats['p50_ms']:8.3f}ms  p95={stats['p95_ms']:8.3f}ms"
+        if name in baseline:
+            ratio = stats["p50_ms"] / baseline[name]["p50_ms"]
+            line += f"  vs baseline {ratio:5.2f}x"
+            if ratio > 1 + args.tolerance:
+                regressed.append(name)
+                line += "  REGRESSED"
+        print(line)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+    if regressed:
+        print(f"p50 regressed more than {args.tolerance:.0%}: {', '.join(regressed)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+"""
+PyTorch vs int8 ONNX Runtime for the embedding model and the cross-encoder.
+
+    python -m benchmarks.onnx_backend [--pages 100] [--queries 200] [--threads 1] [--offline]
+
+Reports query embedding latency, document embedding throughput, rerank
+latency, peak RSS of a process holding both models, and agreement with
+the PyTorch path: vector cosine, top-5 retrieval overlap, rerank top-1
+and rerank score difference.
+
+--offline builds small random-weight BERT models locally instead of
+downloading the configured ones. Latency and agreement then describe the
+export/quantization path, not the production models.
+"""
+import argparse
+import multiprocessing
+import os
+import re
+import time
+import numpy as np
+from benchmarks.fixtures import make_workdir, percentile, sample_queries, write_sample_corpus
+from rag.onnx_backend import OnnxCrossEncoder, OnnxEmbeddings
+
+CUSTOMER = "+15550000001"
+
+
+def build_offline_models(directory: str) -> tuple[str, str]:
+    """
+    MiniLM-shaped (384 hidden, 12 heads) random BERT encoders with a
+    word-level vocabulary of the sample corpus.
+    """
+    from tokenizers import Tokenizer, models, normalizers, pre_tokenizers
+    from tokenizers.processors import TemplateProcessing
+    from transformers import BertConfig, BertForSequenceClassification, BertModel, BertTokenizerFast
+    import benchmarks.fixtures as fixtures
+
+    with open(fixtures.__file__, encoding="utf-8") as f:
+        words = sorted(set(re.findall(r"\w+", f.read().lower())))
+    specials = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"]
+    vocab = {token: i for i, token in enumerate(specials + words)}
+
+    tokenizer = Tokenizer(models.WordPiece(vocab, unk_token="[UNK]"))
+    tokenizer.normalizer = normalizers.BertNormalizer(lowercase=True)
+    tokenizer.pre_tokenizer = pre_tokenizers.BertPreTokenizer()
+    tokenizer.post_processor = TemplateProcessing(
+        single="[CLS] $A [SEP]",
+        pair="[CLS] $A [SEP] $B:1 [SEP]:1",
+        special_tokens=[("[CLS]", vocab["[CLS]"]), ("[SEP]", vocab["[SEP]"])],
+    )
+    fast = BertTokenizerFast(
+        tokenizer_object=tokenizer, unk_token="[UNK]", pad_token="[PAD]",
+        cls_token="[CLS]", sep_token="[SEP]", mask_token="[MASK]",
+    )
+
+    shape = dict(vocab_size=len(vocab), hidden_size=384, num_hidden_layers=6,
+                 num_attention_heads=12, intermediate_size=1536)
+    paths = []
+    for name, model_cls, extra in (
+        ("embedding", BertModel, {}),
+        ("cross-encoder", BertForSequenceClassification, {"num_labels": 1}),
+    ):
+        path = os.path.join(directory, name)
+        model_cls(BertConfig(**shape, **extra)).save_pretrained(path)
+        fast.save_pretrained(path)
+        paths.append(path)
+    return paths[0], paths[1]
+
+
+def load_models(backend: str, embedding_model: str, reranker_model: str, cache_dir: str, threads: int):
+    if backend == "onnx":
+        return (
+            OnnxEmbeddings(embedding_model, cache_dir=cache_dir, threads=threads),
+            OnnxCrossEncoder(reranker_model, cache_dir=cache_dir, threads=threads),
+        )
+    import torch
+    from langchain_community.embeddings import HuggingFaceEmbeddings
+    from sentence_transformers import CrossEncoder
+    torch.set_num_threads(threads)
+    return HuggingFaceEmbeddings(model_name=embedding_model), CrossEncoder(reranker_model)
+
+
+def peak_rss(backend, embedding_model, reranker_model, cache_dir, threads, texts, pairs) -> float:
+    """
+    Runs in a fresh process: peak resident MiB after loading both models
+    and serving a few calls.
+    """
+    embeddings, reranker = load_models(backend, embedding_model, reranker_model, cache_dir, threads)
+    embeddings.embed_documents(texts)
+    reranker.predict(pairs)
+    # VmHWM, not ru_maxrss: the latter survives exec and reports the parent's peak
+    with open("/proc/self/status") as f:
+        return next(int(line.split()[1]) for line in f if line.startswith("VmHWM")) / 1024
+
+
+def corpus_chunks(directory: str) -> list[str]:
+    chunks = []
+    for filename in sorted(os.listdir(directory)):
+        with open(os.path.join(directory, filename), encoding="utf-8") as f:
+            sentences = re.split(r"(?<=[.?!])\s+", f.read())
+        chunks.extend(" ".join(sentences[i:i + 2]) for i in range(0, len(sentences), 2))
+    return list(dict.fromkeys(chunks))
+
+
+def timed(fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, (time.perf_counter() - started) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, default=100)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--rerank-candidates", type=int, default=10)
+    parser.add_argument("--threads", type=int, default=1)
+    parser.add_argument("--offline", action="store_true", help="random local models instead of the configured ones")
+    args = parser.parse_args()
+
+    from rag.utils import Utils
+
+    workdir = make_workdir()
+    config = Utils().config
+    if args.offline:
+        embedding_model, reranker_model = build_offline_models(os.path.join(workdir, "models"))
+    else:
+        embedding_model = config["embeddings"]["HuggingFaceEmbeddings"]["model_name"]
+        reranker_model = (config.get("inference") or {}).get("reranker_model", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+    cache_dir = os.path.join(workdir, "onnx_models")
+
+    chunks = corpus_chunks(write_sample_corpus(os.path.join(workdir, "pages"), CUSTOMER, pages=args.pages))
+    queries = sample_queries(args.queries)
+    print(f"{len(chunks)} chunks, {len(queries)} queries, {args.threads} thread(s)")
+
+    results = {}
+    for backend in ("torch", "onnx"):
+        (embeddings, reranker), load_ms = timed(
+            load_models, backend, embedding_model, reranker_model, cache_dir, args.threads
+        )
+        embeddings.embed_documents(chunks[:32])  # warm up
+
+        vectors, embed_ms = timed(embeddings.embed_documents, chunks)
+        query_vectors, query_latencies = [], []
+        for query in queries:
+            vector, ms = timed(embeddings.embed_query, query)
+            query_vectors.append(vector)
+            query_latencies.append(ms)
+
+        results[backend] = {
+            "vectors": np.asarray(vectors, dtype=np.float32),
+            "queries": np.asarray(query_vectors, dtype=np.float32),
+            "reranker": reranker,
+        }
+        print(
+            f"{backend:<6} load={load_ms / 1000:5.1f}s  embed_query p50={percentile(query_latencies, 50):6.2f}ms "
+            f"p95={percentile(query_latencies, 95):6.2f}ms  embed_documents={len(chunks) / (embed_ms / 1000):7.1f} texts/s"
+        )
+
+    # Same candidates for both cross-encoders: the PyTorch top-n per query
+    def unit(matrix):
+        return matrix / np.clip(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12, None)
+
+    torch_scores = unit(results["torch"]["queries"]) @ unit(results["torch"]["vectors"]).T
+    onnx_scores = unit(results["onnx"]["queries"]) @ unit(results["onnx"]["vectors"]).T
+    candidates = np.argsort(-torch_scores, axis=1)[:, :args.rerank_candidates]
+
+    rerank_top1, rerank_scores = {}, {}
+    for backend in ("torch", "onnx"):
+        reranker = results[backend]["reranker"]
+        reranker.predict([(queries[0], chunks[i]) for i in candidates[0]])  # warm up
+        latencies, top1, all_scores = [], [], []
+        for query, ids in zip(queries, candidates):
+            scores, ms = timed(reranker.predict, [(query, chunks[i]) for i in ids])
+            latencies.append(ms)
+            top1.append(int(ids[int(np.argmax(scores))]))
+            all_scores.append(np.asarray(scores, dtype=np.float32))
+        rerank_top1[backend] = top1
+        rerank_scores[backend] = np.concatenate(all_scores)
+        print(
+            f"{backend:<6} rerank {args.rerank_candidates} pairs p50={percentile(latencies, 50):6.2f}ms "
+            f"p95={percentile(latencies, 95):6.2f}ms"
+        )
+
+    cosine = np.einsum("ij,ij->i", unit(results["torch"]["vectors"]), unit(results["onnx"]["vectors"]))
+    torch_top5 = np.argsort(-torch_scores, axis=1)[:, :5]
+    onnx_top5 = np.argsort(-onnx_scores, axis=1)[:, :5]
+    overlap = np.mean([len(set(a) & set(b)) / 5 for a, b in zip(torch_top5, onnx_top5)])
+    top1 = np.mean([a == b for a, b in zip(rerank_top1["torch"], rerank_top1["onnx"])])
+    score_diff = np.abs(rerank_scores["torch"] - rerank_scores["onnx"])
+    print(
+        f"agreement: vector cosine mean={cosine.mean():.5f} min={cosine.min():.5f}  "
+        f"retrieval overlap@5={overlap:.3f}  rerank top-1={top1:.3f}  "
+        f"rerank |score diff| mean={score_diff.mean():.4f} max={score_diff.max():.4f}"
+    )
+
+    # Peak RSS in fresh processes so one backend's allocations don't hide the other's
+    context = multiprocessing.get_context("spawn")
+    for backend in ("torch", "onnx"):
+        with context.Pool(1) as pool:
+            rss = pool.apply(peak_rss, (
+                backend, embedding_model, reranker_model, cache_dir, args.threads,
+                chunks[:64], [(queries[0], chunk) for chunk in chunks[:10]],
+            ))
+        print(f"{backend:<6} peak RSS with both models loaded: {rss:7.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
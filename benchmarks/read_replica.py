@@ -0,0 +1,133 @@
+"""
+Reader/writer pool split against a primary and a streaming replica.
+
+    python -m benchmarks.read_replica --database-url postgresql://primary... --read-url postgresql://replica...
+
+Checks, exiting non-zero on failure:
+  - routing: with replay paused on the replica, a customer who just signed
+    up is found by login (read-your-writes sends it to the writer) while a
+    plain reader query doesn't see them; once the window has passed the
+    read goes to the replica again and sees the row after replay resumes
+  - isolation: lead writes arriving every --write-every-ms keep their
+    latency while --readers concurrent slow dashboard reads saturate the
+    reader pool, versus the same load on one shared pool
+Prints the pool metrics /metrics would expose. Needs superuser on the
+replica (pg_wal_replay_pause). Deletes its own rows from customers and
+leads of the primary.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+SLOW_DASHBOARD = "SELECT pg_sleep(%s), count(*) FROM leads"
+
+
+async def lead_write_latency(args, tag: str) -> tuple[float, float]:
+    """p50/p95 ms of insert_lead while --readers slow reads hold the reader pool."""
+    from database.create_data import insert_lead
+    from database.retrieve_data import get_db_conn as get_read_conn
+
+    async def dashboard_reader():
+        async with get_read_conn() as conn:
+            await conn.execute(SLOW_DASHBOARD, (args.read_ms / 1000,))
+
+    async def lead_write(i: int):
+        await asyncio.sleep(i * args.write_every_ms / 1000)
+        started = time.perf_counter()
+        await insert_lead("+15550000001", f"+1999{tag}{i:05d}", "Bench", "hi", "Neutral", 0.0)
+        timings.append((time.perf_counter() - started) * 1000)
+
+    # Webhook writes arrive at a steady rate while the dashboard burst runs
+    timings = []
+    readers = [asyncio.create_task(dashboard_reader()) for _ in range(args.readers)]
+    await asyncio.sleep(0.05)
+    await asyncio.gather(*(lead_write(i) for i in range(args.writes)), *readers)
+    timings.sort()
+    return timings[len(timings) // 2], timings[int(len(timings) * 0.95)]
+
+
+async def main(args) -> bool:
+    os.environ["DATABASE_URL"] = args.database_url
+    os.environ["DATABASE_READ_URL"] = args.read_url
+    import psycopg
+    import database.initdb as initdb
+    from database.create_data import get_db_conn, insert_customers
+    from database.retrieve_data import fetch_user_by_username, get_db_conn as get_read_conn
+    from service.metrics import runtime
+    from prometheus_client import REGISTRY, generate_latest
+
+    initdb._db_settings = {
+        "writer_pool": {"min_size": 2, "max_size": 4},
+        "reader_pool": {"min_size": 2, "max_size": 4},
+        "pool_timeout": 30,
+        "read_your_writes_seconds": 1,
+    }
+    await initdb.init_pool()
+    await initdb.init_db()
+    runtime.track(db_pool=initdb.pool_stats)
+    phone = "+19990000042"
+    async with get_db_conn() as conn:
+        await conn.execute("DELETE FROM customers WHERE phone_number = %s", (phone,))
+        await conn.execute("DELETE FROM leads WHERE phone_number LIKE '+1999%'")
+        await conn.execute("DELETE FROM lead_phones WHERE phone_number LIKE '+1999%'")
+        await conn.commit()
+    replica = await psycopg.AsyncConnection.connect(args.read_url, autocommit=True)
+    results = []
+
+    # Routing
+    await replica.execute("SELECT pg_wal_replay_pause()")
+    try:
+        await insert_customers(phone, "hash", "https://example.com", "Austin")
+        via_login = await fetch_user_by_username(phone)
+        async with get_read_conn() as conn:
+            cur = await conn.execute("SELECT 1 FROM customers WHERE phone_number = %s", (phone,))
+            on_replica = await cur.fetchone()
+        await asyncio.sleep(1.1)
+        after_window = await fetch_user_by_username(phone)
+    finally:
+        await replica.execute("SELECT pg_wal_replay_resume()")
+    caught_up = None
+    for _ in range(50):
+        caught_up = await fetch_user_by_username(phone)
+        if caught_up:
+            break
+        await asyncio.sleep(0.1)
+    ok = via_login is not None and on_replica is None and after_window is None and caught_up is not None
+    print(f"{'PASS' if ok else 'FAIL'} routing  replay paused: login right after signup found={via_login is not None}, "
+          f"replica has row={on_replica is not None}; after the window found={after_window is not None}; "
+          f"after replay resumed found={caught_up is not None}")
+    results.append(ok)
+
+    # Isolation
+    split = await lead_write_latency(args, "1")
+    writer_pool, reader_pool = initdb._pool, initdb._read_pool
+    initdb._read_pool = writer_pool  # one shared pool, as before the split
+    shared = await lead_write_latency(args, "2")
+    initdb._read_pool = reader_pool
+    ok = split[1] < shared[1] / 2
+    print(f"{'PASS' if ok else 'FAIL'} isolation  {args.readers} x {args.read_ms:.0f}ms dashboard reads: "
+          f"lead write p50/p95 split pools {split[0]:.1f}/{split[1]:.1f}ms vs one shared pool "
+          f"{shared[0]:.1f}/{shared[1]:.1f}ms")
+    results.append(ok)
+
+    print("pool metrics:")
+    for line in generate_latest(REGISTRY).decode().splitlines():
+        if line.startswith("whatsapp_db_pool") and "_bucket" not in line:
+            print(f"  {line}")
+
+    await replica.close()
+    await initdb.close_pool()
+    return all(results)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=os.getenv("DATABASE_URL"), required=not os.getenv("DATABASE_URL"))
+    parser.add_argument("--read-url", default=os.getenv("DATABASE_READ_URL"), required=not os.getenv("DATABASE_READ_URL"))
+    parser.add_argument("--readers", type=int, default=12, help="concurrent slow dashboard reads")
+    parser.add_argument("--read-ms", type=float, default=500)
+    parser.add_argument("--writes", type=int, default=40)
+    parser.add_argument("--write-every-ms", type=float, default=25)
+    sys.exit(0 if asyncio.run(main(parser.parse_args())) else 1)
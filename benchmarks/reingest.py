@@ -0,0 +1,141 @@
+"""
+Re-onboarding a site into the vector store: interrupted runs and changed pages.
+
+    python -m benchmarks.reingest [--pages 120] [--workers 1]
+        [--backend chroma|numpy|pgvector] [--database-url postgresql://...]
+
+Scenarios (asserted; exits non-zero on failure):
+  partial - a run that dies between write batches, leaving a page half
+            written, and is then retried ends with exactly the chunks
+            of a clean run
+  stale   - after prices change on some pages and others are taken
+            down, re-ingesting leaves exactly the chunks of a fresh
+            ingest of the new site: no old prices or sold listings,
+            shared footers kept
+"""
+import argparse
+import os
+import re
+import sys
+import time
+from benchmarks.fixtures import bench_config, load_embeddings, make_workdir, write_sample_corpus
+from rag.ingest import RagIngest
+
+CLEAN, PARTIAL, STALE, FRESH = "+15550000011", "+15550000012", "+15550000013", "+15550000014"
+
+
+class Interrupted(Exception):
+    pass
+
+
+def stored_texts(store, customer: str) -> set[str]:
+    return {document for _, document in store.iter_documents(customer)}
+
+
+def drop_customers(store):
+    async def drop():
+        async with store._writer() as conn:
+            for table in ("rag_chunks", "rag_pages", "rag_lexical"):
+                await conn.execute(f"DELETE FROM {table} WHERE customer = ANY(%s)", ([CLEAN, PARTIAL, STALE, FRESH],))
+            await conn.commit()
+    store._run(drop())
+
+
+def change_site(directory: str) -> tuple[int, int]:
+    """Reprice every listing on pages 1-9 and take down pages 20-29."""
+    repriced = removed = 0
+    for i in range(1, 10):
+        path = os.path.join(directory, f"page_{i:04d}.txt")
+        with open(path, encoding="utf-8") as f:
+            text = f.read()
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(re.sub(r"priced at \$([\d,]+)", r"priced at $1\1", text))
+        repriced += 1
+    for i in range(20, 30):
+        os.remove(os.path.join(directory, f"page_{i:04d}.txt"))
+        removed += 1
+    return repriced, removed
+
+
+def main() -> bool:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=120)
+    parser.add_argument("--workers", type=int, default=1, help="ingest processes (ingest.workers)")
+    parser.add_argument("--backend", default="chroma", choices=["chroma", "numpy", "pgvector"])
+    parser.add_argument("--database-url", help="pgvector: Postgres to use (the benchmark customers' rows are replaced)")
+    args = parser.parse_args()
+
+    workdir = make_workdir()
+    if args.backend == "pgvector":
+        os.environ["DATABASE_URL"] = args.database_url
+    # Several chunks per page and small write batches, so pages span writes
+    config_path = bench_config(
+        workdir, ingest={"workers": args.workers, "file_batch_size": 16, "write_batch_size": 7}, retrieval={"hybrid": False},
+        chunking={"strategy": "recursive", "chunk_tokens": 40, "overlap_tokens": 0},
+        vectorstore={"type": args.backend},
+    )
+    pages = os.path.join(workdir, "pages")
+    for customer in (CLEAN, PARTIAL, STALE, FRESH):
+        write_sample_corpus(pages, customer, pages=args.pages)
+
+    embeddings = load_embeddings(False)
+    ingest = RagIngest(config_path, embeddings=embeddings)
+    if args.backend == "pgvector":
+        drop_customers(ingest.store)
+    ok = True
+
+    # -- partial --
+    ingest.ingest_directory(CLEAN)
+    expected = stored_texts(ingest.store, CLEAN)
+
+    writes = 0
+    upsert = ingest.store.upsert
+
+    def dying_upsert(*call_args):
+        nonlocal writes
+        writes += 1
+        if writes == 3:
+            # Dies one chunk into the batch, part way through a page
+            upsert(*(values[:1] if isinstance(values, list) else values for values in call_args))
+            raise Interrupted("worker died")
+        upsert(*call_args)
+
+    ingest.store.upsert = dying_upsert
+    try:
+        ingest.ingest_directory(PARTIAL)
+    except Interrupted:
+        pass
+    ingest.store.upsert = upsert
+    after_crash = ingest.store.count(PARTIAL)
+    RagIngest(config_path, embeddings=embeddings).ingest_directory(PARTIAL)
+    retried = stored_texts(ingest.store, PARTIAL)
+    passed = retried == expected
+    ok &= passed
+    print(
+        f"partial  {after_crash} chunks after the crash, {len(retried)} after the retry "
+        f"(clean run: {len(expected)}, missing {len(expected - retried)})  {'PASS' if passed else 'FAIL'}"
+    )
+
+    # -- stale --
+    ingest.ingest_directory(STALE)
+    before = ingest.store.count(STALE)
+    repriced, removed = change_site(os.path.join(pages, STALE))
+    change_site(os.path.join(pages, FRESH))
+    started = time.perf_counter()
+    RagIngest(config_path, embeddings=embeddings).ingest_directory(STALE)
+    elapsed = time.perf_counter() - started
+    ingest.ingest_directory(FRESH)
+    reingested, fresh = stored_texts(ingest.store, STALE), stored_texts(ingest.store, FRESH)
+    footer_kept = any("Financing is available" in text for text in reingested)
+    passed = reingested == fresh and footer_kept
+    ok &= passed
+    print(
+        f"stale    {repriced} pages repriced, {removed} removed: {before} -> {len(reingested)} chunks in {elapsed:.2f}s "
+        f"(fresh ingest: {len(fresh)}; {len(reingested - fresh)} stale left, {len(fresh - reingested)} missing, "
+        f"footer kept={footer_kept})  {'PASS' if passed else 'FAIL'}"
+    )
+    return ok
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,180 @@
+"""
+AsyncTwilioClient against a local fake of Twilio's Messages endpoint.
+
+    python -m benchmarks.twilio_fake [--messages 200] [--rate 50]
+
+Scenarios (asserted; exits non-zero on failure):
+  bulk       - two senders, bulk send; every message delivered, per-sender
+               send rate stays within the token bucket
+  flaky      - 15% of requests get 429 (with Retry-After) or 503; all are
+               delivered after jittered retries
+  rejected   - a 400 is returned once, not retried, and reported per message
+  ambiguous  - a 500 after the message was accepted is not retried, so the
+               recipient gets it once
+Also reports throughput against the old pattern (blocking HTTP call per
+message on the default thread pool executor).
+"""
+import argparse
+import asyncio
+import itertools
+import random
+import socket
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+import httpx
+import uvicorn
+from fastapi import FastAPI, Form
+from fastapi.responses import JSONResponse
+from client.twilio_client import AsyncTwilioClient
+
+ACCOUNT = "ACfake"
+LATENCY = 0.02
+
+fake = FastAPI()
+state = {
+    "fail_rate": 0.0, "reject": set(), "accept_then_fail": set(),
+    "sends": defaultdict(list), "recipients": Counter(), "messages": {}, "requests": 0,
+}
+sids = itertools.count(1)
+
+
+@fake.post("/2010-04-01/Accounts/{account}/Messages.json")
+async def create_message(account: str, From: str = Form(...), To: str = Form(...), Body: str = Form(None),
+                         ContentSid: str = Form(None), ContentVariables: str = Form(None),
+                         StatusCallback: str = Form(None)):
+    state["requests"] += 1
+    await asyncio.sleep(LATENCY)
+    if To in state["reject"]:
+        return JSONResponse({"code": 21211, "message": f"Invalid 'To' Phone Number: {To}"}, status_code=400)
+    roll = random.random()
+    if roll < state["fail_rate"] / 2:
+        return JSONResponse({"code": 20429, "message": "Too Many Requests"}, status_code=429, headers={"Retry-After": "0.05"})
+    if roll < state["fail_rate"]:
+        return JSONResponse({"message": "Service Unavailable"}, status_code=503)
+    state["sends"][From].append(time.monotonic())
+    state["recipients"][To] += 1
+    state["messages"][To] = {"Body": Body, "ContentSid": ContentSid, "ContentVariables": ContentVariables,
+                             "StatusCallback": StatusCallback}
+    if To in state["accept_then_fail"]:
+        return JSONResponse({"message": "Internal Server Error"}, status_code=500)
+    return JSONResponse({"sid": f"SM{next(sids):032d}", "status": "queued"}, status_code=201)
+
+
+def start_fake() -> str:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(fake, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}"
+
+
+def reset(fail_rate: float = 0.0, reject=(), accept_then_fail=()):
+    state.update(fail_rate=fail_rate, reject=set(reject), accept_then_fail=set(accept_then_fail),
+                 sends=defaultdict(list), recipients=Counter(), messages={}, requests=0)
+
+
+def max_rate(timestamps: list[float], window: float = 1.0) -> float:
+    """Most sends seen in any `window` seconds."""
+    timestamps = sorted(timestamps)
+    best, start = 0, 0
+    for end, ts in enumerate(timestamps):
+        while ts - timestamps[start] > window:
+            start += 1
+        best = max(best, end - start + 1)
+    return best / window
+
+
+async def legacy_sends(base_url: str, messages) -> float:
+    """One blocking request per message on the default executor, like the old client."""
+    loop = asyncio.get_running_loop()
+    path = f"{base_url}/2010-04-01/Accounts/{ACCOUNT}/Messages.json"
+
+    def send(to, body):
+        return httpx.post(path, data={"From": "whatsapp:+15550000000", "To": to, "Body": body}, auth=(ACCOUNT, "x"))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(loop.run_in_executor(None, send, to, body) for to, body in messages))
+    return time.perf_counter() - started
+
+
+async def main(args) -> bool:
+    base_url = start_fake()
+    settings = {
+        "base_url": base_url, "rate_per_second": args.rate, "burst": 10,
+        "backoff_base": 0.05, "backoff_max": 0.5, "max_retries": 6, "bulk_concurrency": 50,
+    }
+    client = AsyncTwilioClient(ACCOUNT, "token", settings)
+    senders = ["whatsapp:+15550000001", "whatsapp:+15550000002"]
+    messages = [(f"whatsapp:+1555100{i:04d}", f"Hello {i}") for i in range(args.messages)]
+    half = len(messages) // 2
+    results = []
+
+    # bulk: two senders in parallel, each limited separately
+    reset()
+    started = time.perf_counter()
+    outcomes = await asyncio.gather(
+        client.send_bulk(messages[:half], from_=senders[0]),
+        client.send_bulk(messages[half:], from_=senders[1]),
+    )
+    elapsed = time.perf_counter() - started
+    delivered = sum(1 for batch in outcomes for outcome in batch if outcome["sid"])
+    rates = {sender: max_rate(state["sends"][sender]) for sender in senders}
+    # A token bucket admits at most rate * window + burst sends per window (+1 for the inclusive edge)
+    ok = delivered == len(messages) and all(rate <= args.rate + settings["burst"] + 2 for rate in rates.values())
+    print(f"{'PASS' if ok else 'FAIL'} bulk      {delivered}/{len(messages)} delivered in {elapsed:.2f}s "
+          f"({delivered / elapsed:.1f} msgs/s), peak per-sender rate {rates}")
+    results.append(ok)
+
+    # flaky: 429/503 injected
+    reset(fail_rate=0.15)
+    client.retries = 0
+    started = time.perf_counter()
+    outcomes = await client.send_bulk(messages[:half], from_=senders[0])
+    delivered = sum(1 for outcome in outcomes if outcome["sid"])
+    ok = delivered == half and client.retries > 0
+    print(f"{'PASS' if ok else 'FAIL'} flaky     {delivered}/{half} delivered, {client.retries} retries, "
+          f"{state['requests']} requests in {time.perf_counter() - started:.2f}s")
+    results.append(ok)
+
+    # rejected: 4xx is final
+    reset(reject=[messages[0][0]])
+    outcomes = await client.send_bulk(messages[:5], from_=senders[0])
+    ok = outcomes[0]["sid"] is None and "400" in outcomes[0]["error"] and all(o["sid"] for o in outcomes[1:]) \
+        and state["requests"] == 5
+    print(f"{'PASS' if ok else 'FAIL'} rejected  first message error: {outcomes[0]['error']!r}, {state['requests']} requests")
+    results.append(ok)
+
+    # ambiguous: Twilio took the message but answered 500
+    reset(accept_then_fail=[messages[0][0]])
+    outcomes = await client.send_bulk(messages[:1], from_=senders[0])
+    ok = outcomes[0]["sid"] is None and state["requests"] == 1 and state["recipients"][messages[0][0]] == 1
+    print(f"{'PASS' if ok else 'FAIL'} ambiguous {state['requests']} request, "
+          f"{state['recipients'][messages[0][0]]} message delivered, error: {outcomes[0]['error']!r}")
+    results.append(ok)
+
+    # throughput without rate limiting: async pool vs executor threads
+    unlimited = AsyncTwilioClient(ACCOUNT, "token", {**settings, "rate_per_second": 1e6, "burst": 1e6})
+    reset()
+    started = time.perf_counter()
+    await unlimited.send_bulk(messages, from_=senders[0])
+    async_elapsed = time.perf_counter() - started
+    reset()
+    legacy_elapsed = await legacy_sends(base_url, messages)
+    print(f"     unlimited {len(messages)} sends, {LATENCY * 1000:.0f}ms server latency: "
+          f"async pool {len(messages) / async_elapsed:.1f} msgs/s, executor {len(messages) / legacy_elapsed:.1f} msgs/s")
+
+    await client.aclose()
+    await unlimited.aclose()
+    return all(results)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--rate", type=float, default=50.0)
+    sys.exit(0 if asyncio.run(main(parser.parse_args())) else 1)
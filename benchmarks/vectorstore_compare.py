@@ -0,0 +1,146 @@
+"""
+Latency and recall of the vector store backends on one sample tenant.
+
+    python -m benchmarks.vectorstore_compare [--pages 300] [--queries 200] [--top-k 10] [--model]
+    DATABASE_URL=postgresql://... python -m benchmarks.vectorstore_compare --backends chroma numpy pgvector
+
+All stores are filled by RagIngest from the same corpus. Recall@k is
+measured against an exact float32 search over the stored embeddings.
+Throughput is queries per second with --threads callers at once, the
+way agent turns call the retriever from worker threads. The pgvector
+backend needs DATABASE_URL (with the vector extension available); its
+tenant's rows are deleted afterwards.
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from benchmarks.fixtures import (
+    bench_config,
+    directory_size,
+    load_embeddings,
+    make_workdir,
+    percentile,
+    sample_queries,
+    write_sample_corpus,
+)
+from rag.ingest import RagIngest
+from rag.vectorstore import pg_partition_name
+
+CUSTOMER = "+15550000001"
+
+
+def fill_store(store_type: str, pages: int, embeddings, ef_search: int = 40):
+    workdir = make_workdir()
+    config_path = bench_config(
+        workdir, vectorstore={"type": store_type, "pgvector_ef_search": ef_search}, ingest={"workers": 1},
+    )
+    write_sample_corpus(os.path.join(workdir, "pages"), CUSTOMER, pages=pages)
+    ingest = RagIngest(config_path, embeddings=embeddings)
+    started = time.perf_counter()
+    ingest.ingest_directory(CUSTOMER)
+    return ingest.store, os.path.join(workdir, "chroma"), time.perf_counter() - started
+
+
+def run_queries(store, query_vectors, top_k: int):
+    latencies, results = [], []
+    for vector in query_vectors:
+        started = time.perf_counter()
+        hits = store.query(CUSTOMER, vector, n_results=top_k)
+        latencies.append((time.perf_counter() - started) * 1000)
+        results.append([hit["document"] for hit in hits])
+    return latencies, results
+
+
+def throughput(store, query_vectors, top_k: int, threads: int) -> float:
+    started = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        list(pool.map(lambda vector: store.query(CUSTOMER, vector, n_results=top_k), query_vectors))
+    return len(query_vectors) / (time.perf_counter() - started)
+
+
+def exact_top_k(store, query_vectors, top_k: int):
+    # Ground truth from the float32 vectors held by the numpy store's rows
+    tenant = store._tenant(CUSTOMER)
+    matrix = np.asarray(tenant.matrix, dtype=np.float32)
+    queries = np.asarray(query_vectors, dtype=np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    scores = queries @ matrix.T
+    return [[tenant.documents[i] for i in np.argsort(-row)[:top_k]] for row in scores]
+
+
+def recall(results, truth) -> float:
+    hits = sum(len(set(r) & set(t)) for r, t in zip(results, truth))
+    return hits / max(1, sum(len(t) for t in truth))
+
+
+def table_size(store) -> int:
+    # The tenant's partition with its HNSW and btree indexes
+    async def size():
+        from database.create_data import get_db_conn
+        async with get_db_conn() as conn:
+            cur = await conn.execute(
+                "SELECT pg_total_relation_size(to_regclass(%s))", (pg_partition_name(CUSTOMER),),
+            )
+            (total,) = await cur.fetchone()
+            await conn.commit()
+        return total or 0
+
+    return store._run(size())
+
+
+def drop_tenant(store):
+    async def drop():
+        from database.create_data import get_db_conn
+        async with get_db_conn() as conn:
+            await conn.execute(f"DROP TABLE IF EXISTS {pg_partition_name(CUSTOMER)}")
+            # Page marks would have the next ingest skip every page
+            await conn.execute("DELETE FROM rag_pages WHERE customer = %s", (CUSTOMER,))
+            await conn.execute("DELETE FROM rag_lexical WHERE customer = %s", (CUSTOMER,))
+            await conn.commit()
+
+    store._run(drop())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, default=300)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--ef-search", type=int, default=40, help="pgvector HNSW candidate list per query")
+    parser.add_argument("--backends", nargs="+", default=["chroma", "numpy"], choices=["chroma", "numpy", "pgvector"])
+    parser.add_argument("--model", action="store_true", help="use the configured embedding model")
+    args = parser.parse_args()
+
+    embeddings = load_embeddings(args.model)
+    query_vectors = [embeddings.embed_query(q) for q in sample_queries(args.queries)]
+
+    # numpy's exact search over the same embeddings is the ground truth
+    stores = {
+        name: fill_store(name, args.pages, embeddings, args.ef_search)
+        for name in dict.fromkeys(["numpy", *args.backends])
+    }
+    truth = exact_top_k(stores["numpy"][0], query_vectors, args.top_k)
+
+    print(f"{stores['numpy'][0].count(CUSTOMER)} chunks, {args.queries} queries, top_k={args.top_k}")
+    try:
+        for name in args.backends:
+            store, path, ingest_seconds = stores[name]
+            run_queries(store, query_vectors[:10], args.top_k)  # warm caches
+            latencies, results = run_queries(store, query_vectors, args.top_k)
+            qps = throughput(store, query_vectors, args.top_k, args.threads)
+            size = table_size(store) if name == "pgvector" else directory_size(path)
+            print(
+                f"{name:<8} p50={percentile(latencies, 50):6.3f}ms  p95={percentile(latencies, 95):6.3f}ms  "
+                f"{args.threads} threads={qps:7.0f} q/s  recall@{args.top_k}={recall(results, truth):.3f}  "
+                f"ingest={ingest_seconds:5.2f}s  size={size / 1024:.0f}KiB"
+            )
+    finally:
+        if "pgvector" in stores:
+            drop_tenant(stores["pgvector"][0])
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,12 @@
 import asyncio
-from twilio.rest import Client
+import random
+import httpx
 from dotenv import load_dotenv
 import os
 import yaml
 import logging
+from twilio.request_validator import RequestValidator
+from service.metrics import TWILIO_SENDS_TOTAL, timed
 
 load_dotenv()
 
@@ -15,17 +18,195 @@ TWILIO_ACCOUNT_SID = os.getenv(config["Credentials"]["Twilio"]["TWILIO_ACCOUNT_S
 TWILIO_AUTH_TOKEN = os.getenv(config["Credentials"]["Twilio"]["TWILIO_AUTH_TOKEN"])
 TWILIO_WHATSAPP_NUMBER = os.getenv(config["Credentials"]["Twilio"]["TWILIO_WHATSAPP_NUMBER"])
 
-client = Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
+# Twilio Messages has no idempotency key, so only failures where the
+# message certainly wasn't accepted are retried: a 500/502/504 or a read
+# timeout may come after Twilio has already queued it.
+RETRYABLE_STATUS = {429, 503}
+RETRYABLE_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
 
-async def send_whatsapp_message(to: str, body: str):
-    loop = asyncio.get_running_loop()
 
-    def _send():
-        return client.messages.create(
-            from_=TWILIO_WHATSAPP_NUMBER,
-            to=to,
-            body=body,
+class TwilioSendError(Exception):
+    def __init__(self, status: int, message: str, code=None):
+        super().__init__(f"Twilio returned {status}: {message}")
+        self.status = status
+        self.code = code
+
+
+# -----------------------
+#   Rate limiting
+# -----------------------
+class TokenBucket:
+    """
+    `rate` sends per second with bursts of up to `capacity`.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = None
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            loop = asyncio.get_running_loop()
+            while True:
+                now = loop.time()
+                if self.updated is not None:
+                    self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+# -----------------------
+#   Client
+# -----------------------
+class AsyncTwilioClient:
+    """
+    Sends WhatsApp messages through Twilio's REST API on one pooled,
+    keep-alive httpx connection pool. Each sender number has its own token
+    bucket; 429/503 responses and failures to connect are retried with
+    full-jitter exponential backoff, honouring Retry-After. Anything that
+    may have reached Twilio raises instead, so a message is never sent twice.
+    """
+
+    def __init__(self, account_sid: str, auth_token: str, settings: dict | None = None):
+        settings = settings or {}
+        self.account_sid = account_sid
+        self.base_url = settings.get("base_url", "https://api.twilio.com")
+        self.rate = settings.get("rate_per_second", 10.0)
+        self.burst = settings.get("burst", 10)
+        self.max_retries = settings.get("max_retries", 4)
+        self.backoff_base = settings.get("backoff_base", 0.5)
+        self.backoff_max = settings.get("backoff_max", 8.0)
+        self.bulk_concurrency = settings.get("bulk_concurrency", 20)
+
+        self.http = httpx.AsyncClient(
+            base_url=self.base_url,
+            auth=(account_sid or "", auth_token or ""),
+            timeout=settings.get("timeout", 10.0),
+            limits=httpx.Limits(
+                max_connections=settings.get("max_connections", 20),
+                max_keepalive_connections=settings.get("max_connections", 20),
+            ),
         )
-    message = await loop.run_in_executor(None, _send)
-    logging.info(f"Sent WhatsApp message SID: {message.sid}")
-    return message.sid
\ No newline at end of file
+        self._buckets = {}
+        self.retries = 0
+
+    def _bucket(self, sender: str) -> TokenBucket:
+        if sender not in self._buckets:
+            self._buckets[sender] = TokenBucket(self.rate, self.burst)
+        return self._buckets[sender]
+
+    def _backoff(self, attempt: int, response: httpx.Response | None) -> float:
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after:
+            try:
+                delay = max(delay, min(float(retry_after), self.backoff_max))
+            except ValueError:
+                pass
+        return delay
+
+    async def send(self, to: str, body: str, from_: str | None = None, fields: dict | None = None) -> str:
+        """
+        Send one message; returns its SID. fields are extra Messages
+        parameters (StatusCallback, or ContentSid/ContentVariables to send
+        an approved template instead of body).
+        """
+        with timed("twilio_send"):
+            try:
+                sid = await self._send(to, body, from_, fields)
+            except Exception:
+                TWILIO_SENDS_TOTAL.labels("error").inc()
+                raise
+        TWILIO_SENDS_TOTAL.labels("sent").inc()
+        return sid
+
+    async def _send(self, to: str, body: str, from_: str | None, fields: dict | None = None) -> str:
+        sender = from_ or TWILIO_WHATSAPP_NUMBER
+        path = f"/2010-04-01/Accounts/{self.account_sid}/Messages.json"
+        data = {"From": sender, "To": to}
+        if not (fields and fields.get("ContentSid")):
+            data["Body"] = body
+        data.update(fields or {})
+
+        for attempt in range(self.max_retries + 1):
+            await self._bucket(sender).acquire()
+            response = None
+            try:
+                response = await self.http.post(path, data=data)
+            except RETRYABLE_ERRORS as e:
+                if attempt == self.max_retries:
+                    raise
+                logging.warning(f"Twilio connection error ({e!r}), retrying")
+            else:
+                if response.status_code < 300:
+                    return response.json()["sid"]
+                if response.status_code not in RETRYABLE_STATUS or attempt == self.max_retries:
+                    try:
+                        payload = response.json()
+                    except ValueError:
+                        payload = {}
+                    raise TwilioSendError(response.status_code, payload.get("message", response.text), payload.get("code"))
+                logging.warning(f"Twilio returned {response.status_code} for {to}, retrying")
+
+            self.retries += 1
+            await asyncio.sleep(self._backoff(attempt, response))
+
+    async def send_bulk(self, messages, from_: str | None = None, concurrency: int | None = None) -> list[dict]:
+        """
+        Send many (to, body) or (to, body, fields) messages concurrently,
+        still within the sender's rate limit. Returns one {"to", "sid",
+        "error"} dict per message, in order.
+        """
+        semaphore = asyncio.Semaphore(concurrency or self.bulk_concurrency)
+
+        async def send_one(to, body, fields=None):
+            async with semaphore:
+                try:
+                    return {"to": to, "sid": await self.send(to, body, from_, fields), "error": None}
+                except Exception as e:
+                    logging.error(f"WhatsApp send to {to} failed: {e}")
+                    return {"to": to, "sid": None, "error": str(e)}
+
+        return await asyncio.gather(*(send_one(*message) for message in messages))
+
+    async def aclose(self):
+        await self.http.aclose()
+
+
+_client: AsyncTwilioClient | None = None
+
+
+def get_twilio_client() -> AsyncTwilioClient:
+    global _client
+    if _client is None:
+        _client = AsyncTwilioClient(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN, config.get("twilio") or {})
+    return _client
+
+
+async def close_twilio_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def valid_twilio_signature(url: str, params: dict, signature: str | None) -> bool:
+    """
+    Whether X-Twilio-Signature matches url (exactly as Twilio requested it,
+    query string included) and the POSTed form params.
+    """
+    if not TWILIO_AUTH_TOKEN or not signature:
+        return False
+    return RequestValidator(TWILIO_AUTH_TOKEN).validate(url, params, signature)
+
+
+async def send_whatsapp_message(to: str, body: str):
+    sid = await get_twilio_client().send(to, body)
+    logging.info(f"Sent WhatsApp message SID: {sid}")
+    return sid
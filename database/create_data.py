@@ -1,7 +1,9 @@
 import logging
+import time
 from contextlib import asynccontextmanager
 # ✅ Change: Import the getter function instead of the variable
-from database.initdb import get_pool 
+from database.initdb import get_pool, note_write
+from service.metrics import DB_POOL_WAIT_SECONDS
 
 @asynccontextmanager
 async def get_db_conn():
@@ -14,7 +16,9 @@ async def get_db_conn():
     if pool is None:
         raise RuntimeError("❌ DB pool is not initialized")
 
+    started = time.perf_counter()
     async with pool.connection() as conn:
+        DB_POOL_WAIT_SECONDS.labels(pool="writer").observe(time.perf_counter() - started)
         yield conn
 
 # -----------------------
@@ -31,20 +35,35 @@ async def insert_lead(
     try:
         async with get_db_conn() as conn:
             async with conn.cursor() as cur:
+                # One lead per phone: claiming the phone in lead_phones is what
+                # makes a repeat contact only bump last_inbound_at (leads itself
+                # is partitioned and can't carry a UNIQUE(phone_number)).
+                # xmax = 0 only on a row this statement inserted.
                 await cur.execute(
                     """
+                    WITH claimed AS (
+                        INSERT INTO lead_phones (phone_number, lead_id, created_at, last_inbound_at)
+                        VALUES (%s, nextval('leads_id_seq'), CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
+                        ON CONFLICT (phone_number) DO UPDATE SET last_inbound_at = EXCLUDED.last_inbound_at
+                        RETURNING lead_id, created_at, xmax = 0 AS inserted
+                    )
                     INSERT INTO leads (
+                        id,
                         client,
                         phone_number,
                         username,
                         summary,
                         sentiment_label,
                         sentiment_score,
-                        is_contacted
+                        is_contacted,
+                        created_at
                     )
-                    VALUES (%s, %s, %s, %s, %s, %s, FALSE)
+                    SELECT lead_id, %s, %s, %s, %s, %s, %s, FALSE, created_at
+                    FROM claimed
+                    WHERE inserted
                     """,
                     (
+                        phone_number,
                         client,
                         phone_number,
                         username,
@@ -53,8 +72,12 @@ async def insert_lead(
                         sentiment_score,
                     ),
                 )
+                inserted = cur.rowcount
             await conn.commit()
 
+        if not inserted:
+            logging.debug(f"Lead already exists for: {phone_number}")
+            return
         logging.info(f"✅ Lead saved to DB for: {phone_number}")
 
     except Exception as e:
@@ -76,12 +99,10 @@ async def patch_lead_sentiment(
             summary = %s,
             sentiment_label = %s,
             sentiment_score = %s
-        WHERE id = (
-            SELECT id
-            FROM leads
+        WHERE (id, created_at) = (
+            SELECT lead_id, created_at
+            FROM lead_phones
             WHERE phone_number = %s
-            ORDER BY created_at DESC
-            LIMIT 1
         );
     """
 
@@ -125,9 +146,54 @@ async def insert_customers(
                     (phone, password_hash, url, location),
                 )
             await conn.commit()
+        note_write(phone)
 
         logging.info(f"✅ Customer saved to DB: {phone}")
 
     except Exception as e:
         logging.error(f"❌ Failed to save customer to DB: {e}")
+        raise
+
+# -----------------------
+#   Upsert Onboarding Status
+# -----------------------
+async def upsert_onboarding_status(
+    phone: str,
+    status: str,
+    files_done: int = 0,
+    files_total: int = 0,
+    chunks_written: int = 0,
+    error: str | None = None,
+):
+    query = """
+        INSERT INTO onboarding_status (
+            customer_phone,
+            status,
+            files_done,
+            files_total,
+            chunks_written,
+            error
+        )
+        VALUES (%s, %s, %s, %s, %s, %s)
+        ON CONFLICT (customer_phone) DO UPDATE SET
+            status = EXCLUDED.status,
+            files_done = EXCLUDED.files_done,
+            files_total = EXCLUDED.files_total,
+            chunks_written = EXCLUDED.chunks_written,
+            error = EXCLUDED.error,
+            updated_at = CURRENT_TIMESTAMP;
+    """
+
+    try:
+        async with get_db_conn() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    query,
+                    (phone, status, files_done, files_total, chunks_written, error),
+                )
+            await conn.commit()
+        note_write(phone)
+
+    except Exception as e:
+        logging.error(f"❌ Failed to update onboarding status for {phone}: {e}")
         raise
\ No newline at end of file
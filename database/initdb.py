@@ -1,12 +1,31 @@
+import asyncio
 import os
 import logging
+import time
+import yaml
 from contextlib import asynccontextmanager
 from psycopg_pool import AsyncConnectionPool
+from database.migrations import MIGRATIONS_LOCK, run_migrations
+from database.partitions import ensure_lead_partitions
 
 DB_URL = os.getenv("DATABASE_URL")
+# Optional streaming replica for dashboard reads; without one the reader pool uses DATABASE_URL
+DB_READ_URL = os.getenv("DATABASE_READ_URL") or DB_URL
+LEAD_PARTITIONS_AHEAD = 3  # months of lead partitions kept created ahead of time
 
-# Internal variable
-_pool: AsyncConnectionPool | None = None
+# Internal variables
+_pool: AsyncConnectionPool | None = None       # writer: webhook, sessions, jobs, anything that writes
+_read_pool: AsyncConnectionPool | None = None  # reader: dashboard and login reads
+_pool_loop: asyncio.AbstractEventLoop | None = None  # the event loop the pools belong to
+_db_settings = None
+_recent_writes: dict[str, float] = {}  # key -> monotonic time until which its reads go to the writer
+
+def get_db_settings() -> dict:
+    global _db_settings
+    if _db_settings is None:
+        with open("config.yaml", "r") as file:
+            _db_settings = yaml.safe_load(file).get("database") or {}
+    return _db_settings
 
 def get_pool() -> AsyncConnectionPool:
     """
@@ -17,68 +36,109 @@ def get_pool() -> AsyncConnectionPool:
         raise RuntimeError("❌ DB pool is not initialized. Call init_pool() first.")
     return _pool
 
+def get_read_pool() -> AsyncConnectionPool:
+    """
+    The reader pool, for reads that can be a little behind the primary.
+    """
+    if _read_pool is None:
+        raise RuntimeError("❌ DB pool is not initialized. Call init_pool() first.")
+    return _read_pool
+
+def get_pool_loop() -> asyncio.AbstractEventLoop | None:
+    """
+    The loop the pools run on, for blocking code in other threads
+    (asyncio.run_coroutine_threadsafe); None before init.
+    """
+    return _pool_loop if _pool is not None else None
+
+def pool_stats() -> dict | None:
+    """
+    psycopg_pool counters (size, available, waiting, requests...) per pool, or None before init.
+    """
+    if _pool is None:
+        return None
+    pools = {"writer": _pool, "reader": _read_pool}
+    return {name: pool.get_stats() for name, pool in pools.items() if pool is not None}
+
+# -----------------------
+#   Read-your-writes
+# -----------------------
+def note_write(key: str):
+    """
+    Record that `key` (a customer or business phone) was just written, so
+    reads for it go to the writer until the replica has surely caught up.
+    Tracked per process: behind a load balancer this holds for requests
+    that land on the same process.
+    """
+    now = time.monotonic()
+    if len(_recent_writes) > 10_000:
+        for stale in [k for k, until in _recent_writes.items() if until < now]:
+            del _recent_writes[stale]
+    _recent_writes[key] = now + get_db_settings().get("read_your_writes_seconds", 5)
+
+def reads_from_writer(key: str | None) -> bool:
+    return key is not None and _recent_writes.get(key, 0) > time.monotonic()
+
 async def init_pool():
-    global _pool
+    global _pool, _read_pool, _pool_loop
 
+    settings = get_db_settings()
+    timeout = settings.get("pool_timeout", 30)
     if _pool is None:
+        _pool_loop = asyncio.get_running_loop()
+        writer = settings.get("writer_pool") or {}
         _pool = AsyncConnectionPool(
             DB_URL,
-            min_size=1,
-            max_size=10,
+            min_size=writer.get("min_size", 1),
+            max_size=writer.get("max_size", 10),
+            timeout=timeout,
+            name="writer",
         )
         logging.info("✅ Database pool initialized")
         logging.info(f"pool: {_pool}")
+    if _read_pool is None:
+        reader = settings.get("reader_pool") or {}
+        _read_pool = AsyncConnectionPool(
+            DB_READ_URL,
+            min_size=reader.get("min_size", 1),
+            max_size=reader.get("max_size", 5),
+            timeout=timeout,
+            name="reader",
+        )
+        target = "replica" if DB_READ_URL != DB_URL else "primary"
+        logging.info(f"✅ Reader pool initialized ({target})")
 
 async def close_pool():
-    global _pool
+    global _pool, _read_pool
 
+    if _read_pool:
+        await _read_pool.close()
+        _read_pool = None
     if _pool:
         await _pool.close()
         _pool = None
         logging.info("🛑 Database pool closed")
+    _recent_writes.clear()
 
 async def init_db():
     """
-    Create required tables.
+    Apply pending schema migrations and create the coming months' lead partitions.
     Expects init_pool() to have been called by the lifespan.
     """
     pool = get_pool() # Use the getter to ensure we have the live pool
     
     try:
         async with pool.connection() as conn:
+            applied = await run_migrations(conn)
+            if applied:
+                logging.info(f"Applied migrations {applied}")
             async with conn.cursor() as cur:
-                # 1. Leads Table
-                await cur.execute("""
-                    CREATE TABLE IF NOT EXISTS leads (
-                        id SERIAL PRIMARY KEY,
-                        client TEXT NOT NULL,
-                        phone_number TEXT UNIQUE NOT NULL,
-                        username TEXT,
-                        summary TEXT,
-                        sentiment_label TEXT,
-                        sentiment_score REAL,
-                        is_contacted BOOLEAN DEFAULT FALSE,
-                        created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
-                    );
-                """)
-                logging.info("Leads table ensured.")
-                
-                # 2. Customers Table
-                await cur.execute("""
-                    CREATE TABLE IF NOT EXISTS customers (
-                        id SERIAL PRIMARY KEY,
-                        phone_number TEXT UNIQUE NOT NULL,
-                        password_hash TEXT NOT NULL,
-                        website_url TEXT NOT NULL,
-                        location TEXT NOT NULL,
-                        created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
-                    );
-                """)
-                logging.info("Customers table ensured.")
-                
+                # Another replica or the maintenance job may be creating the same partition
+                await cur.execute("SELECT pg_advisory_xact_lock(%s)", (MIGRATIONS_LOCK,))
+                await ensure_lead_partitions(cur, months_ahead=LEAD_PARTITIONS_AHEAD)
             await conn.commit()
         logging.info("Database initialized successfully")
 
     except Exception as e:
         logging.error(f"Failed to initialize database: {e}")
-        raise
\ No newline at end of file
+        raise
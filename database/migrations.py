@@ -0,0 +1,325 @@
+import logging
+from database.partitions import ensure_lead_partitions
+
+# Schema changes are applied in version order, once per database, each in
+# its own transaction. Append new migrations to MIGRATIONS; never edit or
+# renumber one that has shipped.
+
+MIGRATIONS_LOCK = 7_340_001  # pg_advisory_lock key: one migrator at a time across replicas
+
+
+# -----------------------
+#   001 Baseline
+# -----------------------
+async def baseline(cur):
+    """The tables init_db used to create; a no-op on existing databases."""
+    await cur.execute("""
+        CREATE TABLE IF NOT EXISTS leads (
+            id SERIAL PRIMARY KEY,
+            client TEXT NOT NULL,
+            phone_number TEXT UNIQUE NOT NULL,
+            username TEXT,
+            summary TEXT,
+            sentiment_label TEXT,
+            sentiment_score REAL,
+            is_contacted BOOLEAN DEFAULT FALSE,
+            created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
+        );
+    """)
+    await cur.execute("""
+        CREATE TABLE IF NOT EXISTS customers (
+            id SERIAL PRIMARY KEY,
+            phone_number TEXT UNIQUE NOT NULL,
+            password_hash TEXT NOT NULL,
+            website_url TEXT NOT NULL,
+            location TEXT NOT NULL,
+            created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+        );
+    """)
+    await cur.execute("""
+        CREATE TABLE IF NOT EXISTS onboarding_status (
+            customer_phone TEXT PRIMARY KEY,
+            status TEXT NOT NULL,
+            files_done INTEGER DEFAULT 0,
+            files_total INTEGER DEFAULT 0,
+            chunks_written INTEGER DEFAULT 0,
+            error TEXT,
+            updated_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
+        );
+    """)
+    # Shared session state and monitor leases
+    await cur.execute("""
+        CREATE TABLE IF NOT EXISTS conversation_sessions (
+            user_phone TEXT PRIMARY KEY,
+            client TEXT,
+            username TEXT,
+            messages JSONB NOT NULL DEFAULT '[]'::jsonb,
+            last_active TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            version INTEGER NOT NULL DEFAULT 0,
+            enriched_version INTEGER NOT NULL DEFAULT 0,
+            lease_owner TEXT,
+            lease_expires_at TIMESTAMPTZ
+        );
+    """)
+    await cur.execute("""
+        CREATE INDEX IF NOT EXISTS conversation_sessions_pending_idx
+        ON conversation_sessions (last_active)
+        WHERE version > enriched_version;
+    """)
+    # Background work claimed by service.worker
+    await cur.execute("""
+        CREATE TABLE IF NOT EXISTS jobs (
+            id BIGSERIAL PRIMARY KEY,
+            kind TEXT NOT NULL,
+            payload JSONB NOT NULL DEFAULT '{}'::jsonb,
+            status TEXT NOT NULL DEFAULT 'queued',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            max_attempts INTEGER NOT NULL DEFAULT 5,
+            run_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            locked_by TEXT,
+            locked_until TIMESTAMPTZ,
+            progress JSONB NOT NULL DEFAULT '{}'::jsonb,
+            last_error TEXT,
+            created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
+        );
+    """)
+    await cur.execute("""
+        CREATE INDEX IF NOT EXISTS jobs_pending_idx
+        ON jobs (run_at, id)
+        WHERE status IN ('queued', 'running');
+    """)
+
+
+# -----------------------
+#   002 Lead indexes
+# -----------------------
+# The dashboard lists a client's leads newest first; the monitor and the
+# sentiment patch look a phone's latest lead up
+LEAD_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS leads_client_id_idx ON leads (client, id DESC)",
+    "CREATE INDEX IF NOT EXISTS leads_phone_created_idx ON leads (phone_number, created_at DESC)",
+]
+
+
+async def lead_indexes(cur):
+    for statement in LEAD_INDEXES:
+        await cur.execute(statement)
+
+
+# -----------------------
+#   003 Partition leads
+# -----------------------
+async def partition_leads(cur):
+    """
+    Rebuild leads as a table range-partitioned by created_at month, so
+    queries prune to recent months and old months can be detached (see
+    database.partitions). The primary key has to include the partition
+    key, so phone_number can't be UNIQUE on leads any more; lead_phones
+    holds it instead, mapping each phone to its lead's (id, created_at)
+    so phone lookups go straight to one partition. Copies the rows in
+    this transaction, which holds an exclusive lock on leads until it
+    commits.
+    """
+    await cur.execute("ALTER TABLE leads RENAME TO leads_unpartitioned")
+    # Free the constraint and index names for the new table
+    await cur.execute("ALTER INDEX IF EXISTS leads_pkey RENAME TO leads_unpartitioned_pkey")
+    await cur.execute("ALTER INDEX IF EXISTS leads_phone_number_key RENAME TO leads_unpartitioned_phone_number_key")
+    await cur.execute("DROP INDEX IF EXISTS leads_client_id_idx, leads_phone_created_idx")
+    await cur.execute("""
+        CREATE TABLE leads (
+            id INTEGER NOT NULL DEFAULT nextval('leads_id_seq'),
+            client TEXT NOT NULL,
+            phone_number TEXT NOT NULL,
+            username TEXT,
+            summary TEXT,
+            sentiment_label TEXT,
+            sentiment_score REAL,
+            is_contacted BOOLEAN DEFAULT FALSE,
+            created_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at);
+    """)
+    await cur.execute("ALTER SEQUENCE leads_id_seq OWNED BY leads.id")
+    await cur.execute("CREATE TABLE leads_default PARTITION OF leads DEFAULT")
+    for statement in LEAD_INDEXES:
+        await cur.execute(statement)
+
+    await cur.execute("SELECT min(created_at) FROM leads_unpartitioned")
+    (oldest,) = await cur.fetchone()
+    await ensure_lead_partitions(cur, since=oldest.date() if oldest else None)
+    await cur.execute("""
+        INSERT INTO leads (id, client, phone_number, username, summary, sentiment_label,
+                           sentiment_score, is_contacted, created_at)
+        SELECT id, client, phone_number, username, summary, sentiment_label,
+               sentiment_score, is_contacted, COALESCE(created_at, CURRENT_TIMESTAMP)
+        FROM leads_unpartitioned
+    """)
+    logging.info(f"Copied {cur.rowcount} leads into the partitioned table")
+    await cur.execute("DROP TABLE leads_unpartitioned")
+
+    await cur.execute("""
+        CREATE TABLE lead_phones (
+            phone_number TEXT PRIMARY KEY,
+            lead_id INTEGER NOT NULL,
+            created_at TIMESTAMPTZ NOT NULL
+        );
+    """)
+    await cur.execute("""
+        INSERT INTO lead_phones (phone_number, lead_id, created_at)
+        SELECT DISTINCT ON (phone_number) phone_number, id, created_at
+        FROM leads
+        ORDER BY phone_number, created_at DESC
+    """)
+
+
+# -----------------------
+#   004 Lead change notifications
+# -----------------------
+LEAD_CHANNEL = "lead_changes"
+
+
+async def notify_lead_changes(cur):
+    """
+    NOTIFY lead_changes with the row as JSON after every insert or update
+    of leads, for the live dashboard (service.lead_events). Payloads are
+    capped at 8000 bytes; a row too big to fit is announced by its key only.
+    """
+    await cur.execute(f"""
+        CREATE OR REPLACE FUNCTION notify_lead_change() RETURNS trigger AS $$
+        DECLARE
+            payload TEXT;
+        BEGIN
+            payload := json_build_object(
+                'id', NEW.id,
+                'client', NEW.client,
+                'phone_number', NEW.phone_number,
+                'username', NEW.username,
+                'summary', NEW.summary,
+                'sentiment_label', NEW.sentiment_label,
+                'sentiment_score', NEW.sentiment_score,
+                'is_contacted', NEW.is_contacted,
+                'created_at', NEW.created_at
+            )::text;
+            IF octet_length(payload) > 7900 THEN
+                payload := json_build_object(
+                    'id', NEW.id, 'client', NEW.client, 'created_at', NEW.created_at, 'partial', true
+                )::text;
+            END IF;
+            PERFORM pg_notify('{LEAD_CHANNEL}', payload);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+    await cur.execute("""
+        CREATE TRIGGER leads_notify_change
+        AFTER INSERT OR UPDATE ON leads
+        FOR EACH ROW EXECUTE FUNCTION notify_lead_change();
+    """)
+
+
+# -----------------------
+#   005 Campaigns
+# -----------------------
+async def campaigns(cur):
+    """
+    Follow-up campaigns (service.campaigns). A campaign walks its leads in
+    (created_at, id) order and checkpoints the last one it finished, so a
+    retried job resumes where the previous attempt stopped.
+    """
+    await cur.execute("""
+        CREATE TABLE campaigns (
+            id BIGSERIAL PRIMARY KEY,
+            client TEXT NOT NULL,
+            brief TEXT NOT NULL,
+            sentiments TEXT[] NOT NULL,
+            since TIMESTAMPTZ NOT NULL,
+            status TEXT NOT NULL DEFAULT 'queued',
+            cursor_created_at TIMESTAMPTZ,
+            cursor_id INTEGER,
+            selected INTEGER NOT NULL DEFAULT 0,
+            sent INTEGER NOT NULL DEFAULT 0,
+            failed INTEGER NOT NULL DEFAULT 0,
+            fallbacks INTEGER NOT NULL DEFAULT 0,
+            last_error TEXT,
+            started_at TIMESTAMPTZ,
+            finished_at TIMESTAMPTZ,
+            created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
+        );
+    """)
+    await cur.execute("CREATE INDEX campaigns_client_idx ON campaigns (client, id DESC)")
+    # Campaign selection: a client's not-yet-contacted leads in cursor order
+    await cur.execute("""
+        CREATE INDEX leads_uncontacted_idx ON leads (client, created_at, id)
+        WHERE NOT is_contacted
+    """)
+
+
+# -----------------------
+#   006 Campaign delivery
+# -----------------------
+async def campaign_delivery(cur):
+    """
+    WhatsApp delivers free-form business messages only within 24 hours of
+    the contact's last message, so lead_phones records when each phone
+    last wrote in. Campaigns count what Twilio accepted separately from
+    what it later reported undelivered.
+    """
+    await cur.execute("ALTER TABLE lead_phones ADD COLUMN last_inbound_at TIMESTAMPTZ")
+    await cur.execute("UPDATE lead_phones SET last_inbound_at = created_at")
+    await cur.execute("ALTER TABLE lead_phones ALTER COLUMN last_inbound_at SET DEFAULT CURRENT_TIMESTAMP")
+    await cur.execute("ALTER TABLE campaigns RENAME COLUMN sent TO accepted")
+    await cur.execute("ALTER TABLE campaigns ADD COLUMN undelivered INTEGER NOT NULL DEFAULT 0")
+
+
+MIGRATIONS = [
+    (1, "baseline", baseline),
+    (2, "lead indexes", lead_indexes),
+    (3, "partition leads by month", partition_leads),
+    (4, "notify lead changes", notify_lead_changes),
+    (5, "campaigns", campaigns),
+    (6, "campaign delivery", campaign_delivery),
+]
+
+
+# -----------------------
+#   Runner
+# -----------------------
+async def run_migrations(conn) -> list[int]:
+    """
+    Apply pending migrations in order and record them in schema_migrations.
+    A session advisory lock makes replicas starting together take turns;
+    the later ones find nothing left to do. Returns the versions applied.
+    """
+    applied = []
+    await conn.execute("SELECT pg_advisory_lock(%s)", (MIGRATIONS_LOCK,))
+    await conn.commit()  # the lock is held by the session, not the transaction
+    try:
+        async with conn.transaction():
+            await conn.execute("""
+                CREATE TABLE IF NOT EXISTS schema_migrations (
+                    version INTEGER PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    applied_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+        cur = await conn.execute("SELECT version FROM schema_migrations")
+        done = {version for (version,) in await cur.fetchall()}
+        await conn.commit()
+
+        for version, name, migrate in MIGRATIONS:
+            if version in done:
+                continue
+            logging.info(f"⬆️ Applying migration {version:03d} {name}")
+            async with conn.transaction():
+                async with conn.cursor() as cur:
+                    await migrate(cur)
+                    await cur.execute(
+                        "INSERT INTO schema_migrations (version, name) VALUES (%s, %s)", (version, name),
+                    )
+            applied.append(version)
+    finally:
+        await conn.execute("SELECT pg_advisory_unlock(%s)", (MIGRATIONS_LOCK,))
+        await conn.commit()
+    return applied
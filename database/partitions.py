@@ -0,0 +1,104 @@
+import logging
+from datetime import date, datetime, timezone
+from psycopg import sql
+
+# leads is range-partitioned by created_at month: leads_pYYYY_MM, plus
+# leads_default for anything outside the partitions that exist
+
+
+def month_start(day: date, offset: int = 0) -> date:
+    months = day.year * 12 + day.month - 1 + offset
+    return date(months // 12, months % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"leads_p{month.year:04d}_{month.month:02d}"
+
+
+# -----------------------
+#   Create ahead
+# -----------------------
+async def ensure_lead_partitions(cur, months_ahead: int = 3, since: date | None = None) -> list[str]:
+    """
+    Create monthly partitions from `since` (default: this month) through
+    months_ahead months from now. Rows that landed in leads_default for a
+    new month are moved into its partition. Returns the partitions created.
+    """
+    today = datetime.now(timezone.utc).date()
+    month = month_start(since or today)
+    last = month_start(today, months_ahead)
+    created = []
+    while month <= last:
+        name, upper = partition_name(month), month_start(month, 1)
+        # Month boundaries are UTC whatever the session's TimeZone
+        bounds = [datetime(d.year, d.month, 1, tzinfo=timezone.utc) for d in (month, upper)]
+        await cur.execute("SELECT to_regclass(%s)", (name,))
+        (exists,) = await cur.fetchone()
+        if exists is None:
+            # Build it detached, take over its rows from the default partition, then attach
+            table = sql.Identifier(name)
+            await cur.execute(sql.SQL("CREATE TABLE {} (LIKE leads INCLUDING DEFAULTS)").format(table))
+            await cur.execute(
+                sql.SQL("""
+                    WITH moved AS (
+                        DELETE FROM leads_default WHERE created_at >= %s AND created_at < %s RETURNING *
+                    )
+                    INSERT INTO {} SELECT * FROM moved
+                """).format(table),
+                bounds,
+            )
+            await cur.execute(
+                sql.SQL("ALTER TABLE leads ATTACH PARTITION {} FOR VALUES FROM ({}) TO ({})")
+                .format(table, *(sql.Literal(bound.isoformat()) for bound in bounds))
+            )
+            created.append(name)
+        month = upper
+    if created:
+        logging.info(f"🗂️ Created lead partitions: {', '.join(created)}")
+    return created
+
+
+# -----------------------
+#   Retention
+# -----------------------
+async def archive_lead_partitions(cur, retention_months: int, archive_schema: str | None = "leads_archive") -> list[str]:
+    """
+    Detach monthly partitions that ended more than retention_months ago.
+    They move to archive_schema (still queryable, no longer scanned by the
+    app) or are dropped when archive_schema is empty; their phones are
+    released from lead_phones, so a returning contact starts a new lead.
+    Returns their names.
+    """
+    cutoff = month_start(datetime.now(timezone.utc).date(), -retention_months)
+    await cur.execute(
+        """
+        SELECT child.relname
+        FROM pg_inherits
+        JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        WHERE parent.relname = 'leads' AND child.relname LIKE 'leads\\_p%'
+        ORDER BY child.relname
+        """
+    )
+    expired = []
+    for (name,) in await cur.fetchall():
+        year, month = int(name[7:11]), int(name[12:14])
+        if month_start(date(year, month, 1), 1) <= cutoff:
+            expired.append(name)
+
+    for name in expired:
+        table = sql.Identifier(name)
+        await cur.execute(sql.SQL("ALTER TABLE leads DETACH PARTITION {}").format(table))
+        if archive_schema:
+            schema = sql.Identifier(archive_schema)
+            await cur.execute(sql.SQL("CREATE SCHEMA IF NOT EXISTS {}").format(schema))
+            await cur.execute(sql.SQL("ALTER TABLE {} SET SCHEMA {}").format(table, schema))
+        else:
+            await cur.execute(sql.SQL("DROP TABLE {}").format(table))
+    if expired:
+        await cur.execute("DELETE FROM lead_phones WHERE created_at < %s",
+                          (datetime(cutoff.year, cutoff.month, 1, tzinfo=timezone.utc),))
+    if expired:
+        action = f"archived to {archive_schema}" if archive_schema else "dropped"
+        logging.info(f"🗄️ Lead partitions {action}: {', '.join(expired)}")
+    return expired
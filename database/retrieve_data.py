@@ -1,18 +1,23 @@
 import logging
+import time
 from contextlib import asynccontextmanager
 from database import initdb  # Import the module
+from service.metrics import DB_POOL_WAIT_SECONDS
 
 @asynccontextmanager
-async def get_db_conn():
+async def get_db_conn(key: str | None = None):
     """
-    Yield a database connection from the shared pool.
-    We use initdb.get_pool() to access the internal _pool safely.
+    Yield a connection from the reader pool (the replica, when configured).
+    Reads for a `key` written moments ago by this process use the writer
+    pool instead, so callers see their own writes.
     """
     try:
-        # ✅ FIX: Call get_pool() instead of accessing .pool directly
-        pool = initdb.get_pool()
-        
+        name = "writer" if initdb.reads_from_writer(key) else "reader"
+        pool = initdb.get_pool() if name == "writer" else initdb.get_read_pool()
+
+        started = time.perf_counter()
         async with pool.connection() as conn:
+            DB_POOL_WAIT_SECONDS.labels(pool=name).observe(time.perf_counter() - started)
             yield conn
     except Exception as e:
         logging.error(f"❌ Database pool error: {e}")
@@ -24,7 +29,7 @@ async def get_db_conn():
 
 async def fetch_all_leads(client: str):
     try:
-        async with get_db_conn() as conn:
+        async with get_db_conn(client) as conn:
             async with conn.cursor() as cur:
                 await cur.execute(
                     """
@@ -56,7 +61,7 @@ async def fetch_all_leads(client: str):
 
 async def fetch_user_by_username(username: str):
     try:
-        async with get_db_conn() as conn:
+        async with get_db_conn(username) as conn:
             async with conn.cursor() as cur:
                 await cur.execute(
                     "SELECT id, phone_number, password_hash FROM customers WHERE phone_number = %s",
@@ -74,4 +79,36 @@ async def fetch_user_by_username(username: str):
                 return None
     except Exception as e:
         logging.error(f"Failed to retrieve user: {e}")
+        raise
+
+# -----------------------
+#   Fetch Onboarding Status
+# -----------------------
+
+async def fetch_onboarding_status(phone: str):
+    try:
+        async with get_db_conn(phone) as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    """
+                    SELECT status, files_done, files_total, chunks_written, error, updated_at
+                    FROM onboarding_status
+                    WHERE customer_phone = %s
+                    """,
+                    (phone,),
+                )
+                row = await cur.fetchone()
+
+                if row:
+                    return {
+                        "status": row[0],
+                        "files_done": row[1],
+                        "files_total": row[2],
+                        "chunks_written": row[3],
+                        "error": row[4],
+                        "updated_at": row[5]
+                    }
+                return None
+    except Exception as e:
+        logging.error(f"Failed to retrieve onboarding status: {e}")
         raise
\ No newline at end of file
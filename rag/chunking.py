@@ -0,0 +1,226 @@
+import re
+import numpy as np
+from .context import count_tokens
+
+HEADING = re.compile(r"^(#{1,6}) (.*)$")
+
+
+class SemanticChunkEmbedder:
+    """
+    Semantic chunking that keeps the embeddings it computes.
+
+    Follows the same rules as langchain's SemanticChunker (sentence regex,
+    buffered sentence windows, percentile breakpoints) but embeds the
+    sentence windows of many texts in one batch and returns every chunk
+    together with the mean of its window embeddings. The chunks therefore
+    never have to be sent through the embedding model a second time.
+    """
+
+    def __init__(
+        self,
+        embeddings,
+        buffer_size: int = 1,
+        breakpoint_threshold_amount: float = 90,
+        sentence_split_regex: str = r"(?<=[.?!])\s+",
+    ):
+        self.embeddings = embeddings
+        self.buffer_size = buffer_size
+        self.breakpoint_threshold_amount = breakpoint_threshold_amount
+        self.sentence_split_regex = sentence_split_regex
+
+    def split_texts(self, texts: list[str]) -> list[list[tuple[str, list[float]]]]:
+        """
+        Split every text into (chunk_text, chunk_embedding) pairs.
+        All sentence windows are embedded with a single embed_documents call,
+        and windows repeated across texts (footers, disclaimers) only once.
+        """
+        sentence_lists = [re.split(self.sentence_split_regex, text) for text in texts]
+
+        windows = []
+        for sentences in sentence_lists:
+            windows.extend(self._sentence_windows(sentences))
+
+        if not windows:
+            return [[] for _ in texts]
+
+        unique_windows = list(dict.fromkeys(windows))
+        unique_vectors = np.asarray(self.embeddings.embed_documents(unique_windows), dtype=np.float32)
+        position = {window: i for i, window in enumerate(unique_windows)}
+        vectors = unique_vectors[[position[window] for window in windows]]
+
+        results = []
+        offset = 0
+        for sentences in sentence_lists:
+            count = len(sentences)
+            results.append(self._group(sentences, vectors[offset:offset + count]))
+            offset += count
+        return results
+
+    def _sentence_windows(self, sentences: list[str]) -> list[str]:
+        # Same text SemanticChunker embeds: each sentence with its neighbours
+        return [
+            " ".join(sentences[max(0, i - self.buffer_size):i + self.buffer_size + 1])
+            for i in range(len(sentences))
+        ]
+
+    def _group(self, sentences: list[str], vectors: np.ndarray) -> list[tuple[str, list[float]]]:
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        unit = vectors / np.clip(norms, 1e-12, None)
+
+        if len(sentences) == 1:
+            return [(sentences[0], unit[0].tolist())]
+
+        distances = 1.0 - np.einsum("ij,ij->i", unit[:-1], unit[1:])
+        threshold = np.percentile(distances, self.breakpoint_threshold_amount)
+        ends = np.flatnonzero(distances > threshold).tolist() + [len(sentences) - 1]
+
+        chunks = []
+        start = 0
+        for end in ends:
+            text = " ".join(sentences[start:end + 1])
+            chunks.append((text, self._pool(unit[start:end + 1])))
+            start = end + 1
+        return chunks
+
+    @staticmethod
+    def _pool(unit_vectors: np.ndarray) -> list[float]:
+        mean = unit_vectors.mean(axis=0)
+        return (mean / max(float(np.linalg.norm(mean)), 1e-12)).tolist()
+
+
+def embed_chunks(embeddings, chunk_lists: list[list[str]]) -> list[list[tuple[str, list[float]]]]:
+    """
+    Pair every chunk with its embedding, computed in one embed_documents
+    call over the unique chunk texts of all the pages.
+    """
+    unique_chunks = list(dict.fromkeys(chunk for chunks in chunk_lists for chunk in chunks))
+    if not unique_chunks:
+        return [[] for _ in chunk_lists]
+    vectors = dict(zip(unique_chunks, embeddings.embed_documents(unique_chunks)))
+    return [[(chunk, vectors[chunk]) for chunk in chunks] for chunks in chunk_lists]
+
+
+class RecursiveChunkEmbedder:
+    """
+    Token-bounded recursive splitting: paragraphs, then lines, then
+    sentences, then words, merged back up to chunk_tokens with
+    overlap_tokens repeated between neighbours. Each chunk is embedded
+    once; there are no sentence-window embeddings to compute.
+    """
+
+    def __init__(self, embeddings, chunk_tokens: int = 200, overlap_tokens: int = 30):
+        from langchain_text_splitters import RecursiveCharacterTextSplitter
+        self.embeddings = embeddings
+        self.chunk_tokens = chunk_tokens
+        self.splitter = RecursiveCharacterTextSplitter(
+            chunk_size=chunk_tokens,
+            chunk_overlap=overlap_tokens,
+            length_function=count_tokens,
+            separators=["\n\n", "\n", ". ", " ", ""],
+            keep_separator="end",
+        )
+
+    def split_text(self, text: str) -> list[str]:
+        return [chunk.strip() for chunk in self.splitter.split_text(text) if chunk.strip()]
+
+    def split_texts(self, texts: list[str]) -> list[list[tuple[str, list[float]]]]:
+        return embed_chunks(self.embeddings, [self.split_text(text) for text in texts])
+
+
+class HtmlSectionChunkEmbedder(RecursiveChunkEmbedder):
+    """
+    Splits scraped pages on the heading lines text_from_html marks with
+    '#', so a listing card or a service section stays in one chunk. Each
+    section's lines are packed up to chunk_tokens and every chunk starts
+    with its heading; a line too long on its own, or a page with no
+    structure (scraped before headings were kept), is split recursively.
+    """
+
+    def split_text(self, text: str) -> list[str]:
+        chunks = []
+        for heading, lines in self._sections(text):
+            prefix = f"{heading}\n" if heading else ""
+            budget = self.chunk_tokens - count_tokens(prefix)
+            current, used = [], 0
+            for line in lines:
+                cost = count_tokens(line)
+                if cost > budget:
+                    pieces = super().split_text(line)
+                else:
+                    pieces = [line]
+                for piece in pieces:
+                    cost = count_tokens(piece)
+                    if current and used + cost > budget:
+                        chunks.append(prefix + "\n".join(current))
+                        current, used = [], 0
+                    current.append(piece)
+                    used += cost
+            if current:
+                chunks.append(prefix + "\n".join(current))
+            elif heading:
+                chunks.append(heading)
+        return chunks
+
+    @staticmethod
+    def _sections(text: str) -> list[tuple[str | None, list[str]]]:
+        sections = [(None, [])]
+        for line in text.splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            match = HEADING.match(line)
+            if match:
+                sections.append((match.group(2), []))
+            else:
+                sections[-1][1].append(line)
+        return [(heading, lines) for heading, lines in sections if heading or lines]
+
+
+CHUNKING_STRATEGIES = ("semantic", "recursive", "html")
+
+
+def build_chunker(embeddings, settings: dict | None = None):
+    """The chunker named by the config's chunking.strategy (semantic by default)."""
+    settings = settings or {}
+    strategy = settings.get("strategy", "semantic")
+    if strategy == "recursive":
+        return RecursiveChunkEmbedder(embeddings, settings.get("chunk_tokens", 200), settings.get("overlap_tokens", 30))
+    if strategy == "html":
+        return HtmlSectionChunkEmbedder(embeddings, settings.get("chunk_tokens", 200), settings.get("overlap_tokens", 30))
+    if strategy != "semantic":
+        raise ValueError(f"Unknown chunking strategy {strategy!r}; expected one of {CHUNKING_STRATEGIES}")
+    # Semantic chunking; the sentence embeddings double as chunk embeddings
+    return SemanticChunkEmbedder(
+        embeddings,
+        breakpoint_threshold_amount=settings.get("breakpoint_percentile", 90)
+    )
+
+
+# -----------------------
+#   Process pool workers
+# -----------------------
+# Kept in this module (numpy and the text splitter only) so spawned workers start without
+# importing chromadb or the rest of the ingest pipeline.
+_worker_chunker = None
+
+
+def init_chunk_worker(config_path: str, embeddings, threads: int, settings: dict | None = None):
+    """
+    Runs once per worker process: load the embedding model a single time.
+    threads caps torch and, on the onnx backend, ONNX Runtime intra-op threads.
+    """
+    global _worker_chunker
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+
+    if embeddings is None:
+        from .utils import Utils
+        embeddings = Utils(config_path).initialize_embeddings(threads=threads)
+    _worker_chunker = build_chunker(embeddings, settings)
+
+
+def split_in_worker(texts: list[str]):
+    return _worker_chunker.split_texts(texts)
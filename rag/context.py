@@ -0,0 +1,88 @@
+import logging
+import re
+
+SENTENCE_SPLIT = re.compile(r"(?<=[.?!])\s+")
+
+_encoding = None
+
+
+def count_tokens(text: str) -> int:
+    """
+    Prompt tokens for text: tiktoken's o200k_base (the gpt-oss tokenizer)
+    when it can be loaded, otherwise ~4 characters per token.
+    """
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("o200k_base")
+        except Exception as e:
+            logging.warning(f"tiktoken unavailable, estimating tokens from length: {e}")
+            _encoding = False
+    if _encoding:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return (len(text) + 3) // 4
+
+
+class ContextPacker:
+    """
+    Turns reranked chunks into the retrieved-context block of a prompt:
+    drops sentences already covered by a better chunk, discards chunks
+    with too little new text, and packs the rest by score into a token budget.
+    """
+
+    def __init__(self, config: dict):
+        context_config = config.get("context") or {}
+        self.max_tokens = context_config.get("max_tokens", 800)
+        self.min_novel_fraction = context_config.get("min_novel_fraction", 0.3)
+        self.header = "Retrieved info:"
+
+    @staticmethod
+    def _score(doc: dict, rank: int) -> float:
+        # Rerank score when the cross-encoder ran, otherwise retrieval order
+        if doc.get("rerank_score") is not None:
+            return float(doc["rerank_score"])
+        return -float(rank)
+
+    def pack(self, docs) -> tuple[str, dict]:
+        """
+        Returns (context text, stats). stats carries the token count of the
+        old unbounded " ".join of every document, so savings can be logged.
+        """
+        docs = [doc for doc in (docs or []) if doc.get("document")]
+        stats = {
+            "retrieved": len(docs),
+            "packed": 0,
+            "overlapping": 0,
+            "over_budget": 0,
+            "naive_tokens": count_tokens(" ".join(doc["document"] for doc in docs)) if docs else 0,
+            "tokens": 0,
+        }
+        if not docs:
+            return "", stats
+
+        ranked = sorted(enumerate(docs), key=lambda item: self._score(item[1], item[0]), reverse=True)
+
+        seen_sentences = set()
+        parts = []
+        used = count_tokens(self.header)
+        for _, doc in ranked:
+            sentences = [s.strip() for s in SENTENCE_SPLIT.split(doc["document"]) if s.strip()]
+            novel = [s for s in sentences if s.lower() not in seen_sentences]
+            if not novel or len(novel) / len(sentences) < self.min_novel_fraction:
+                stats["overlapping"] += 1
+                continue
+
+            part = f"\n[{len(parts) + 1}] " + " ".join(novel)
+            cost = count_tokens(part)
+            if used + cost > self.max_tokens:
+                stats["over_budget"] += 1
+                continue
+
+            parts.append(part)
+            used += cost
+            seen_sentences.update(s.lower() for s in novel)
+
+        stats["packed"] = len(parts)
+        stats["tokens"] = used if parts else 0
+        return (self.header + "".join(parts)) if parts else "", stats
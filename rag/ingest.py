@@ -1,79 +1,273 @@
+import hashlib
 import logging
+import multiprocessing
 import os
-import uuid
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 from langchain_community.document_loaders import TextLoader
-from langchain_experimental.text_splitter import SemanticChunker
-from langchain_chroma import Chroma
+from .chunking import build_chunker, init_chunk_worker, split_in_worker
+from .lexical import LexicalIndexStore
+from .vectorstore import create_vector_store
 from .utils import Utils
 
 
+def content_id(phone: str, text: str) -> str:
+    """
+    Stable id for a piece of content, scoped by customer.
+    Identical text for the same customer always maps to the same id.
+    """
+    return hashlib.sha256(f"{phone}\x1f{text}".encode("utf-8")).hexdigest()
+
+
 class RagIngest:
-    def __init__(self, config_path: str = "config.yaml"):
+    def __init__(self, config_path: str = "config.yaml", embeddings=None):
+        self.config_path = config_path
         self.utils = Utils(config_path)
         self.config = self.utils.config
 
 
         self.llm = self.utils.initialize_llm()
-        self.embeddings = self.utils.initialize_embeddings()
+        self._injected_embeddings = embeddings
+        self.embeddings = embeddings or self.utils.initialize_embeddings()
 
-        # ✅ LangChain Chroma (CORRECT)
-        self.vectorstore = Chroma(
-            collection_name="rag_documents",
-            embedding_function=self.embeddings,
-            persist_directory=self.config["vectorstore"]["persist_directory"]
-        )
+        ingest_config = self.config.get("ingest") or {}
+        self.file_batch_size = ingest_config.get("file_batch_size", 64)
+        self.write_batch_size = ingest_config.get("write_batch_size", 1024)
+        self.workers = ingest_config.get("workers") or os.cpu_count() or 1
+        self.threads_per_worker = ingest_config.get("threads_per_worker", 1)
 
-        # Semantic chunking
-        self.chunker = SemanticChunker(
-            self.embeddings,
-            breakpoint_threshold_type="percentile",
-            breakpoint_threshold_amount=90
-        )
+        # Write precomputed embeddings straight into the store the retriever reads
+        self.store = create_vector_store(self.config)
+        self.write_batch_size = min(self.write_batch_size, self.store.max_batch_size)
+
+        # BM25 side index for exact tokens (stock numbers, prices, trims)
+        self.hybrid = (self.config.get("retrieval") or {}).get("hybrid", False)
+        self.lexical = LexicalIndexStore(self.config, self.store)
+
+        self.chunking = self.config.get("chunking") or {}
+        self.chunker = build_chunker(self.embeddings, self.chunking)
 
     def add_document(self, path: str, filename: str, phone: str):
-        loader = TextLoader(path, encoding="utf-8")
-        docs = loader.load()
-
-        chunks = []
-        for doc in docs:
-            # Validate page_content before chunking
-            if not doc.page_content or not isinstance(doc.page_content, str):
-                logging.warning(f"Skipping empty or invalid document chunk in {filename}")
+        written = self.add_documents([(path, filename)], phone)
+        self.rebuild_lexical_index(phone)
+        return written
+
+    def rebuild_lexical_index(self, phone: str):
+        """
+        Rebuild the customer's BM25 index from everything in the vector store.
+        """
+        if not self.hybrid:
+            return
+        started = time.perf_counter()
+        indexed = self.lexical.rebuild(phone, self.store.iter_documents(phone))
+        logging.info(f"Lexical index for {phone}: {indexed} chunks in {time.perf_counter() - started:.2f}s")
+
+    def add_documents(self, files: list[tuple[str, str]], phone: str, seen: set | None = None) -> int:
+        """
+        Chunk, embed and upsert a batch of (path, filename) files.
+        Pages and chunks whose content hash is in `seen` (or already stored)
+        are skipped. Returns the number of chunks written.
+        """
+        seen = set() if seen is None else seen
+        pages = self._load_pages(files, phone, seen)
+        chunk_lists = self.chunker.split_texts([page[1] for page in pages])
+        return self._store_chunks(pages, chunk_lists, phone, seen)
+
+    def _load_pages(self, files: list[tuple[str, str]], phone: str, seen: set) -> list[tuple]:
+        """
+        Read files and return (page_hash, text, path, filename) for the
+        pages that still need chunking.
+        """
+        pages = {}
+        for path, filename in files:
+            loader = TextLoader(path, encoding="utf-8")
+            for doc in loader.load():
+                # Validate page_content before chunking
+                if not doc.page_content or not isinstance(doc.page_content, str):
+                    logging.warning(f"Skipping empty or invalid document chunk in {filename}")
+                    continue
+
+                # Identical pages are skipped before anything is embedded
+                page_hash = content_id(phone, doc.page_content)
+                if ("page", page_hash) in seen or page_hash in pages:
+                    logging.info(f"Skipping duplicate page {filename}")
+                    continue
+                pages[page_hash] = (doc.page_content, path, filename)
+
+        # Every page of this run, stored or not, is current (see prune_stale)
+        seen.update(("page", page_hash) for page_hash in pages)
+
+        # Pages fully stored by an earlier run are unchanged; don't embed them again
+        if pages:
+            for page_hash in self.store.stored_page_hashes(phone, list(pages)):
+                pages.pop(page_hash, None)
+
+        return [(page_hash, *page) for page_hash, page in pages.items()]
+
+    def _store_chunks(self, pages: list[tuple], chunk_lists: list, phone: str, seen: set) -> int:
+        ids, documents, embeddings, metadatas = [], [], [], []
+        page_chunks = {}
+        duplicates = 0
+        for (page_hash, _, path, filename), chunks in zip(pages, chunk_lists):
+            # Every chunk the page needs, including ones another page wrote
+            page_chunks[page_hash] = list(dict.fromkeys(content_id(phone, text) for text, _ in chunks))
+            if not chunks:
+                logging.warning(f"No valid chunks to ingest for file {filename}")
                 continue
 
-            chunks.extend(
-                self.chunker.create_documents(
-                    texts=[doc.page_content],
-                    metadatas=[doc.metadata]
-                )
+            doc_id = content_id(phone, path)
+            for i, (text, vector) in enumerate(chunks):
+                chunk_id = content_id(phone, text)
+                if chunk_id in seen:
+                    duplicates += 1
+                    continue
+                seen.add(chunk_id)
+
+                ids.append(chunk_id)
+                documents.append(text)
+                embeddings.append(vector)
+                metadatas.append({
+                    "customer": phone,
+                    "document_id": doc_id,
+                    "filename": filename,
+                    "source": path,
+                    "page_hash": page_hash,
+                    "chunk_number": i + 1,
+                    "total_chunks": len(chunks)
+                })
+            logging.info(f"Ingesting {len(chunks)} chunks from {filename}")
+
+        written = 0
+        for start in range(0, len(ids), self.write_batch_size):
+            batch = slice(start, start + self.write_batch_size)
+            stored = self.store.existing_ids(phone, ids[batch])
+            fresh = [
+                record for record in zip(ids[batch], documents[batch], embeddings[batch], metadatas[batch])
+                if record[0] not in stored
+            ]
+            duplicates += len(stored)
+            if not fresh:
+                continue
+
+            # Deterministic ids make the write an idempotent upsert
+            batch_ids, batch_documents, batch_embeddings, batch_metadatas = zip(*fresh)
+            self.store.upsert(
+                phone,
+                list(batch_ids),
+                list(batch_documents),
+                list(batch_embeddings),
+                list(batch_metadatas)
             )
-            
-        if not chunks:
-            logging.warning(f"No valid chunks to ingest for file {filename}")
-            return
+            written += len(fresh)
+
+        # Only now are these pages complete; a run that died between the
+        # writes above leaves them unmarked, to be written again
+        if page_chunks:
+            self.store.mark_pages(phone, page_chunks)
 
-        doc_id = str(uuid.uuid4())
-        for i, c in enumerate(chunks):
-            c.metadata.update({
-                "customer": phone,
-                "document_id": doc_id,
-                "filename": filename,
-                "source": path,
-                "chunk_number": i + 1,
-                "total_chunks": len(chunks)
-            })
-
-        logging.info(f"Ingesting {len(chunks)} chunks from {filename}")
-        print(f"Ingesting {len(chunks)} chunks from {filename}")
-        self.vectorstore.add_documents(chunks)
-
-    def ingest_directory(self, phone):
+        if duplicates:
+            logging.info(f"Skipped {duplicates} duplicate chunks for {phone}")
+        return written
+
+    def ingest_directory(self, phone, progress=None):
+        """
+        Ingest every .txt page scraped for a customer.
+        progress, if given, is called as progress(files_done, files_total, chunks_written)
+        after each batch of files is stored.
+        """
         directory = os.path.join(self.config["document_loader"]["directory"], str(phone))
 
-        for filename in os.listdir(directory):
-            if filename.endswith(".txt"):
-                full_path = os.path.join(directory, filename)
-                self.add_document(full_path, filename, phone)
+        files = [
+            (os.path.join(directory, filename), filename)
+            for filename in sorted(os.listdir(directory))
+            if filename.endswith(".txt")
+        ]
+        batches = [files[i:i + self.file_batch_size] for i in range(0, len(files), self.file_batch_size)]
+
+        started = time.perf_counter()
+        seen = set()
+        if self.workers > 1 and len(batches) > 1:
+            total_chunks = self._ingest_parallel(batches, phone, len(files), seen, progress)
+        else:
+            total_chunks = 0
+            files_done = 0
+            for batch in batches:
+                total_chunks += self.add_documents(batch, phone, seen)
+                files_done += len(batch)
+                if progress:
+                    progress(files_done, len(files), total_chunks)
+
+        self.prune_stale(phone, {key[1] for key in seen if isinstance(key, tuple) and key[0] == "page"})
+        self.rebuild_lexical_index(phone)
+
+        elapsed = time.perf_counter() - started
+        logging.info(
+            f"✅ All documents ingested successfully: {total_chunks} chunks from {len(files)} files "
+            f"in {elapsed:.1f}s ({total_chunks / max(elapsed, 1e-9):.1f} chunks/s)"
+        )
+        return total_chunks
+
+    def prune_stale(self, phone: str, current_pages: set[str]) -> int:
+        """
+        Delete the customer's chunks that no current page needs (pages
+        that changed or were removed since an earlier run: old prices,
+        sold listings) and forget those pages. Returns chunks deleted.
+        """
+        marked = self.store.page_chunk_ids(phone)
+        unmarked = current_pages - set(marked)
+        if unmarked:
+            # Their chunks aren't known, so nothing can be called stale
+            logging.warning(f"{len(unmarked)} pages for {phone} are not fully stored; keeping old chunks")
+            return 0
+
+        needed = set()
+        for page_hash in current_pages:
+            needed.update(marked[page_hash])
+        stale_ids = [chunk_id for chunk_id, _ in self.store.iter_documents(phone) if chunk_id not in needed]
+        stale_pages = [page_hash for page_hash in marked if page_hash not in current_pages]
+        if stale_ids or stale_pages:
+            self.store.delete(phone, stale_ids, stale_pages)
+            logging.info(f"🧹 Removed {len(stale_ids)} stale chunks of {len(stale_pages)} old pages for {phone}")
+        return len(stale_ids)
+
+    def _ingest_parallel(self, batches: list, phone: str, files_total: int, seen: set, progress=None) -> int:
+        """
+        Shard chunking and embedding across a process pool. This process
+        stays the single reader/writer of the vector store.
+        """
+        workers = min(self.workers, len(batches))
+        logging.info(f"Ingesting {files_total} files for {phone} with {workers} worker processes")
+
+        total_chunks = 0
+        files_done = 0
+        pending = {}
+        queued = iter(batches)
+
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_chunk_worker,
+            initargs=(self.config_path, self._injected_embeddings, self.threads_per_worker, self.chunking),
+        ) as pool:
+            while True:
+                # Keep a bounded number of batches in flight
+                while len(pending) < workers * 2:
+                    batch = next(queued, None)
+                    if batch is None:
+                        break
+                    pages = self._load_pages(batch, phone, seen)
+                    future = pool.submit(split_in_worker, [page[1] for page in pages])
+                    pending[future] = (batch, pages)
+
+                if not pending:
+                    break
+
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    batch, pages = pending.pop(future)
+                    total_chunks += self._store_chunks(pages, future.result(), phone, seen)
+                    files_done += len(batch)
+                    if progress:
+                        progress(files_done, files_total, total_chunks)
 
-        logging.info("✅ All documents ingested successfully")
-    
\ No newline at end of file
+        return total_chunks
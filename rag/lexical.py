@@ -0,0 +1,224 @@
+import io
+import math
+import os
+import re
+from collections import Counter
+import numpy as np
+from .tenancy import tenant_slug
+from .vectorstore import is_shared_store
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[-,.][a-z0-9]+)*")
+
+STOPWORDS = frozenset("""
+a an and are as at be but by can do does for from has have how i if in is it its me my
+of on or our so still that the their there this to us was we what when where which who
+will with you your
+""".split())
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    Lowercased word tokens that keep exact identifiers intact:
+    "$27,995" -> "27995", "STK60760" -> "stk60760", "CR-V" -> "cr-v", "cr", "v".
+    """
+    tokens = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        token = token.replace(",", "")
+        if token in STOPWORDS:
+            continue
+        tokens.append(token)
+        if "-" in token or "." in token:
+            tokens.extend(part for part in re.split(r"[-.]", token) if part)
+    return tokens
+
+
+def is_identifier(token: str) -> bool:
+    # Stock numbers, prices, model codes: anything carrying a digit
+    return len(token) >= 3 and any(ch.isdigit() for ch in token)
+
+
+class LexicalIndex:
+    """
+    BM25 over one tenant's chunks. Postings are stored CSR-style: a sorted
+    term array, offsets into flat doc-id / term-frequency arrays, and
+    per-document lengths.
+    """
+
+    def __init__(self, ids, terms, offsets, doc_ids, tfs, lengths, k1: float = 1.2, b: float = 0.75):
+        self.ids = ids
+        self.terms = terms
+        self.offsets = offsets
+        self.doc_ids = doc_ids
+        self.tfs = tfs
+        self.lengths = lengths
+        self.avg_length = float(lengths.mean()) if len(lengths) else 0.0
+        self.k1 = k1
+        self.b = b
+
+    @classmethod
+    def build(cls, chunks) -> "LexicalIndex":
+        """
+        chunks: iterable of (chunk_id, text).
+        """
+        ids, lengths = [], []
+        postings = {}
+        for doc, (chunk_id, text) in enumerate(chunks):
+            counts = Counter(tokenize(text))
+            ids.append(chunk_id)
+            lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                postings.setdefault(term, []).append((doc, tf))
+
+        terms = sorted(postings)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        doc_ids, tfs = [], []
+        for i, term in enumerate(terms):
+            docs = postings[term]
+            offsets[i + 1] = offsets[i] + len(docs)
+            doc_ids.extend(doc for doc, _ in docs)
+            tfs.extend(tf for _, tf in docs)
+
+        return cls(
+            np.array(ids, dtype=str),
+            np.array(terms, dtype=str),
+            offsets,
+            np.array(doc_ids, dtype=np.int32),
+            np.minimum(np.array(tfs, dtype=np.int64), np.iinfo(np.uint16).max).astype(np.uint16),
+            np.array(lengths, dtype=np.int32),
+        )
+
+    def save(self, f):
+        """Write the index as .npz to a path or binary file object."""
+        np.savez(
+            f,
+            ids=self.ids,
+            terms=self.terms,
+            offsets=self.offsets,
+            doc_ids=self.doc_ids,
+            tfs=self.tfs,
+            lengths=self.lengths,
+        )
+
+    @classmethod
+    def load(cls, f) -> "LexicalIndex":
+        with np.load(f, allow_pickle=False) as data:
+            return cls(
+                data["ids"],
+                data["terms"],
+                data["offsets"],
+                data["doc_ids"],
+                data["tfs"],
+                data["lengths"],
+            )
+
+    def _postings(self, term: str) -> tuple[int, int] | None:
+        position = int(np.searchsorted(self.terms, term))
+        if position >= len(self.terms) or self.terms[position] != term:
+            return None
+        return int(self.offsets[position]), int(self.offsets[position + 1])
+
+    def pinned(self, query: str, max_docs: int = 1) -> list[str]:
+        """
+        Chunk ids holding an identifier from the query that occurs in at most
+        max_docs chunks, e.g. a stock number. Such a match is decisive.
+        """
+        pinned = []
+        for term in dict.fromkeys(tokenize(query)):
+            if not is_identifier(term):
+                continue
+            span = self._postings(term)
+            if span is None or span[1] - span[0] > max_docs:
+                continue
+            for doc in self.doc_ids[span[0]:span[1]]:
+                chunk_id = str(self.ids[doc])
+                if chunk_id not in pinned:
+                    pinned.append(chunk_id)
+        return pinned
+
+    def search(self, query: str, k: int) -> list[tuple[str, float]]:
+        """
+        Top-k (chunk_id, bm25_score) for the query, best first.
+        """
+        count = len(self.ids)
+        if count == 0 or len(self.terms) == 0 or k <= 0:
+            return []
+
+        scores = np.zeros(count, dtype=np.float32)
+        for term in set(tokenize(query)):
+            span = self._postings(term)
+            if span is None:
+                continue
+            start, end = span
+            docs = self.doc_ids[start:end]
+            tf = self.tfs[start:end].astype(np.float32)
+            df = end - start
+            idf = math.log(1 + (count - df + 0.5) / (df + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * self.lengths[docs] / self.avg_length)
+            scores[docs] += idf * tf * (self.k1 + 1) / (tf + norm)
+
+        matched = int(np.count_nonzero(scores))
+        if matched == 0:
+            return []
+        k = min(k, matched)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(str(self.ids[i]), float(scores[i])) for i in top]
+
+
+class LexicalIndexStore:
+    """
+    One BM25 index per tenant, reloaded when the ingest process rewrites
+    it. With a shared vector store (pgvector) the postings are kept next
+    to its chunks, so every replica and worker reads the index whichever
+    process built it; otherwise in one file per tenant under
+    <persist_directory>/bm25, next to the local store.
+    """
+
+    def __init__(self, config: dict, store=None):
+        self.root = os.path.join(config["vectorstore"]["persist_directory"], "bm25")
+        self.shared = store if store is not None and is_shared_store(config) else None
+        self._cache = {}
+
+    def _path(self, customer: str) -> str:
+        return os.path.join(self.root, tenant_slug(customer) + ".npz")
+
+    def rebuild(self, customer: str, chunks) -> int:
+        index = LexicalIndex.build(chunks)
+        if self.shared is not None:
+            buffer = io.BytesIO()
+            index.save(buffer)
+            self.shared.save_lexical(customer, buffer.getvalue())
+        else:
+            os.makedirs(self.root, exist_ok=True)
+            path = self._path(customer)
+            with open(path + ".tmp", "wb") as f:
+                index.save(f)
+            os.replace(path + ".tmp", path)
+        return len(index.ids)
+
+    def get(self, customer: str) -> LexicalIndex | None:
+        cached = self._cache.get(customer)
+        if self.shared is not None:
+            version, postings = self.shared.load_lexical(customer, cached[0] if cached else None)
+            if version is None:
+                return None
+            if postings is not None:
+                cached = (version, LexicalIndex.load(io.BytesIO(postings)))
+        else:
+            path = self._path(customer)
+            try:
+                version = os.stat(path).st_mtime_ns
+            except FileNotFoundError:
+                return None
+            if cached is None or cached[0] != version:
+                cached = (version, LexicalIndex.load(path))
+        self._cache[customer] = cached
+        return cached[1]
+
+    def search(self, customer: str, query: str, k: int) -> list[tuple[str, float]]:
+        index = self.get(customer)
+        return index.search(query, k) if index is not None else []
+
+    def pinned(self, customer: str, query: str, max_docs: int = 1) -> list[str]:
+        index = self.get(customer)
+        return index.pinned(query, max_docs) if index is not None else []
@@ -0,0 +1,235 @@
+import argparse
+import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+import numpy as np
+
+MODEL_FILE = "model.int8.onnx"
+META_FILE = "onnx_config.json"
+
+
+def resolve_model_name(model_name: str) -> str:
+    # HuggingFaceEmbeddings accepts bare sentence-transformers names
+    if os.path.isdir(model_name) or "/" in model_name:
+        return model_name
+    return "sentence-transformers/" + model_name
+
+
+def model_directory(cache_dir: str, model_name: str) -> str:
+    return os.path.join(cache_dir, re.sub(r"[^a-zA-Z0-9._-]", "_", model_name.strip("/")) + "-int8")
+
+
+# -----------------------
+#   Export
+# -----------------------
+def export_quantized(model_name: str, output_dir: str, task: str, max_length: int) -> str:
+    """
+    Export a Hugging Face encoder to ONNX and quantize its weights to int8
+    (dynamic quantization: activations stay float and are quantized per call).
+    task is "embedding" (last_hidden_state) or "cross-encoder" (logits).
+    Needs torch, transformers and onnx; the runtime side only needs
+    onnxruntime and tokenizers.
+    """
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from transformers import AutoModel, AutoModelForSequenceClassification, AutoTokenizer
+
+    model_name = resolve_model_name(model_name)
+    if task == "embedding":
+        model_cls, output_name = AutoModel, "last_hidden_state"
+    elif task == "cross-encoder":
+        model_cls, output_name = AutoModelForSequenceClassification, "logits"
+    else:
+        raise ValueError(f"Unknown ONNX export task '{task}'")
+
+    logging.info(f"Exporting {model_name} to ONNX (int8) for {task}")
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = model_cls.from_pretrained(model_name).eval()
+
+    sample = tokenizer(["a short question"], ["a longer passage of text"], return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes[output_name] = {0: "batch"}
+
+    class Wrapped(torch.nn.Module):
+        # The tracer passes inputs positionally; forward() signatures differ across versions
+        def __init__(self):
+            super().__init__()
+            self.model = model
+
+        def forward(self, *inputs):
+            return self.model(**dict(zip(input_names, inputs)))[output_name]
+
+    # Write into a scratch directory and rename, so concurrent workers
+    # never load a half-written model
+    parent = os.path.dirname(os.path.abspath(output_dir))
+    os.makedirs(parent, exist_ok=True)
+    scratch = tempfile.mkdtemp(prefix=".onnx_export_", dir=parent)
+    try:
+        fp32_path = os.path.join(scratch, "model.onnx")
+        with torch.no_grad():
+            torch.onnx.export(
+                Wrapped(),
+                tuple(sample[name] for name in input_names),
+                fp32_path,
+                input_names=input_names,
+                output_names=[output_name],
+                dynamic_axes=dynamic_axes,
+                opset_version=17,
+                dynamo=False,
+            )
+        quantize_dynamic(fp32_path, os.path.join(scratch, MODEL_FILE), weight_type=QuantType.QInt8)
+        os.remove(fp32_path)
+
+        tokenizer.save_pretrained(scratch)
+        with open(os.path.join(scratch, META_FILE), "w") as f:
+            json.dump({
+                "model_name": model_name,
+                "task": task,
+                "input_names": input_names,
+                "output_name": output_name,
+                "pad_token": tokenizer.pad_token,
+                "pad_token_id": tokenizer.pad_token_id,
+                "max_length": max_length,
+            }, f, indent=2)
+
+        os.chmod(scratch, 0o755)
+        try:
+            os.rename(scratch, output_dir)
+        except OSError:
+            if not os.path.exists(os.path.join(output_dir, MODEL_FILE)):
+                raise
+            # Another process finished the same export first
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    logging.info(f"✅ Quantized ONNX model written to {output_dir}")
+    return output_dir
+
+
+class _OnnxEncoder:
+    """
+    An int8 ONNX model plus its fast tokenizer, exported on first use.
+    """
+
+    def __init__(self, model_name: str, task: str, cache_dir: str, threads: int, max_length: int):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        directory = model_directory(cache_dir, resolve_model_name(model_name))
+        if not os.path.exists(os.path.join(directory, META_FILE)):
+            export_quantized(model_name, directory, task, max_length)
+
+        with open(os.path.join(directory, META_FILE), "r") as f:
+            self.meta = json.load(f)
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(directory, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=self.meta["max_length"])
+        self.tokenizer.enable_padding(pad_id=self.meta["pad_token_id"], pad_token=self.meta["pad_token"])
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(
+            os.path.join(directory, MODEL_FILE),
+            sess_options=options,
+            providers=["CPUExecutionProvider"]
+        )
+
+    def run(self, inputs: list) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Tokenize a batch (strings or (text, text_pair) tuples) and run the model.
+        Returns (model output, attention mask).
+        """
+        encodings = self.tokenizer.encode_batch(inputs)
+        features = {
+            "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": np.array([e.attention_mask for e in encodings], dtype=np.int64),
+            "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64),
+        }
+        feeds = {name: features[name] for name in self.meta["input_names"]}
+        output = self.session.run([self.meta["output_name"]], feeds)[0]
+        return output, features["attention_mask"]
+
+
+def _length_sorted_batches(texts: list, batch_size: int):
+    # Similar lengths share a batch, so little compute is spent on padding
+    order = sorted(range(len(texts)), key=lambda i: len(str(texts[i])))
+    for start in range(0, len(order), batch_size):
+        yield order[start:start + batch_size]
+
+
+# -----------------------
+#   Models
+# -----------------------
+class OnnxEmbeddings:
+    """
+    Drop-in for HuggingFaceEmbeddings (embed_documents / embed_query) on
+    an int8 ONNX export: mean pooling over real tokens, L2-normalised,
+    like the all-MiniLM-L6-v2 sentence-transformers pipeline.
+    """
+
+    def __init__(self, model_name: str, cache_dir: str = "./onnx_models", threads: int = 1,
+                 batch_size: int = 32, max_length: int = 256):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.encoder = _OnnxEncoder(model_name, "embedding", cache_dir, threads, max_length)
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        if not texts:
+            return []
+        vectors = [None] * len(texts)
+        for batch in _length_sorted_batches(texts, self.batch_size):
+            hidden, mask = self.encoder.run([texts[i] for i in batch])
+            mask = mask[:, :, None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+            for i, vector in zip(batch, pooled):
+                vectors[i] = vector.tolist()
+        return vectors
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embed_documents([text])[0]
+
+
+class OnnxCrossEncoder:
+    """
+    Drop-in for sentence_transformers.CrossEncoder.predict on an int8 ONNX
+    export. Single-logit models get the same sigmoid CrossEncoder applies.
+    """
+
+    def __init__(self, model_name: str, cache_dir: str = "./onnx_models", threads: int = 1,
+                 batch_size: int = 32, max_length: int = 512):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.encoder = _OnnxEncoder(model_name, "cross-encoder", cache_dir, threads, max_length)
+
+    def predict(self, pairs: list) -> np.ndarray:
+        pairs = [(str(query), str(passage)) for query, passage in pairs]
+        if not pairs:
+            return np.zeros(0, dtype=np.float32)
+        scores = [None] * len(pairs)
+        for batch in _length_sorted_batches(pairs, self.batch_size):
+            logits, _ = self.encoder.run([pairs[i] for i in batch])
+            batch_scores = 1 / (1 + np.exp(-logits[:, 0])) if logits.shape[1] == 1 else logits
+            for i, score in zip(batch, batch_scores):
+                scores[i] = score
+        return np.asarray(scores, dtype=np.float32)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    parser = argparse.ArgumentParser(description="Export the embedding and reranker models to int8 ONNX ahead of time.")
+    parser.add_argument("--config", default="config.yaml")
+    args = parser.parse_args()
+
+    from .utils import Utils
+    utils = Utils(args.config)
+    utils.initialize_embeddings(backend="onnx")
+    utils.initialize_reranker(backend="onnx")
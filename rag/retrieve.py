@@ -1,79 +1,148 @@
-from langchain_experimental.text_splitter import SemanticChunker
 import logging
+import threading
 from .utils import Utils
-import chromadb
-from sentence_transformers import CrossEncoder
+from .lexical import LexicalIndexStore
+from .vectorstore import create_vector_store
+from service.metrics import timed
 
 
 class RagRetriever:
-    def __init__(self, config_path: str = "config.yaml"):
+    def __init__(self, config_path: str = "config.yaml", embeddings=None, reranker=None):
         self.utils = Utils(config_path)
         self.config = self.utils.config
-        self.embeddings = self.utils.initialize_embeddings()
+        self.embeddings = embeddings or self.utils.initialize_embeddings()
 
         if self.embeddings is None:
             raise ValueError("Embeddings must not be None for retrieval")
 
-        self.chroma_client = chromadb.PersistentClient(
-            path=self.config["vectorstore"]["persist_directory"]
-        )
+        self.store = create_vector_store(self.config)
 
-        self.collection = self.chroma_client.get_collection("rag_documents")
+        retrieval_config = self.config.get("retrieval") or {}
+        self.hybrid = retrieval_config.get("hybrid", False)
+        self.rrf_k = retrieval_config.get("rrf_k", 60)
+        self.lexical_decisive_max_docs = retrieval_config.get("lexical_decisive_max_docs", 1)
+        self.lexical = LexicalIndexStore(self.config, self.store)
+        self._lexical_lock = threading.Lock()
+        self._lexical_missing = set()
 
-        self.semantic_text_splitter = SemanticChunker(
-            self.embeddings,
-            breakpoint_threshold_type="percentile",
-            breakpoint_threshold_amount=90
-        )
-
-        # Load HuggingFace reranker model (cross-encoder)
-        self.reranker = CrossEncoder('cross-encoder/ms-marco-MiniLM-L-6-v2')
+        # Load the cross-encoder reranker (PyTorch or int8 ONNX, per inference.backend)
+        self.reranker = reranker or self.utils.initialize_reranker()
 
     def query(self, query_text: str, customer: str,top_k: int = 5, min_score: float = 0.0):
-        print(f"Querying for customer: {customer} with text: {query_text}")
+        logging.debug(f"Querying for customer: {customer} with text: {query_text}")
         if not isinstance(query_text, (str, list)):
             raise TypeError(f"Query text must be str or list of str, got {type(query_text)}")
         if isinstance(query_text, list):
             for i, item in enumerate(query_text):
                 if not isinstance(item, str):
                     raise TypeError(f"Query list item {i} must be str, got {type(item)}")
-        query_embedding = [self.embeddings.embed_query(query_text)]
-        results = self.collection.query(
-            query_embeddings=query_embedding,
-            n_results=top_k * 2,  # retrieve more for reranking
-            where={"customer": customer},
-            include=["documents", "metadatas", "distances"]
-        )
-        retrieved_docs = []
-        for doc, metadata, dist in zip(
-            results["documents"][0],
-            results["metadatas"][0],
-            results["distances"][0]
-        ):
-            retrieved_docs.append({
-                "document": doc,
-                "metadata": metadata,
-                "distance": float(dist),
-                "similarity": 1 / (1 + dist)
-            })
-            print(f"Retrieved document: {doc[:10]}...", f"Similarity: {1 / (1 + dist)}", f"Metadata: {metadata}", sep="\n")
-            
+        retrieved_docs, decisive = self.retrieve_candidates(query_text, customer, top_k=top_k)
+        if not retrieved_docs:
+            logging.info(f"No documents stored for customer {customer}")
+            return ""
+
         logging.info(f"Retrieved {len(retrieved_docs)} documents before reranking. scores: {[doc['similarity'] for doc in retrieved_docs]}")
 
+        if decisive:
+            # An exact token (stock number, price, trim code) pinned the answer
+            logging.info("Decisive lexical match, skipping rerank.")
+            return retrieved_docs[:top_k]
+
         # Rerank top_k documents using HuggingFace reranker with score filtering
         reranked_docs = self.rerank_top_k_docs(query_text, retrieved_docs, top_k=top_k, min_score=min_score)
 
         return reranked_docs
 
+    def retrieve_candidates(self, query_text: str, customer: str, top_k: int = 5) -> tuple[list[dict], bool]:
+        """
+        Vector hits fused with BM25 hits by reciprocal rank fusion.
+        Returns (candidates best first, whether the lexical match is decisive).
+        """
+        with timed("embed"):
+            query_embedding = self.embeddings.embed_query(query_text)
+        with timed("vector_query"):
+            hits = self.store.query(
+                customer,
+                query_embedding,
+                n_results=top_k * 2  # retrieve more for reranking
+            )
+
+        candidates = {}
+        for rank, hit in enumerate(hits):
+            dist = hit["distance"]
+            candidates[hit["id"]] = {
+                "id": hit["id"],
+                "document": hit["document"],
+                "metadata": hit["metadata"],
+                "distance": float(dist),
+                "similarity": 1 / (1 + dist),
+                "rrf_score": 1 / (self.rrf_k + rank + 1)
+            }
+            logging.debug(f"Retrieved document: {hit['document'][:10]}... similarity {1 / (1 + dist):.3f} metadata {hit['metadata']}")
+
+        if not self.hybrid:
+            return list(candidates.values()), False
+
+        index = self.lexical_index(customer)
+        if index is None:
+            return list(candidates.values()), False
+        lexical_hits = index.search(str(query_text), top_k * 2)
+        pinned = index.pinned(str(query_text), self.lexical_decisive_max_docs)
+
+        missing = [chunk_id for chunk_id, _ in lexical_hits if chunk_id not in candidates]
+        missing += [chunk_id for chunk_id in pinned if chunk_id not in candidates and chunk_id not in missing]
+        for stored in self.store.get(customer, missing):
+            candidates[stored["id"]] = {**stored, "distance": None, "similarity": None, "rrf_score": 0.0}
+
+        for rank, (chunk_id, score) in enumerate(lexical_hits):
+            if chunk_id in candidates:
+                candidates[chunk_id]["lexical_score"] = score
+                candidates[chunk_id]["rrf_score"] += 1 / (self.rrf_k + rank + 1)
+
+        fused = sorted(candidates.values(), key=lambda doc: doc["rrf_score"], reverse=True)
+
+        # A rare exact identifier (stock number, price) pins its chunks to the top
+        decisive = bool(pinned)
+        if decisive:
+            fused.sort(key=lambda doc: doc["id"] not in pinned)
+
+        return fused, decisive
+
+    def lexical_index(self, customer: str):
+        """
+        The customer's BM25 index. One missing while chunks are stored
+        (ingested before hybrid was enabled, or its file lost) is rebuilt
+        from the vector store, once per process.
+        """
+        index = self.lexical.get(customer)
+        if index is not None or customer in self._lexical_missing:
+            return index
+        with self._lexical_lock:
+            index = self.lexical.get(customer)
+            if index is None and customer not in self._lexical_missing:
+                self._lexical_missing.add(customer)
+                if self.store.count(customer):
+                    logging.warning(f"Hybrid retrieval is on but {customer} has no BM25 index; rebuilding it")
+                    try:
+                        with timed("lexical_rebuild"):
+                            self.lexical.rebuild(customer, self.store.iter_documents(customer))
+                        index = self.lexical.get(customer)
+                    except Exception as e:
+                        logging.error(f"BM25 rebuild for {customer} failed, retrieving by vector only: {e}")
+        return index
+
     def rerank_top_k_docs(self, query: str, docs: list[dict], top_k: int = 5, min_score: float = 0.0):
         # Prepare pairs for reranker: (query, doc_text)
         pairs = [(query, doc["document"]) for doc in docs[:top_k]]
 
         # Get scores from reranker model (numpy array)
-        scores = self.reranker.predict(pairs)
+        with timed("rerank"):
+            scores = self.reranker.predict(pairs)
 
-        # Pair each doc with its score
+        # Pair each doc with its score; keep it on the doc for context packing
         scored_docs = list(zip(docs[:top_k], scores))
+        for doc, score in scored_docs:
+            doc["rerank_score"] = float(score)
 
         # Filter by minimum score threshold
         filtered_docs = scored_docs
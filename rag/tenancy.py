@@ -0,0 +1,162 @@
+import argparse
+import hashlib
+import logging
+import re
+from collections import defaultdict
+from .utils import Utils
+
+SHARED_COLLECTION = "rag_documents"
+
+
+def tenant_key(customer: str) -> str:
+    # Chroma names allow [a-zA-Z0-9._-] only, so "+15551234567" -> tenant_15551234567.
+    # Not unique: "+1-5551234567" maps there too, so anything keyed by it
+    # alone must also filter by customer; tenant_slug is unique
+    return "tenant_" + (re.sub(r"[^a-zA-Z0-9]", "", str(customer)) or "unknown")
+
+
+def customer_digest(customer: str) -> str:
+    return hashlib.sha256(str(customer).encode("utf-8")).hexdigest()[:16]
+
+
+def tenant_slug(customer: str) -> str:
+    """
+    A file name unique to the exact customer string: tenant_key plus a
+    hash of the customer, e.g. tenant_15551234567_1f0c2a9b8d7e6f50.
+    """
+    return f"{tenant_key(customer)[:40]}_{customer_digest(customer)}"
+
+
+class TenantRouter:
+    """
+    Decides which Chroma collection holds a customer's chunks.
+
+    vectorstore.tenancy in config.yaml:
+      shared     - everyone in rag_documents, filtered by customer (legacy)
+      collection - one collection per customer (named by tenant_slug),
+                   no filter needed
+      sharded    - customers hashed into vectorstore.tenant_shards groups,
+                   filtered by customer inside the group
+    """
+
+    MODES = ("shared", "collection", "sharded")
+
+    def __init__(self, config: dict):
+        vectorstore = config["vectorstore"]
+        self.mode = vectorstore.get("tenancy", "shared")
+        self.shards = int(vectorstore.get("tenant_shards", 16))
+        if self.mode not in self.MODES:
+            raise ValueError(f"Unknown vectorstore.tenancy '{self.mode}', expected one of {self.MODES}")
+
+    def collection_name(self, customer: str) -> str:
+        if self.mode == "collection":
+            return tenant_slug(customer)
+        if self.mode == "sharded":
+            digest = hashlib.sha256(str(customer).encode("utf-8")).digest()
+            return f"rag_shard_{int.from_bytes(digest[:8], 'big') % self.shards:03d}"
+        return SHARED_COLLECTION
+
+    def where(self, customer: str) -> dict | None:
+        """
+        Metadata filter for queries; None when the collection holds one customer only.
+        """
+        if self.mode == "collection":
+            return None
+        return {"customer": customer}
+
+    def legacy_collections(self, customer: str) -> list[str]:
+        """
+        Where the customer's chunks may still be if they were stored
+        before a tenancy change or before collections were named by
+        tenant_slug: tenant_key collections can hold several customers.
+        """
+        if self.mode == "shared":
+            return []
+        if self.mode == "collection":
+            return [tenant_key(customer), SHARED_COLLECTION]
+        return [SHARED_COLLECTION]
+
+
+# -----------------------
+#   Migration
+# -----------------------
+LEGACY_TENANT_COLLECTION = re.compile(r"tenant_[a-zA-Z0-9]+")  # tenant_key names, before tenant_slug
+
+
+def migrate_shared_collection(config_path: str = "config.yaml", batch_size: int = 1000, delete_source: bool = False):
+    """
+    Copy every chunk of the shared rag_documents collection (and, in
+    "collection" mode, of the older tenant_key-named collections) into
+    the collection its customer is routed to by the configured tenancy
+    mode. Ids are preserved, so the migration can be re-run safely.
+    """
+    import chromadb
+
+    config = Utils(config_path).config
+    router = TenantRouter(config)
+    if router.mode == "shared":
+        raise RuntimeError("vectorstore.tenancy is 'shared'; nothing to migrate")
+
+    client = chromadb.PersistentClient(path=config["vectorstore"]["persist_directory"])
+    names = [collection.name if hasattr(collection, "name") else collection for collection in client.list_collections()]
+    sources = [name for name in names if name == SHARED_COLLECTION
+               or (router.mode == "collection" and LEGACY_TENANT_COLLECTION.fullmatch(name))]
+
+    copied = defaultdict(int)
+    for source_name in sources:
+        source = client.get_collection(source_name)
+        total = source.count()
+        logging.info(f"Migrating {total} chunks out of {source_name} ({router.mode} mode)")
+
+        moved = 0
+        for offset in range(0, total, batch_size):
+            page = source.get(
+                limit=batch_size,
+                offset=offset,
+                include=["documents", "metadatas", "embeddings"]
+            )
+
+            grouped = defaultdict(lambda: ([], [], [], []))
+            for chunk_id, document, metadata, embedding in zip(
+                page["ids"], page["documents"], page["metadatas"], page["embeddings"]
+            ):
+                ids, documents, metadatas, embeddings = grouped[router.collection_name(metadata.get("customer"))]
+                ids.append(chunk_id)
+                documents.append(document)
+                metadatas.append(metadata)
+                embeddings.append(embedding)
+
+            for name, (ids, documents, metadatas, embeddings) in grouped.items():
+                client.get_or_create_collection(name).upsert(
+                    ids=ids,
+                    documents=documents,
+                    metadatas=metadatas,
+                    embeddings=embeddings
+                )
+                copied[name] += len(ids)
+                moved += len(ids)
+
+            logging.info(f"Migrated {min(offset + batch_size, total)}/{total} chunks")
+
+        if delete_source:
+            if moved != total:
+                raise RuntimeError(f"Chunk counts do not match; keeping {source_name}")
+            client.delete_collection(source_name)
+            logging.info(f"🗑️ Deleted {source_name}")
+
+    for name, count in sorted(copied.items()):
+        logging.info(f"  {name}: {count} chunks")
+
+    return dict(copied)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    parser = argparse.ArgumentParser(description="Move the shared rag_documents collection (and tenant_key-named collections) into the configured tenancy's collections.")
+    parser.add_argument("--config", default="config.yaml")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--delete-source", action="store_true", help="drop each source collection once every chunk is copied")
+    args = parser.parse_args()
+
+    migrate_shared_collection(args.config, args.batch_size, args.delete_source)
@@ -1,5 +1,3 @@
-from langchain_openai import ChatOpenAI
-from langchain_community.embeddings import HuggingFaceEmbeddings
 import os
 import yaml
 from typing import Dict, Any
@@ -17,6 +15,7 @@ class Utils:
             raise RuntimeError(f"Failed to load config: {e}")
 
     def initialize_llm(self):
+        from langchain_openai import ChatOpenAI
         groq = self.config["model"]["groq"]
         api_key = os.getenv(groq["api_key_env"])
         if not api_key:
@@ -30,5 +29,35 @@ class Utils:
             base_url=groq.get("api_url")
         )
 
-    def initialize_embeddings(self):
-        return HuggingFaceEmbeddings(model_name=self.config["embeddings"]["HuggingFaceEmbeddings"]["model_name"])
+    def _inference_backend(self, backend: str | None) -> tuple[str, dict]:
+        inference = self.config.get("inference") or {}
+        backend = backend or inference.get("backend", "torch")
+        if backend not in ("torch", "onnx"):
+            raise ValueError(f"Unknown inference.backend '{backend}', expected torch or onnx")
+        return backend, inference
+
+    def initialize_embeddings(self, backend: str | None = None, threads: int | None = None):
+        model_name = self.config["embeddings"]["HuggingFaceEmbeddings"]["model_name"]
+        backend, inference = self._inference_backend(backend)
+        if backend == "onnx":
+            from .onnx_backend import OnnxEmbeddings
+            return OnnxEmbeddings(
+                model_name,
+                cache_dir=inference.get("onnx_cache_dir", "./onnx_models"),
+                threads=threads or inference.get("onnx_threads", 1)
+            )
+        from langchain_community.embeddings import HuggingFaceEmbeddings
+        return HuggingFaceEmbeddings(model_name=model_name)
+
+    def initialize_reranker(self, backend: str | None = None, threads: int | None = None):
+        backend, inference = self._inference_backend(backend)
+        model_name = inference.get("reranker_model", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+        if backend == "onnx":
+            from .onnx_backend import OnnxCrossEncoder
+            return OnnxCrossEncoder(
+                model_name,
+                cache_dir=inference.get("onnx_cache_dir", "./onnx_models"),
+                threads=threads or inference.get("onnx_threads", 1)
+            )
+        from sentence_transformers import CrossEncoder
+        return CrossEncoder(model_name)
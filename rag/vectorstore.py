@@ -0,0 +1,933 @@
+import asyncio
+import atexit
+import json
+import logging
+import os
+import threading
+from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager
+import numpy as np
+import psycopg
+from psycopg import sql
+from .tenancy import SHARED_COLLECTION, TenantRouter, customer_digest, tenant_key, tenant_slug
+
+
+class VectorStore(ABC):
+    """
+    What RagIngest and RagRetriever need from a vector backend.
+    Every call is scoped to one customer; embeddings are precomputed.
+    """
+
+    max_batch_size = 1024
+
+    @abstractmethod
+    def upsert(self, customer: str, ids: list[str], documents: list[str], embeddings: list, metadatas: list[dict]):
+        ...
+
+    @abstractmethod
+    def existing_ids(self, customer: str, ids: list[str]) -> set[str]:
+        ...
+
+    @abstractmethod
+    def stored_page_hashes(self, customer: str, page_hashes: list[str]) -> set[str]:
+        """
+        The given pages that are fully stored, i.e. marked by mark_pages.
+        """
+
+    @abstractmethod
+    def mark_pages(self, customer: str, pages: dict[str, list[str]]):
+        """
+        Record pages as fully stored, each with the ids of every chunk it
+        needs, including ones first written for another page. Called once
+        all of their chunks are written, so a run that dies part way
+        leaves its pages unmarked and the next run writes them again.
+        """
+
+    @abstractmethod
+    def page_chunk_ids(self, customer: str) -> dict[str, list[str]]:
+        """
+        Every marked page of the customer, with the chunk ids it needs.
+        """
+
+    @abstractmethod
+    def delete(self, customer: str, ids: list[str], page_hashes: list[str]):
+        """
+        Remove chunks and page marks.
+        """
+
+    @abstractmethod
+    def query(self, customer: str, embedding: list[float], n_results: int) -> list[dict]:
+        """
+        Nearest chunks as {"id", "document", "metadata", "distance"} dicts,
+        closest first. distance is squared L2 between unit vectors (Chroma's "l2").
+        """
+
+    @abstractmethod
+    def get(self, customer: str, ids: list[str]) -> list[dict]:
+        """
+        Stored chunks as {"id", "document", "metadata"} dicts, in the order of ids.
+        """
+
+    @abstractmethod
+    def iter_documents(self, customer: str):
+        """
+        Yield (id, document) for every chunk stored for the customer.
+        """
+
+    @abstractmethod
+    def count(self, customer: str) -> int:
+        ...
+
+
+# Backends whose chunks every process and host reads; Chroma and NumPy
+# files belong to the one process that has them open
+SHARED_BACKENDS = ("pgvector",)
+
+
+def is_shared_store(config: dict) -> bool:
+    return (config.get("vectorstore") or {}).get("type", "chroma") in SHARED_BACKENDS
+
+
+def create_vector_store(config: dict) -> VectorStore:
+    store_type = config["vectorstore"].get("type", "chroma")
+    if store_type == "chroma":
+        return ChromaVectorStore(config)
+    if store_type == "numpy":
+        return NumpyVectorStore(config)
+    if store_type == "pgvector":
+        return PgVectorStore(config)
+    raise ValueError(f"Unknown vectorstore.type '{store_type}'")
+
+
+# -----------------------
+#   Chroma
+# -----------------------
+class ChromaVectorStore(VectorStore):
+    def __init__(self, config: dict):
+        import chromadb
+
+        self.client = chromadb.PersistentClient(
+            path=config["vectorstore"]["persist_directory"]
+        )
+        self.router = TenantRouter(config)
+        self.max_batch_size = self.client.get_max_batch_size()
+        self._collections = {}
+        self._routed = set()
+        self._legacy = set()
+        self.pages_root = os.path.join(config["vectorstore"]["persist_directory"], "pages")
+
+    def collection_for(self, customer: str, create: bool = False):
+        name = self.router.collection_name(customer)
+        if name not in self._collections:
+            if create:
+                self._collections[name] = self.client.get_or_create_collection(name)
+            else:
+                try:
+                    self._collections[name] = self.client.get_collection(name)
+                except Exception:
+                    # Customer has not been ingested yet
+                    return None
+        return self._collections[name]
+
+    def _read_collection(self, customer: str):
+        """
+        The collection to read a customer's chunks from, and its filter.
+        A customer stored before a tenancy change (or, in "collection"
+        mode, in a tenant_key-named collection) and not migrated since
+        (python -m rag.tenancy) or re-ingested is read from there, with
+        the customer filter, rather than looking empty.
+        """
+        collection = self.collection_for(customer)
+        where = self.router.where(customer)
+        if customer in self._routed or not self.router.legacy_collections(customer):
+            return collection, where
+        if collection is not None and collection.get(where=where, limit=1, include=[])["ids"]:
+            self._routed.add(customer)
+            return collection, where
+        legacy_where = {"customer": customer}
+        for name in self.router.legacy_collections(customer):
+            try:
+                legacy = self.client.get_collection(name)
+            except Exception:
+                continue
+            if legacy.get(where=legacy_where, limit=1, include=[])["ids"]:
+                if customer not in self._legacy:
+                    self._legacy.add(customer)
+                    logging.warning(f"{customer} has no chunks in {self.router.collection_name(customer)}; reading {name}")
+                return legacy, legacy_where
+        return collection, where
+
+    def upsert(self, customer, ids, documents, embeddings, metadatas):
+        self.collection_for(customer, create=True).upsert(
+            ids=ids,
+            documents=documents,
+            embeddings=embeddings,
+            metadatas=metadatas
+        )
+
+    def existing_ids(self, customer, ids):
+        collection = self.collection_for(customer)
+        if collection is None:
+            return set()
+        return set(collection.get(ids=ids, include=[])["ids"])
+
+    def _pages(self, customer: str) -> "_PageMarks":
+        # Per collection: after a tenancy change the new collection has none of the pages
+        return _PageMarks(os.path.join(self.pages_root, self.router.collection_name(customer), tenant_slug(customer) + ".json"))
+
+    def stored_page_hashes(self, customer, page_hashes):
+        stored = self._pages(customer).load()
+        return {page_hash for page_hash in page_hashes if page_hash in stored}
+
+    def mark_pages(self, customer, pages):
+        self._pages(customer).update(pages)
+
+    def page_chunk_ids(self, customer):
+        return self._pages(customer).load()
+
+    def delete(self, customer, ids, page_hashes):
+        collection = self.collection_for(customer)
+        if collection is not None:
+            for start in range(0, len(ids), self.max_batch_size):
+                collection.delete(ids=ids[start:start + self.max_batch_size])
+        self._pages(customer).update({}, page_hashes)
+
+    def query(self, customer, embedding, n_results):
+        collection, where = self._read_collection(customer)
+        if collection is None:
+            return []
+        results = collection.query(
+            query_embeddings=[embedding],
+            n_results=n_results,
+            where=where,
+            include=["documents", "metadatas", "distances"]
+        )
+        return [
+            {"id": chunk_id, "document": doc, "metadata": metadata, "distance": float(dist)}
+            for chunk_id, doc, metadata, dist in zip(
+                results["ids"][0],
+                results["documents"][0],
+                results["metadatas"][0],
+                results["distances"][0]
+            )
+        ]
+
+    def get(self, customer, ids):
+        collection, where = self._read_collection(customer)
+        if collection is None or not ids:
+            return []
+        stored = collection.get(ids=ids, where=where, include=["documents", "metadatas"])
+        by_id = {
+            chunk_id: {"id": chunk_id, "document": doc, "metadata": metadata}
+            for chunk_id, doc, metadata in zip(stored["ids"], stored["documents"], stored["metadatas"])
+        }
+        return [by_id[chunk_id] for chunk_id in ids if chunk_id in by_id]
+
+    def iter_documents(self, customer, batch_size: int = 1000):
+        collection, where = self._read_collection(customer)
+        if collection is None:
+            return
+        offset = 0
+        while True:
+            page = collection.get(
+                where=where,
+                limit=batch_size,
+                offset=offset,
+                include=["documents"]
+            )
+            if not page["ids"]:
+                return
+            yield from zip(page["ids"], page["documents"])
+            offset += len(page["ids"])
+
+    def count(self, customer):
+        collection, where = self._read_collection(customer)
+        if collection is None:
+            return 0
+        if where is None:
+            return collection.count()
+        return len(collection.get(where=where, include=[])["ids"])
+
+
+# -----------------------
+#   NumPy exact search
+# -----------------------
+class NumpyVectorStore(VectorStore):
+    """
+    Brute-force cosine search for small tenants. Each tenant directory holds
+    vectors.f16 (unit-normalised float16 rows, memory-mapped) and
+    chunks.jsonl (one id/document/metadata line per row). Directories are
+    named by tenant_key, which two spellings of a number can share, so
+    every read is filtered by the row's customer.
+    """
+
+    max_batch_size = 100_000
+
+    def __init__(self, config: dict):
+        vectorstore = config["vectorstore"]
+        self.root = os.path.join(vectorstore["persist_directory"], "numpy")
+        self.block_rows = int(vectorstore.get("numpy_block_rows", 16384))
+        self._tenants = {}
+
+    def _tenant(self, customer: str) -> "_TenantIndex":
+        key = tenant_key(customer)
+        if key not in self._tenants:
+            self._tenants[key] = _TenantIndex(os.path.join(self.root, key))
+        tenant = self._tenants[key]
+        tenant.refresh()
+        return tenant
+
+    def upsert(self, customer, ids, documents, embeddings, metadatas):
+        self._tenant(customer).upsert(ids, documents, embeddings, metadatas)
+
+    def _pages(self, customer: str) -> "_PageMarks":
+        return _PageMarks(os.path.join(self.root, "pages", tenant_slug(customer) + ".json"))
+
+    def existing_ids(self, customer, ids):
+        tenant = self._tenant(customer)
+        return {chunk_id for chunk_id in ids if tenant.row_of(customer, chunk_id) is not None}
+
+    def stored_page_hashes(self, customer, page_hashes):
+        stored = self._pages(customer).load()
+        return {page_hash for page_hash in page_hashes if page_hash in stored}
+
+    def mark_pages(self, customer, pages):
+        self._pages(customer).update(pages)
+
+    def page_chunk_ids(self, customer):
+        return self._pages(customer).load()
+
+    def delete(self, customer, ids, page_hashes):
+        tenant = self._tenant(customer)
+        tenant.delete([chunk_id for chunk_id in ids if tenant.row_of(customer, chunk_id) is not None])
+        self._pages(customer).update({}, page_hashes)
+
+    def query(self, customer, embedding, n_results):
+        tenant = self._tenant(customer)
+        count = len(tenant.ids)
+        hidden = tenant.hidden(customer)
+        live = count - len(hidden)
+        if live == 0 or n_results <= 0:
+            return []
+
+        query = _normalize(np.asarray(embedding, dtype=np.float32)[None, :])[0]
+
+        # One matmul per block keeps the float32 working copy bounded
+        scores = np.empty(count, dtype=np.float32)
+        for start in range(0, count, self.block_rows):
+            end = min(start + self.block_rows, count)
+            scores[start:end] = tenant.matrix[start:end].astype(np.float32) @ query
+        if hidden:
+            scores[hidden] = -np.inf
+
+        k = min(n_results, live)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [
+            {
+                "id": tenant.ids[i],
+                "document": tenant.documents[i],
+                "metadata": tenant.metadatas[i],
+                "distance": float(max(0.0, 2.0 - 2.0 * scores[i]))
+            }
+            for i in top
+        ]
+
+    def get(self, customer, ids):
+        tenant = self._tenant(customer)
+        return [
+            {"id": chunk_id, "document": tenant.documents[row], "metadata": tenant.metadatas[row]}
+            for chunk_id in ids
+            if (row := tenant.row_of(customer, chunk_id)) is not None
+        ]
+
+    def iter_documents(self, customer):
+        tenant = self._tenant(customer)
+        for chunk_id, document, owner in zip(list(tenant.ids), list(tenant.documents), list(tenant.owners)):
+            if owner == customer:
+                yield chunk_id, document
+
+    def count(self, customer):
+        tenant = self._tenant(customer)
+        return len(tenant.ids) - len(tenant.hidden(customer))
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.clip(norms, 1e-12, None)
+
+
+class _TenantIndex:
+    """
+    One tenant's files. Rows are only ever appended (or overwritten in
+    place), and vectors are written before their metadata line, so a
+    reader in another process sees a consistent prefix. A deleted row
+    keeps its place as a tombstone, so the two files stay aligned.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.vectors_path = os.path.join(directory, "vectors.f16")
+        self.chunks_path = os.path.join(directory, "chunks.jsonl")
+        self.info_path = os.path.join(directory, "index.json")
+        self._signature = None
+        self._reset()
+
+    def _reset(self):
+        self.dimensions = None
+        self.ids, self.documents, self.metadatas = [], [], []
+        self.owners = []  # each row's customer; None once deleted
+        self.rows = {}
+        self.deleted = set()
+        self._hidden = {}
+        self.matrix = None
+
+    def _file_signature(self):
+        try:
+            return (
+                os.stat(self.chunks_path).st_mtime_ns,
+                os.stat(self.chunks_path).st_size,
+                os.stat(self.vectors_path).st_size,
+            )
+        except FileNotFoundError:
+            return None
+
+    def refresh(self):
+        """
+        Reload when another process has written to this tenant.
+        """
+        signature = self._file_signature()
+        if signature == self._signature:
+            return
+        self._reset()
+        self._signature = signature
+        if signature is None:
+            return
+
+        with open(self.info_path, "r") as f:
+            self.dimensions = json.load(f)["dimensions"]
+
+        with open(self.chunks_path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.endswith("\n"):
+                    break  # partially written line
+                self._remember(json.loads(line))
+
+        self._open_matrix()
+
+    def _remember(self, record: dict):
+        if record["metadata"].get("deleted"):
+            self.deleted.add(len(self.ids))
+        else:
+            self.rows[record["id"]] = len(self.ids)
+        self.ids.append(record["id"])
+        self.documents.append(record["document"])
+        self.metadatas.append(record["metadata"])
+        self.owners.append(record["metadata"].get("customer"))
+        self._hidden.clear()
+
+    def row_of(self, customer: str, chunk_id: str) -> int | None:
+        row = self.rows.get(chunk_id)
+        return row if row is not None and self.owners[row] == customer else None
+
+    def hidden(self, customer: str) -> list[int]:
+        """Rows a read for customer must skip: deleted, or another customer's."""
+        if customer not in self._hidden:
+            self._hidden[customer] = [row for row, owner in enumerate(self.owners) if owner != customer]
+        return self._hidden[customer]
+
+    def _open_matrix(self):
+        vector_rows = os.path.getsize(self.vectors_path) // (self.dimensions * 2)
+        count = min(len(self.ids), vector_rows)
+        for row, chunk_id in enumerate(self.ids[count:], count):
+            # vector not fully written yet
+            if self.rows.get(chunk_id) == row:
+                del self.rows[chunk_id]
+            self.deleted.discard(row)
+        del self.ids[count:], self.documents[count:], self.metadatas[count:], self.owners[count:]
+        self._hidden.clear()
+        self.matrix = (
+            np.memmap(self.vectors_path, dtype=np.float16, mode="r", shape=(count, self.dimensions))
+            if count else None
+        )
+
+    def upsert(self, ids, documents, embeddings, metadatas):
+        vectors = _normalize(np.asarray(embeddings, dtype=np.float32)).astype(np.float16)
+
+        os.makedirs(self.directory, exist_ok=True)
+        if self.dimensions is None:
+            self.dimensions = vectors.shape[1]
+            with open(self.info_path, "w") as f:
+                json.dump({"dimensions": self.dimensions, "dtype": "float16"}, f)
+        elif vectors.shape[1] != self.dimensions:
+            raise ValueError(f"Embedding size {vectors.shape[1]} does not match index size {self.dimensions}")
+
+        existing = [i for i, chunk_id in enumerate(ids) if chunk_id in self.rows]
+        fresh = [i for i, chunk_id in enumerate(ids) if chunk_id not in self.rows]
+
+        if existing:
+            self.matrix = None
+            matrix = np.memmap(self.vectors_path, dtype=np.float16, mode="r+", shape=(len(self.ids), self.dimensions))
+            for i in existing:
+                row = self.rows[ids[i]]
+                matrix[row] = vectors[i]
+                self.documents[row] = documents[i]
+                self.metadatas[row] = metadatas[i]
+                self.owners[row] = metadatas[i].get("customer")
+            matrix.flush()
+            del matrix
+
+        with open(self.vectors_path, "ab") as f:
+            f.write(vectors[fresh].tobytes())
+
+        if existing:
+            # Metadata changed in place; rewrite the sidecar atomically
+            for i in fresh:
+                self._remember({"id": ids[i], "document": documents[i], "metadata": metadatas[i]})
+            self._rewrite_chunks()
+        else:
+            with open(self.chunks_path, "a", encoding="utf-8") as f:
+                for i in fresh:
+                    record = {"id": ids[i], "document": documents[i], "metadata": metadatas[i]}
+                    f.write(json.dumps(record) + "\n")
+                    self._remember(record)
+
+        self._open_matrix()
+        self._signature = self._file_signature()
+
+    def delete(self, ids):
+        rows = [self.rows.pop(chunk_id) for chunk_id in ids if chunk_id in self.rows]
+        if not rows:
+            return
+        for row in rows:
+            self.documents[row] = ""
+            self.metadatas[row] = {"deleted": True}
+            self.owners[row] = None
+            self.deleted.add(row)
+        self._hidden.clear()
+        self._rewrite_chunks()
+        self._signature = self._file_signature()
+
+    def _rewrite_chunks(self):
+        tmp_path = self.chunks_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for record in zip(self.ids, self.documents, self.metadatas):
+                f.write(json.dumps(dict(zip(("id", "document", "metadata"), record))) + "\n")
+        os.replace(tmp_path, self.chunks_path)
+
+
+class _PageMarks:
+    """
+    The local backends' page marks: one JSON file per tenant mapping each
+    fully stored page_hash to the chunk ids it needs.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def load(self) -> dict[str, list[str]]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def update(self, pages: dict[str, list[str]], remove=()):
+        marks = self.load()
+        marks.update(pages)
+        for page_hash in remove:
+            marks.pop(page_hash, None)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(marks, f)
+        os.replace(tmp_path, self.path)
+
+
+# -----------------------
+#   pgvector
+# -----------------------
+PGVECTOR_SCHEMA_LOCK = 7_340_004  # pg_advisory_xact_lock key for creating rag_chunks and its partitions
+
+
+def vector_literal(vector) -> str:
+    # pgvector's text input format, so no client-side adapter is needed
+    return "[" + ",".join(map(str, np.asarray(vector, dtype=np.float32).tolist())) + "]"
+
+
+def pg_partition_name(customer: str) -> str:
+    # tenant_key() alone maps "+1555..." and "1555..." to the same name;
+    # the hash of the exact string keeps their partitions apart
+    return f"rag_chunks_{tenant_key(customer)[len('tenant_'):][:32]}_{customer_digest(customer)}"
+
+
+class PgVectorStore(VectorStore):
+    """
+    Chunks and embeddings in the rag_chunks table of the app's Postgres,
+    list-partitioned by customer with an HNSW (cosine) index on every
+    partition, so each query searches one tenant's graph only. Served by
+    the pools in database.initdb: queries by the reader pool (routed to the
+    writer for a customer ingested moments ago), ingest by the writer.
+
+    The a-prefixed methods are the native async API. The VectorStore
+    methods are blocking wrappers for RagIngest and RagRetriever, which
+    run in worker threads; they hand the work to the pools' event loop.
+    In a process that has no pools yet (scripts, benchmarks) the pools
+    are started on a background loop of their own.
+
+    The table is created on first use rather than by a migration, because
+    it needs the vector extension, which only deployments using this
+    backend have installed.
+    """
+
+    max_batch_size = 1000
+
+    def __init__(self, config: dict):
+        vectorstore = config["vectorstore"]
+        self.dimensions = int(vectorstore.get("pgvector_dimensions", 384))
+        self.hnsw_m = int(vectorstore.get("pgvector_hnsw_m", 16))
+        self.ef_construction = int(vectorstore.get("pgvector_ef_construction", 64))
+        self.ef_search = int(vectorstore.get("pgvector_ef_search", 40))
+        self._schema_ready = False
+        self._table_seen = False
+        self._partitions = set()
+
+    # -- plumbing --
+    def _run(self, coro):
+        from database import initdb
+
+        loop = initdb.get_pool_loop()
+        if loop is None:
+            loop = _background_pool_loop()
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            coro.close()
+            raise RuntimeError("PgVectorStore's blocking methods can't run on the pool's event loop; await the a-prefixed ones")
+        return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+    async def _ensure_schema(self, conn):
+        if self._schema_ready:
+            return
+        async with conn.transaction():
+            await conn.execute("SELECT pg_advisory_xact_lock(%s)", (PGVECTOR_SCHEMA_LOCK,))
+            await conn.execute("CREATE EXTENSION IF NOT EXISTS vector")
+            await conn.execute(sql.SQL("""
+                CREATE TABLE IF NOT EXISTS rag_chunks (
+                    customer TEXT NOT NULL,
+                    id TEXT NOT NULL,
+                    page_hash TEXT,
+                    document TEXT NOT NULL,
+                    metadata JSONB NOT NULL DEFAULT '{{}}'::jsonb,
+                    embedding vector({}) NOT NULL,
+                    PRIMARY KEY (customer, id)
+                ) PARTITION BY LIST (customer)
+            """).format(sql.Literal(self.dimensions)))
+            await conn.execute("CREATE INDEX IF NOT EXISTS rag_chunks_page_hash_idx ON rag_chunks (customer, page_hash)")
+            await conn.execute(sql.SQL("""
+                CREATE INDEX IF NOT EXISTS rag_chunks_embedding_idx ON rag_chunks
+                USING hnsw (embedding vector_cosine_ops) WITH (m = {}, ef_construction = {})
+            """).format(sql.Literal(self.hnsw_m), sql.Literal(self.ef_construction)))
+            # Fully stored pages and the chunks each needs (mark_pages)
+            await conn.execute("""
+                CREATE TABLE IF NOT EXISTS rag_pages (
+                    customer TEXT NOT NULL,
+                    page_hash TEXT NOT NULL,
+                    chunk_ids TEXT[] NOT NULL,
+                    PRIMARY KEY (customer, page_hash)
+                )
+            """)
+            # BM25 postings (rag.lexical) next to the chunks they index
+            await conn.execute("""
+                CREATE TABLE IF NOT EXISTS rag_lexical (
+                    customer TEXT PRIMARY KEY,
+                    postings BYTEA NOT NULL,
+                    updated_at TIMESTAMPTZ NOT NULL DEFAULT clock_timestamp()
+                )
+            """)
+        self._schema_ready = self._table_seen = True
+
+    async def _ensure_partition(self, conn, customer: str):
+        if customer in self._partitions:
+            return
+        async with conn.transaction():
+            await conn.execute("SELECT pg_advisory_xact_lock(%s, hashtext(%s))", (PGVECTOR_SCHEMA_LOCK, customer))
+            await conn.execute(
+                sql.SQL("CREATE TABLE IF NOT EXISTS {} PARTITION OF rag_chunks FOR VALUES IN ({})")
+                .format(sql.Identifier(pg_partition_name(customer)), sql.Literal(customer))
+            )
+        self._partitions.add(customer)
+
+    @asynccontextmanager
+    async def _writer(self):
+        from database.create_data import get_db_conn
+
+        async with get_db_conn() as conn:
+            await self._ensure_schema(conn)
+            yield conn
+
+    @asynccontextmanager
+    async def _reader(self, customer: str):
+        from database.retrieve_data import get_db_conn
+
+        async with get_db_conn(customer) as conn:
+            if not self._table_seen:
+                # Nothing has been ingested anywhere yet
+                cur = await conn.execute("SELECT to_regclass('rag_chunks')")
+                (exists,) = await cur.fetchone()
+                await conn.commit()
+                if exists is None:
+                    yield None
+                    return
+                self._table_seen = True
+            yield conn
+
+    # -- async API --
+    async def aupsert(self, customer, ids, documents, embeddings, metadatas):
+        from database.initdb import note_write
+
+        rows = [
+            (customer, chunk_id, metadata.get("page_hash"), document, json.dumps(metadata), vector_literal(vector))
+            for chunk_id, document, vector, metadata in zip(ids, documents, embeddings, metadatas)
+        ]
+        async with self._writer() as conn:
+            await self._ensure_partition(conn, customer)
+            async with conn.cursor() as cur:
+                await cur.executemany(
+                    """
+                    INSERT INTO rag_chunks (customer, id, page_hash, document, metadata, embedding)
+                    VALUES (%s, %s, %s, %s, %s::jsonb, %s::vector)
+                    ON CONFLICT (customer, id) DO UPDATE SET
+                        page_hash = EXCLUDED.page_hash,
+                        document = EXCLUDED.document,
+                        metadata = EXCLUDED.metadata,
+                        embedding = EXCLUDED.embedding
+                    """,
+                    rows,
+                )
+            await conn.commit()
+        # The replica may not have these rows yet
+        note_write(customer)
+
+    async def aexisting_ids(self, customer, ids):
+        # Ingest bookkeeping reads the writer: the replica may lag the batch just written
+        async with self._writer() as conn:
+            cur = await conn.execute(
+                "SELECT id FROM rag_chunks WHERE customer = %s AND id = ANY(%s)", (customer, list(ids)),
+            )
+            found = {chunk_id for (chunk_id,) in await cur.fetchall()}
+            await conn.commit()
+        return found
+
+    async def astored_page_hashes(self, customer, page_hashes):
+        async with self._writer() as conn:
+            cur = await conn.execute(
+                "SELECT page_hash FROM rag_pages WHERE customer = %s AND page_hash = ANY(%s)",
+                (customer, list(page_hashes)),
+            )
+            found = {page_hash for (page_hash,) in await cur.fetchall()}
+            await conn.commit()
+        return found
+
+    async def amark_pages(self, customer, pages):
+        async with self._writer() as conn:
+            async with conn.cursor() as cur:
+                await cur.executemany(
+                    """
+                    INSERT INTO rag_pages (customer, page_hash, chunk_ids) VALUES (%s, %s, %s)
+                    ON CONFLICT (customer, page_hash) DO UPDATE SET chunk_ids = EXCLUDED.chunk_ids
+                    """,
+                    [(customer, page_hash, list(chunk_ids)) for page_hash, chunk_ids in pages.items()],
+                )
+            await conn.commit()
+
+    async def apage_chunk_ids(self, customer):
+        async with self._writer() as conn:
+            cur = await conn.execute("SELECT page_hash, chunk_ids FROM rag_pages WHERE customer = %s", (customer,))
+            pages = dict(await cur.fetchall())
+            await conn.commit()
+        return pages
+
+    async def adelete(self, customer, ids, page_hashes):
+        from database.initdb import note_write
+
+        async with self._writer() as conn:
+            await conn.execute("DELETE FROM rag_chunks WHERE customer = %s AND id = ANY(%s)", (customer, list(ids)))
+            await conn.execute(
+                "DELETE FROM rag_pages WHERE customer = %s AND page_hash = ANY(%s)", (customer, list(page_hashes)),
+            )
+            await conn.commit()
+        note_write(customer)
+
+    async def aquery(self, customer, embedding, n_results):
+        if n_results <= 0:
+            return []
+        async with self._reader(customer) as conn:
+            if conn is None:
+                return []
+            async with conn.pipeline():
+                await conn.execute("SELECT set_config('hnsw.ef_search', %s, true)", (str(max(self.ef_search, n_results)),))
+                cur = await conn.execute(
+                    """
+                    SELECT id, document, metadata, embedding <=> %(q)s::vector AS distance
+                    FROM rag_chunks
+                    WHERE customer = %(customer)s
+                    ORDER BY embedding <=> %(q)s::vector
+                    LIMIT %(k)s
+                    """,
+                    {"q": vector_literal(embedding), "customer": customer, "k": n_results},
+                )
+            rows = await cur.fetchall()
+            await conn.commit()
+        # Cosine distance d between unit vectors is half their squared L2 distance (Chroma's "l2")
+        return [
+            {"id": chunk_id, "document": document, "metadata": metadata, "distance": 2.0 * float(distance)}
+            for chunk_id, document, metadata, distance in rows
+        ]
+
+    async def aget(self, customer, ids):
+        if not ids:
+            return []
+        async with self._reader(customer) as conn:
+            if conn is None:
+                return []
+            cur = await conn.execute(
+                "SELECT id, document, metadata FROM rag_chunks WHERE customer = %s AND id = ANY(%s)",
+                (customer, list(ids)),
+            )
+            rows = await cur.fetchall()
+            await conn.commit()
+        by_id = {chunk_id: {"id": chunk_id, "document": doc, "metadata": metadata} for chunk_id, doc, metadata in rows}
+        return [by_id[chunk_id] for chunk_id in ids if chunk_id in by_id]
+
+    async def adocuments_page(self, customer, after: str | None, limit: int) -> list[tuple[str, str]]:
+        async with self._reader(customer) as conn:
+            if conn is None:
+                return []
+            cur = await conn.execute(
+                """
+                SELECT id, document FROM rag_chunks
+                WHERE customer = %s AND (%s::text IS NULL OR id > %s)
+                ORDER BY id
+                LIMIT %s
+                """,
+                (customer, after, after, limit),
+            )
+            rows = await cur.fetchall()
+            await conn.commit()
+        return rows
+
+    async def acount(self, customer):
+        async with self._reader(customer) as conn:
+            if conn is None:
+                return 0
+            cur = await conn.execute("SELECT count(*) FROM rag_chunks WHERE customer = %s", (customer,))
+            (count,) = await cur.fetchone()
+            await conn.commit()
+        return count
+
+    async def asave_lexical(self, customer: str, postings: bytes):
+        from database.initdb import note_write
+
+        async with self._writer() as conn:
+            await conn.execute(
+                """
+                INSERT INTO rag_lexical (customer, postings) VALUES (%s, %s)
+                ON CONFLICT (customer) DO UPDATE SET postings = EXCLUDED.postings, updated_at = clock_timestamp()
+                """,
+                (customer, postings),
+            )
+            await conn.commit()
+        note_write(customer)
+
+    async def aload_lexical(self, customer: str, known_version=None) -> tuple:
+        """
+        (version, postings) of the customer's BM25 index; postings is None
+        when the stored version is known_version, both are None when
+        there is no index.
+        """
+        async with self._reader(customer) as conn:
+            if conn is None:
+                return None, None
+            try:
+                cur = await conn.execute(
+                    """
+                    SELECT updated_at, CASE WHEN updated_at IS DISTINCT FROM %s::timestamptz THEN postings END
+                    FROM rag_lexical WHERE customer = %s
+                    """,
+                    (known_version, customer),
+                )
+            except psycopg.errors.UndefinedTable:
+                # rag_chunks predates rag_lexical; the next ingest creates it
+                await conn.rollback()
+                return None, None
+            row = await cur.fetchone()
+            await conn.commit()
+        return tuple(row) if row else (None, None)
+
+    # -- VectorStore --
+    def upsert(self, customer, ids, documents, embeddings, metadatas):
+        self._run(self.aupsert(customer, ids, documents, embeddings, metadatas))
+
+    def existing_ids(self, customer, ids):
+        return self._run(self.aexisting_ids(customer, ids))
+
+    def stored_page_hashes(self, customer, page_hashes):
+        return self._run(self.astored_page_hashes(customer, page_hashes))
+
+    def mark_pages(self, customer, pages):
+        self._run(self.amark_pages(customer, pages))
+
+    def page_chunk_ids(self, customer):
+        return self._run(self.apage_chunk_ids(customer))
+
+    def delete(self, customer, ids, page_hashes):
+        self._run(self.adelete(customer, ids, page_hashes))
+
+    def query(self, customer, embedding, n_results):
+        return self._run(self.aquery(customer, embedding, n_results))
+
+    def get(self, customer, ids):
+        return self._run(self.aget(customer, ids))
+
+    def iter_documents(self, customer, batch_size: int = 1000):
+        after = None
+        while True:
+            page = self._run(self.adocuments_page(customer, after, batch_size))
+            if not page:
+                return
+            yield from page
+            after = page[-1][0]
+
+    def count(self, customer):
+        return self._run(self.acount(customer))
+
+    def save_lexical(self, customer, postings):
+        self._run(self.asave_lexical(customer, postings))
+
+    def load_lexical(self, customer, known_version=None):
+        return self._run(self.aload_lexical(customer, known_version))
+
+
+_background_loop: asyncio.AbstractEventLoop | None = None
+_background_lock = threading.Lock()
+
+
+def _background_pool_loop() -> asyncio.AbstractEventLoop:
+    """
+    An event loop on a daemon thread, with the database pools started on
+    it, for blocking callers in a process that never initialised them.
+    """
+    global _background_loop
+    with _background_lock:
+        if _background_loop is None:
+            from database.initdb import close_pool, init_pool
+
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="pgvector-pool", daemon=True).start()
+            asyncio.run_coroutine_threadsafe(init_pool(), loop).result()
+            atexit.register(lambda: asyncio.run_coroutine_threadsafe(close_pool(), loop).result(10))
+            _background_loop = loop
+    return _background_loop
@@ -14,11 +14,43 @@ def tag_visible(element):
         return False
     return True
 
+# Elements whose text starts a new line in the saved page
+BLOCK_TAGS = {'p', 'div', 'li', 'tr', 'td', 'th', 'dt', 'dd', 'section', 'article', 'main', 'aside',
+              'table', 'ul', 'ol', 'dl', 'blockquote', 'pre', 'figcaption', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6'}
+HEADING_LEVELS = {'h1': 1, 'h2': 2, 'h3': 3, 'h4': 4, 'h5': 5, 'h6': 6}
+
+def block_of(element):
+    for parent in element.parents:
+        if parent.name in BLOCK_TAGS:
+            return parent
+    return None
+
 def text_from_html(body):
+    """
+    Visible text, one line per block element (paragraph, list item,
+    listing card). Headings are marked '#' to '######' so the html
+    chunking strategy can split the page into sections.
+    """
     soup = BeautifulSoup(body, 'html.parser')
     texts = soup.find_all(text=True)
     visible_texts = filter(tag_visible, texts)
-    return u" ".join(t.strip() for t in visible_texts if t.strip())
+
+    lines, words, block = [], [], None
+    for t in visible_texts:
+        text = t.strip()
+        if not text:
+            continue
+        parent = block_of(t)
+        if parent is not block and words:
+            lines.append(" ".join(words))
+            words = []
+        if not words and parent is not None and parent.name in HEADING_LEVELS:
+            words.append("#" * HEADING_LEVELS[parent.name])
+        block = parent
+        words.append(text)
+    if words:
+        lines.append(" ".join(words))
+    return u"\n".join(lines)
 
 def is_valid_url(url, base_netloc):
     parsed = urlparse(url)
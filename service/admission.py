@@ -0,0 +1,170 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+
+class Overloaded(Exception):
+    """A tenant's message waited longer than the queue budget (or its queue is full)."""
+
+
+class _Waiter:
+    __slots__ = ("tenant", "tag", "future", "enqueued_at")
+
+    def __init__(self, tenant: str, tag: float, future: asyncio.Future):
+        self.tenant = tenant
+        self.tag = tag
+        self.future = future
+        self.enqueued_at = time.monotonic()
+
+
+class _Tenant:
+    def __init__(self, weight: float):
+        self.weight = weight
+        self.queue = deque()
+        self.running = 0
+        self.last_tag = 0.0
+        self.admitted = 0
+        self.shed = 0
+        self.waits = deque(maxlen=500)
+
+
+# -----------------------
+#   Controller
+# -----------------------
+class AdmissionController:
+    """
+    Admission in front of agent runs, keyed by business number.
+
+    At most max_concurrency runs overall and tenant_concurrency per tenant.
+    Waiting messages are served by weighted fair queueing: each message gets
+    a virtual finish tag of max(virtual time, tenant's last tag) + 1/weight,
+    and a free slot goes to the lowest tag among tenants under their cap.
+    A tenant flooding the queue only pushes its own tags further out.
+    Messages that would wait longer than queue_budget are shed.
+    A tenant's state is dropped once it has nothing queued or running, so
+    the map holds active tenants only (weights come from config).
+    """
+
+    def __init__(self, max_concurrency: int = 16, tenant_concurrency: int = 4, queue_budget: float = 8.0,
+                 max_queue: int = 100, default_weight: float = 1.0, weights: dict | None = None):
+        self.max_concurrency = max_concurrency
+        self.tenant_concurrency = tenant_concurrency
+        self.queue_budget = queue_budget
+        self.max_queue = max_queue
+        self.default_weight = default_weight
+        self.weights = {str(k): float(v) for k, v in (weights or {}).items()}
+        self.running = 0
+        self.virtual_time = 0.0
+        self.admitted = 0
+        self.shed = 0
+        self._tenants: dict[str, _Tenant] = {}
+
+    @classmethod
+    def from_config(cls, config: dict) -> "AdmissionController":
+        settings = config.get("admission") or {}
+        return cls(
+            max_concurrency=settings.get("max_concurrency", 16),
+            tenant_concurrency=settings.get("tenant_concurrency", 4),
+            queue_budget=settings.get("queue_budget", 8.0),
+            max_queue=settings.get("max_queue", 100),
+            default_weight=settings.get("default_weight", 1.0),
+            weights=settings.get("weights"),
+        )
+
+    def _tenant(self, tenant: str) -> _Tenant:
+        if tenant not in self._tenants:
+            self._tenants[tenant] = _Tenant(self.weights.get(tenant, self.default_weight))
+        return self._tenants[tenant]
+
+    def _forget_if_idle(self, tenant: str, state: _Tenant):
+        # An idle tenant coming back starts from the virtual time, as a new one would
+        if not state.queue and state.running == 0 and self._tenants.get(tenant) is state:
+            del self._tenants[tenant]
+
+    def _dispatch(self):
+        while self.running < self.max_concurrency:
+            eligible = [
+                state for state in self._tenants.values()
+                if state.queue and state.running < self.tenant_concurrency
+            ]
+            if not eligible:
+                return
+            state = min(eligible, key=lambda s: s.queue[0].tag)
+            waiter = state.queue.popleft()
+            self.virtual_time = max(self.virtual_time, waiter.tag - 1.0 / state.weight)
+            state.running += 1
+            self.running += 1
+            waiter.future.set_result(None)
+
+    def _release(self, tenant: str):
+        state = self._tenants[tenant]
+        state.running -= 1
+        self.running -= 1
+        self._forget_if_idle(tenant, state)
+        self._dispatch()
+
+    @asynccontextmanager
+    async def admit(self, tenant: str):
+        """
+        Hold one agent slot for the tenant; raises Overloaded when shed.
+        """
+        state = self._tenant(tenant)
+        if len(state.queue) >= self.max_queue:
+            state.shed += 1
+            self.shed += 1
+            self._forget_if_idle(tenant, state)
+            raise Overloaded(f"{tenant} has {len(state.queue)} messages queued")
+
+        state.last_tag = max(self.virtual_time, state.last_tag) + 1.0 / state.weight
+        waiter = _Waiter(tenant, state.last_tag, asyncio.get_running_loop().create_future())
+        state.queue.append(waiter)
+        self._dispatch()
+
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), self.queue_budget)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Admitted at the same moment; give the slot back
+                self._release(tenant)
+            else:
+                waiter.future.cancel()
+                state.queue.remove(waiter)
+                self._forget_if_idle(tenant, state)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            state.shed += 1
+            self.shed += 1
+            logging.warning(
+                f"🚧 Shedding message for {tenant}: waited {self.queue_budget}s "
+                f"({len(state.queue)} queued, {state.running} running)"
+            )
+            raise Overloaded(f"{tenant} exceeded the {self.queue_budget}s queue budget")
+
+        state.admitted += 1
+        self.admitted += 1
+        state.waits.append(time.monotonic() - waiter.enqueued_at)
+        try:
+            yield
+        finally:
+            self._release(tenant)
+
+    def metrics(self) -> dict:
+        """Totals since start; per-tenant figures cover tenants with messages queued or running."""
+        tenants = {}
+        for tenant, state in self._tenants.items():
+            waits = sorted(state.waits)
+            tenants[tenant] = {
+                "weight": state.weight,
+                "queued": len(state.queue),
+                "running": state.running,
+                "admitted": state.admitted,
+                "shed": state.shed,
+                "wait_p50_s": waits[len(waits) // 2] if waits else 0.0,
+                "wait_p95_s": waits[min(len(waits) - 1, int(len(waits) * 0.95))] if waits else 0.0,
+            }
+        return {
+            "running": self.running, "max_concurrency": self.max_concurrency,
+            "admitted": self.admitted, "shed": self.shed, "tenants": tenants,
+        }
@@ -0,0 +1,456 @@
+import asyncio
+import json
+import logging
+import re
+import time
+from collections import deque
+from contextlib import aclosing
+from datetime import datetime, timedelta, timezone
+import yaml
+from langchain_core.messages import HumanMessage
+from database.create_data import get_db_conn
+from database.initdb import note_write
+from database.retrieve_data import get_db_conn as get_read_conn
+from service.jobs import enqueue_job
+from service.metrics import CAMPAIGN_MESSAGES_TOTAL, timed
+
+CAMPAIGN_JOB = "campaign"
+MAX_SINCE_DAYS = 365  # how far back a campaign may reach for leads
+_campaign_settings = None
+
+with open("prompts/campaign_prompt.txt", "r", encoding="utf-8") as file:
+    CAMPAIGN_PROMPT_TEMPLATE = file.read()
+
+
+def get_campaign_settings() -> dict:
+    global _campaign_settings
+    if _campaign_settings is None:
+        with open("config.yaml", "r") as file:
+            _campaign_settings = yaml.safe_load(file).get("campaigns") or {}
+    return _campaign_settings
+
+
+# -----------------------
+#   Create / cancel / list
+# -----------------------
+async def create_campaign(client: str, brief: str, sentiments: list[str], since_days: int) -> int:
+    """
+    Queue a campaign to the client's leads labelled with one of `sentiments`
+    and created in the last since_days, that haven't been contacted yet.
+    Raises ValueError unless 1 <= since_days <= MAX_SINCE_DAYS.
+    """
+    if not 1 <= since_days <= MAX_SINCE_DAYS:
+        raise ValueError(f"since_days must be between 1 and {MAX_SINCE_DAYS}, got {since_days}")
+    since = datetime.now(timezone.utc) - timedelta(days=since_days)
+    try:
+        async with get_db_conn() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    """
+                    INSERT INTO campaigns (client, brief, sentiments, since)
+                    VALUES (%s, %s, %s, %s)
+                    RETURNING id
+                    """,
+                    (client, brief, sentiments, since),
+                )
+                (campaign_id,) = await cur.fetchone()
+            await conn.commit()
+        await enqueue_job(CAMPAIGN_JOB, {"campaign_id": campaign_id})
+        note_write(client)
+        logging.info(f"📣 Campaign {campaign_id} queued for {client} ({', '.join(sentiments)}, last {since_days} days)")
+        return campaign_id
+    except Exception as e:
+        logging.error(f"❌ Failed to create campaign for {client}: {e}")
+        raise
+
+
+async def cancel_campaign(client: str, campaign_id: int) -> bool:
+    """Stop a queued or running campaign after the batch it is sending."""
+    async with get_db_conn() as conn:
+        cur = await conn.execute(
+            """
+            UPDATE campaigns SET status = 'cancelled', finished_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP
+            WHERE id = %s AND client = %s AND status IN ('queued', 'running')
+            """,
+            (campaign_id, client),
+        )
+        await conn.commit()
+    note_write(client)
+    return cur.rowcount > 0
+
+
+async def fetch_campaigns(client: str, limit: int = 10) -> list[dict]:
+    async with get_read_conn(client) as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(
+                """
+                SELECT id, status, brief, sentiments, selected, accepted, undelivered, failed, fallbacks,
+                       last_error, started_at, finished_at, created_at, updated_at
+                FROM campaigns
+                WHERE client = %s
+                ORDER BY id DESC
+                LIMIT %s
+                """,
+                (client, limit),
+            )
+            rows = await cur.fetchall()
+            columns = [column.name for column in cur.description]
+    return [dict(zip(columns, row)) for row in rows]
+
+
+async def record_undelivered(campaign_id: int, phone: str, source: str, error_code: str | None = None) -> bool:
+    """
+    Twilio's status callback for a campaign message it accepted but then
+    failed to deliver (e.g. 63016, outside the 24-hour window): the lead
+    is no longer contacted and the campaign counts it as undelivered.
+    A repeated callback for the same message counts once, and only the
+    campaign's own client's lead is reopened.
+    """
+    async with get_db_conn() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(
+                """
+                WITH reopened AS (
+                    UPDATE leads SET is_contacted = FALSE
+                    FROM lead_phones, campaigns
+                    WHERE campaigns.id = %(campaign)s
+                      AND leads.client = campaigns.client
+                      AND lead_phones.phone_number = %(phone)s
+                      AND leads.id = lead_phones.lead_id
+                      AND leads.created_at = lead_phones.created_at
+                      AND leads.is_contacted
+                    RETURNING leads.client
+                )
+                UPDATE campaigns
+                SET undelivered = undelivered + 1,
+                    last_error = COALESCE(%(error)s, last_error),
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE id = %(campaign)s AND client IN (SELECT client FROM reopened)
+                RETURNING client
+                """,
+                {"phone": phone, "campaign": campaign_id,
+                 "error": f"Twilio error {error_code} (undelivered)" if error_code else None},
+            )
+            row = await cur.fetchone()
+        await conn.commit()
+    if row is None:
+        return False
+    note_write(row[0])
+    # source comes back in the callback URL; keep the label set closed
+    CAMPAIGN_MESSAGES_TOTAL.labels(
+        outcome="undelivered", source="fallback" if source == "fallback" else "personalised",
+    ).inc()
+    return True
+
+
+# -----------------------
+#   Personalisation
+# -----------------------
+def display_name(lead: dict) -> str | None:
+    # "User" is what the webhook stores when WhatsApp sends no profile name
+    return lead["username"] if lead["username"] not in (None, "", "User") else None
+
+
+def parse_messages(raw: str, count: int, max_chars: int) -> list[str | None]:
+    """
+    The model's JSON array as one message (or None) per lead index.
+    Tolerates code fences and text around the array.
+    """
+    messages = [None] * count
+    match = re.search(r"\[.*\]", raw, re.DOTALL)
+    if not match:
+        return messages
+    for item in json.loads(match.group(0)):
+        try:
+            i, text = int(item["i"]), str(item["message"]).strip()
+        except (KeyError, TypeError, ValueError):
+            continue
+        if 0 <= i < count and text:
+            messages[i] = text[:max_chars]
+    return messages
+
+
+async def personalise(llm, brief: str, leads: list[dict], max_chars: int = 600) -> list[str | None]:
+    """
+    One LLM call writes the messages for a whole batch of leads. Leads the
+    model skipped, or every lead when the call fails, get None.
+    """
+    payload = [
+        {
+            "i": i,
+            "name": display_name(lead) or "",
+            "sentiment": lead["sentiment_label"],
+            "summary": (lead["summary"] or "")[:400],
+        }
+        for i, lead in enumerate(leads)
+    ]
+    prompt = CAMPAIGN_PROMPT_TEMPLATE.format(brief=brief, leads=json.dumps(payload, ensure_ascii=False))
+    try:
+        with timed("campaign_personalise"):
+            result = await llm.ainvoke([HumanMessage(content=prompt)])
+        return parse_messages(str(getattr(result, "content", result)), len(leads), max_chars)
+    except Exception as e:
+        logging.warning(f"Campaign personalisation failed for {len(leads)} leads, using the fallback message: {e}")
+        return [None] * len(leads)
+
+
+# -----------------------
+#   Runner
+# -----------------------
+class CampaignRunner:
+    """
+    Sends one campaign. Leads are paged from the reader in (created_at, id)
+    order, fetch_size per query and batch_size per batch; each batch
+    is personalised by one LLM call, with llm_concurrency batches written
+    ahead of the one being sent. Sends go through AsyncTwilioClient's
+    per-sender token bucket from the business's own number. After each
+    batch the leads Twilio accepted a message for are marked contacted and
+    the campaign's cursor and counters advance in one transaction, so a
+    retried job resumes after the last finished batch; at most the batch
+    in flight when a worker died is sent twice.
+
+    WhatsApp rejects free-form business messages outside the 24-hour
+    window after the contact's last message, after Twilio has accepted
+    them. With content_sid (an approved template taking {{1}} name and
+    {{2}} message) every lead in the campaign is eligible. Without it only
+    leads who wrote in within session_window_hours are selected. Messages
+    that fail after acceptance reach record_undelivered through
+    status_callback_url when one is configured.
+    """
+
+    def __init__(self, campaign: dict, llm, twilio, settings: dict | None = None):
+        settings = get_campaign_settings() if settings is None else settings
+        self.campaign = campaign
+        self.llm = llm
+        self.twilio = twilio
+        self.batch_size = settings.get("batch_size", 20)
+        self.llm_concurrency = settings.get("llm_concurrency", 2)
+        self.fetch_size = settings.get("fetch_size", 500)
+        self.max_chars = settings.get("max_message_chars", 600)
+        self.fallback_message = settings.get(
+            "fallback_message", "Hi {name}, thanks again for getting in touch. Is there anything we can help you with?"
+        )
+        self.content_sid = settings.get("content_sid") or None
+        self.window = timedelta(hours=settings.get("session_window_hours", 23))
+        self.status_callback_url = settings.get("status_callback_url") or None
+        self.stats = {"selected": 0, "accepted": 0, "failed": 0, "fallbacks": 0}
+
+    async def _page(self, after: tuple | None) -> list[dict]:
+        """The next fetch_size matching leads after the (created_at, id) keyset."""
+        campaign = self.campaign
+        keyset = "AND (created_at, id) > (%(after_at)s, %(after_id)s)" if after else ""
+        # Free-form messages only reach contacts still inside WhatsApp's 24-hour window
+        window = "" if self.content_sid else """
+                          AND EXISTS (SELECT 1 FROM lead_phones
+                                      WHERE lead_phones.phone_number = leads.phone_number
+                                        AND lead_phones.last_inbound_at >= %(inbound_after)s)"""
+        async with get_read_conn(campaign["client"]) as conn:
+            async with conn.cursor() as cur:
+                with timed("campaign_select"):
+                    await cur.execute(
+                        f"""
+                        SELECT id, created_at, phone_number, username, summary, sentiment_label
+                        FROM leads
+                        WHERE client = %(client)s
+                          AND NOT is_contacted
+                          AND sentiment_label = ANY(%(sentiments)s)
+                          AND created_at >= %(since)s
+                          {keyset}{window}
+                        ORDER BY created_at, id
+                        LIMIT %(limit)s
+                        """,
+                        {
+                            "client": campaign["client"],
+                            "sentiments": campaign["sentiments"],
+                            "since": campaign["since"],
+                            "after_at": after[0] if after else None,
+                            "after_id": after[1] if after else None,
+                            "inbound_after": datetime.now(timezone.utc) - self.window,
+                            "limit": self.fetch_size,
+                        },
+                    )
+                    rows = await cur.fetchall()
+                columns = [column.name for column in cur.description]
+        return [dict(zip(columns, row)) for row in rows]
+
+    async def _batches(self):
+        # One short query per page rather than a cursor held open for the
+        # whole (rate-limited) run, which a standby would cancel and which
+        # would hold back vacuum on the primary
+        campaign = self.campaign
+        after = (campaign["cursor_created_at"], campaign["cursor_id"]) if campaign["cursor_id"] else None
+        batch = []
+        while True:
+            page = await self._page(after)
+            for lead in page:
+                batch.append(lead)
+                if len(batch) == self.batch_size:
+                    yield batch
+                    batch = []
+            if len(page) < self.fetch_size:
+                break
+            after = (page[-1]["created_at"], page[-1]["id"])
+        if batch:
+            yield batch
+
+    def _outgoing(self, lead: dict, message: str | None) -> tuple:
+        """(to, body, fields) for send_bulk."""
+        name = display_name(lead) or "there"
+        body = message or self.fallback_message.format(name=name)
+        fields = {}
+        if self.content_sid:
+            fields["ContentSid"] = self.content_sid
+            fields["ContentVariables"] = json.dumps({"1": name, "2": body}, ensure_ascii=False)
+        if self.status_callback_url:
+            source = "fallback" if message is None else "personalised"
+            fields["StatusCallback"] = f"{self.status_callback_url}?campaign={self.campaign['id']}&source={source}"
+        return f"whatsapp:{lead['phone_number']}", body, fields
+
+    async def _deliver(self, batch: list[dict], messages: list[str | None]) -> bool:
+        """
+        Send one batch and checkpoint it; False once the campaign was
+        cancelled. "Accepted" means Twilio returned a SID, not that the
+        message was delivered.
+        """
+        client = self.campaign["client"]
+        outgoing = [self._outgoing(lead, message) for lead, message in zip(batch, messages)]
+        with timed("campaign_send"):
+            outcomes = await self.twilio.send_bulk(outgoing, from_=f"whatsapp:{client}")
+
+        accepted = [lead for lead, outcome in zip(batch, outcomes) if outcome["sid"]]
+        errors = [outcome["error"] for outcome in outcomes if outcome["error"]]
+        fallbacks = sum(message is None for message in messages)
+        with timed("campaign_checkpoint"):
+            async with get_db_conn() as conn:
+                async with conn.cursor() as cur:
+                    if accepted:
+                        await cur.execute(
+                            """
+                            UPDATE leads SET is_contacted = TRUE
+                            WHERE (id, created_at) IN (SELECT * FROM unnest(%s::int[], %s::timestamptz[]))
+                            """,
+                            ([lead["id"] for lead in accepted], [lead["created_at"] for lead in accepted]),
+                        )
+                    await cur.execute(
+                        """
+                        UPDATE campaigns
+                        SET cursor_created_at = %s, cursor_id = %s,
+                            selected = selected + %s, accepted = accepted + %s, failed = failed + %s,
+                            fallbacks = fallbacks + %s,
+                            last_error = COALESCE(%s, last_error),
+                            updated_at = CURRENT_TIMESTAMP
+                        WHERE id = %s
+                        RETURNING status
+                        """,
+                        (batch[-1]["created_at"], batch[-1]["id"], len(batch), len(accepted), len(errors),
+                         fallbacks, errors[-1] if errors else None, self.campaign["id"]),
+                    )
+                    (status,) = await cur.fetchone()
+                await conn.commit()
+        note_write(client)
+
+        for message, outcome in zip(messages, outcomes):
+            CAMPAIGN_MESSAGES_TOTAL.labels(
+                outcome="accepted" if outcome["sid"] else "failed",
+                source="fallback" if message is None else "personalised",
+            ).inc()
+        self.stats["selected"] += len(batch)
+        self.stats["accepted"] += len(accepted)
+        self.stats["failed"] += len(errors)
+        self.stats["fallbacks"] += fallbacks
+        return status != "cancelled"
+
+    async def run(self) -> dict:
+        started = time.perf_counter()
+        brief = self.campaign["brief"]
+        ahead = deque()  # (batch, personalisation task), oldest first
+
+        async def send_oldest() -> bool:
+            batch, task = ahead.popleft()
+            return await self._deliver(batch, await task)
+
+        try:
+            async with aclosing(self._batches()) as batches:
+                async for batch in batches:
+                    task = asyncio.create_task(personalise(self.llm, brief, batch, self.max_chars))
+                    ahead.append((batch, task))
+                    if len(ahead) > self.llm_concurrency and not await send_oldest():
+                        break
+                else:
+                    while ahead:
+                        if not await send_oldest():
+                            break
+        finally:
+            for _, task in ahead:
+                task.cancel()
+
+        elapsed = time.perf_counter() - started
+        self.stats["seconds"] = round(elapsed, 2)
+        logging.info(
+            f"📣 Campaign {self.campaign['id']}: {self.stats['accepted']} accepted, {self.stats['failed']} failed "
+            f"of {self.stats['selected']} in {elapsed:.1f}s ({self.stats['accepted'] / max(elapsed, 1e-9):.1f}/s)"
+        )
+        return self.stats
+
+
+# -----------------------
+#   Job
+# -----------------------
+async def _claim_campaign(campaign_id: int) -> dict | None:
+    async with get_db_conn() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(
+                """
+                UPDATE campaigns
+                SET status = 'running', started_at = COALESCE(started_at, CURRENT_TIMESTAMP),
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE id = %s AND status IN ('queued', 'running')
+                RETURNING id, client, brief, sentiments, since, cursor_created_at, cursor_id
+                """,
+                (campaign_id,),
+            )
+            row = await cur.fetchone()
+            columns = [column.name for column in cur.description]
+        await conn.commit()
+    return dict(zip(columns, row)) if row else None
+
+
+async def _finish_campaign(campaign_id: int, status: str, error: str | None = None):
+    async with get_db_conn() as conn:
+        await conn.execute(
+            """
+            UPDATE campaigns
+            SET status = %s, last_error = COALESCE(%s, last_error),
+                finished_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP
+            WHERE id = %s AND status IN ('queued', 'running')
+            """,
+            (status, error, campaign_id),
+        )
+        await conn.commit()
+
+
+async def campaign_job(payload: dict, job, llm=None, twilio=None):
+    """
+    Job handler for CAMPAIGN_JOB. A retry picks up from the campaign's
+    cursor; a cancelled or finished campaign is left alone. Failing for
+    good is recorded by campaign_failed.
+    """
+    campaign = await _claim_campaign(payload["campaign_id"])
+    if campaign is None:
+        return
+    if llm is None:
+        from agent.react_agent import get_llm_async
+        llm = await get_llm_async()
+    if twilio is None:
+        from client.twilio_client import get_twilio_client
+        twilio = get_twilio_client()
+
+    stats = await CampaignRunner(campaign, llm, twilio).run()
+    await job.progress(**stats)
+    await _finish_campaign(campaign["id"], "done")
+
+
+async def campaign_failed(payload: dict, job, error: str):
+    """Final-failure hook for CAMPAIGN_JOB, also when the worker died mid-campaign."""
+    await _finish_campaign(payload["campaign_id"], "failed", error)
+    logging.error(f"❌ Campaign {payload['campaign_id']} failed: {error}")
@@ -0,0 +1,157 @@
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+
+
+# -----------------------
+#   TTL stores
+# -----------------------
+class MemoryIdempotencyStore:
+    """
+    Completed replies for this process only, expiring after ttl seconds.
+    """
+
+    def __init__(self, ttl: float = 3600, max_entries: int = 10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+
+    async def get(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            self._entries.pop(key, None)
+            return None
+        return value
+
+    async def set(self, key: str, value):
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def claim(self, key: str, ttl: float) -> bool:
+        # In-process duplicates are already coalesced by the deduplicator
+        return True
+
+    async def release(self, key: str):
+        pass
+
+
+class RedisIdempotencyStore:
+    """
+    Shared across app processes: replies under <prefix><sid>, and a
+    <prefix><sid>:lock key (SET NX) while one process is handling the message.
+    """
+
+    def __init__(self, url: str, ttl: float = 3600, prefix: str = "whatsapp:sid:"):
+        import redis.asyncio as redis
+
+        self.redis = redis.from_url(url)
+        self.ttl = int(ttl)
+        self.prefix = prefix
+
+    async def get(self, key: str):
+        raw = await self.redis.get(self.prefix + key)
+        return json.loads(raw) if raw is not None else None
+
+    async def set(self, key: str, value):
+        await self.redis.set(self.prefix + key, json.dumps(value), ex=self.ttl)
+
+    async def claim(self, key: str, ttl: float) -> bool:
+        return bool(await self.redis.set(self.prefix + key + ":lock", "1", nx=True, ex=max(1, int(ttl))))
+
+    async def release(self, key: str):
+        await self.redis.delete(self.prefix + key + ":lock")
+
+
+def create_idempotency_store(config: dict):
+    settings = config.get("idempotency") or {}
+    ttl = settings.get("ttl_seconds", 3600)
+    if settings.get("backend", "memory") == "redis":
+        return RedisIdempotencyStore(settings.get("redis_url", "redis://localhost:6379/0"), ttl)
+    return MemoryIdempotencyStore(ttl, settings.get("max_entries", 10000))
+
+
+# -----------------------
+#   Deduplicator
+# -----------------------
+class WebhookDeduplicator:
+    """
+    Runs the handler for a Twilio MessageSid at most once while its reply
+    is cached. A duplicate that arrives while the first delivery is still
+    being handled waits for (and gets) the same reply; one that arrives
+    afterwards gets the cached reply. Failures are not cached, so Twilio's
+    next retry runs the handler again.
+    """
+
+    def __init__(self, store, inflight_wait: float = 25.0, poll_interval: float = 0.2):
+        self.store = store
+        self.inflight_wait = inflight_wait
+        self.poll_interval = poll_interval
+        self._inflight: dict[str, asyncio.Future] = {}
+        self.stats = {"handled": 0, "coalesced": 0, "cached": 0}
+
+    async def run(self, message_sid: str | None, handler):
+        if not message_sid:
+            return await handler()
+
+        # Duplicate of a delivery this process is still handling
+        inflight = self._inflight.get(message_sid)
+        if inflight is not None:
+            self.stats["coalesced"] += 1
+            logging.info(f"♻️ Duplicate delivery {message_sid} joined the in-flight run")
+            return await asyncio.shield(inflight)
+
+        # Registered before the first await, so concurrent duplicates find it
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[message_sid] = future
+        claimed = False
+        try:
+            cached = await self.store.get(message_sid)
+            if cached is not None:
+                self.stats["cached"] += 1
+                logging.info(f"♻️ Duplicate delivery {message_sid} served from cache")
+                future.set_result(cached)
+                return cached
+
+            # Another process may be handling it (shared store only)
+            claimed = await self.store.claim(message_sid, self.inflight_wait)
+            if not claimed:
+                reply = await self._wait_for_reply(message_sid)
+                if reply is not None:
+                    self.stats["coalesced"] += 1
+                    future.set_result(reply)
+                    return reply
+                logging.warning(f"Gave up waiting for {message_sid} in another process; handling it here")
+
+            reply = await handler()
+            await self.store.set(message_sid, reply)
+            self.stats["handled"] += 1
+            future.set_result(reply)
+            return reply
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Nobody else may be awaiting it; don't log "exception never retrieved"
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(message_sid, None)
+            if claimed:
+                await self.store.release(message_sid)
+
+    async def _wait_for_reply(self, message_sid: str):
+        deadline = time.monotonic() + self.inflight_wait
+        while time.monotonic() < deadline:
+            await asyncio.sleep(self.poll_interval)
+            reply = await self.store.get(message_sid)
+            if reply is not None:
+                return reply
+        return None
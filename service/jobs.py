@@ -0,0 +1,282 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import socket
+import uuid
+from datetime import timedelta
+import psycopg
+import yaml
+from database.create_data import get_db_conn
+from database.initdb import DB_URL
+from service.metrics import JOBS_TOTAL
+
+CHANNEL = "jobs"
+ENQUEUE_LOCK = 7_340_003  # pg_advisory_xact_lock class for unique enqueues
+_job_settings = None
+
+
+def get_job_settings() -> dict:
+    global _job_settings
+    if _job_settings is None:
+        with open("config.yaml", "r") as file:
+            _job_settings = yaml.safe_load(file).get("jobs") or {}
+    return _job_settings
+
+
+# -----------------------
+#   Enqueue
+# -----------------------
+async def enqueue_job(kind: str, payload: dict, max_attempts: int | None = None, delay: float = 0,
+                      unique: bool = False) -> int | None:
+    """
+    Insert a job and wake listening workers (NOTIFY is delivered on commit).
+    The job runs `delay` seconds from now at the earliest. With unique=True
+    nothing is queued (and None returned) while a job of this kind is
+    already waiting, which is how recurring jobs schedule their next run.
+    """
+    if max_attempts is None:
+        max_attempts = get_job_settings().get("max_attempts", 5)
+    try:
+        async with get_db_conn() as conn:
+            async with conn.cursor() as cur:
+                if unique:
+                    await cur.execute("SELECT pg_advisory_xact_lock(%s, hashtext(%s))", (ENQUEUE_LOCK, kind))
+                    await cur.execute("SELECT 1 FROM jobs WHERE kind = %s AND status = 'queued' LIMIT 1", (kind,))
+                    if await cur.fetchone():
+                        await conn.rollback()
+                        return None
+                await cur.execute(
+                    """
+                    INSERT INTO jobs (kind, payload, max_attempts, run_at)
+                    VALUES (%s, %s::jsonb, %s, CURRENT_TIMESTAMP + make_interval(secs => %s::float))
+                    RETURNING id
+                    """,
+                    (kind, json.dumps(payload), max_attempts, delay),
+                )
+                (job_id,) = await cur.fetchone()
+                await cur.execute("SELECT pg_notify(%s, %s)", (CHANNEL, kind))
+            await conn.commit()
+        logging.info(f"📥 Queued {kind} job {job_id}")
+        return job_id
+    except Exception as e:
+        logging.error(f"❌ Failed to queue {kind} job: {e}")
+        raise
+
+
+# -----------------------
+#   Worker
+# -----------------------
+class Job:
+    """A claimed job, passed to its handler with the payload."""
+
+    def __init__(self, worker: "JobWorker", job_id: int, kind: str, payload: dict, attempts: int, max_attempts: int):
+        self.worker = worker
+        self.id = job_id
+        self.kind = kind
+        self.payload = payload
+        self.attempts = attempts
+        self.max_attempts = max_attempts
+
+    async def progress(self, **fields):
+        """Merge fields into the job's progress and extend its lease."""
+        async with get_db_conn() as conn:
+            await conn.execute(
+                """
+                UPDATE jobs
+                SET progress = progress || %s::jsonb,
+                    locked_until = CURRENT_TIMESTAMP + %s,
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE id = %s AND locked_by = %s
+                """,
+                (json.dumps(fields, default=str), self.worker.lease, self.id, self.worker.worker_id),
+            )
+            await conn.commit()
+
+
+class JobWorker:
+    """
+    Runs jobs from the jobs table. Jobs are claimed with SELECT ... FOR
+    UPDATE SKIP LOCKED, so any number of workers on any hosts can share
+    the table; NOTIFY wakes them when a job is queued and a slow poll
+    covers missed notifications and delayed retries. A running job holds
+    a lease that its heartbeat keeps extending; if the worker dies, the
+    job is claimed again once the lease runs out. Failures are retried
+    with jittered exponential backoff up to the job's max_attempts.
+
+    failure_handlers maps a kind to an async (payload, job, error) hook,
+    called once when a job of that kind fails for good, whether its
+    handler raised or its worker died on the final attempt, so the
+    handler's own records don't stay "running".
+    """
+
+    def __init__(self, handlers: dict, settings: dict | None = None, worker_id: str | None = None,
+                 failure_handlers: dict | None = None):
+        settings = get_job_settings() if settings is None else settings
+        self.handlers = handlers
+        self.failure_handlers = failure_handlers or {}
+        self.concurrency = settings.get("concurrency", 1)
+        self.poll_seconds = settings.get("poll_seconds", 5)
+        self.lease = timedelta(seconds=settings.get("lease_seconds", 300))
+        self.backoff_base = settings.get("backoff_base", 30)
+        self.backoff_max = settings.get("backoff_max", 1800)
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.stats = {"done": 0, "retried": 0, "failed": 0}
+        self._wake = asyncio.Event()
+        self._stopping = asyncio.Event()
+
+    def stop(self):
+        """Finish the running jobs, claim no more."""
+        self._stopping.set()
+        self._wake.set()
+
+    def _backoff(self, attempts: int) -> float:
+        return min(self.backoff_max, self.backoff_base * 2 ** (attempts - 1)) * random.uniform(0.5, 1.0)
+
+    async def claim(self) -> Job | None:
+        async with get_db_conn() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    """
+                    UPDATE jobs
+                    SET status = 'running',
+                        attempts = attempts + 1,
+                        locked_by = %(worker)s,
+                        locked_until = CURRENT_TIMESTAMP + %(lease)s,
+                        updated_at = CURRENT_TIMESTAMP
+                    WHERE id = (
+                        SELECT id FROM jobs
+                        WHERE kind = ANY(%(kinds)s)
+                          AND ((status = 'queued' AND run_at <= CURRENT_TIMESTAMP)
+                               OR (status = 'running' AND locked_until < CURRENT_TIMESTAMP))
+                        ORDER BY run_at, id
+                        LIMIT 1
+                        FOR UPDATE SKIP LOCKED
+                    )
+                    RETURNING id, kind, payload, attempts, max_attempts
+                    """,
+                    {"worker": self.worker_id, "lease": self.lease, "kinds": list(self.handlers)},
+                )
+                row = await cur.fetchone()
+            await conn.commit()
+        return Job(self, *row) if row else None
+
+    async def _finish(self, job: Job, status: str, error: str | None = None, retry_in: float | None = None):
+        async with get_db_conn() as conn:
+            await conn.execute(
+                """
+                UPDATE jobs
+                SET status = %s,
+                    last_error = COALESCE(%s, last_error),
+                    run_at = CASE WHEN %s::float IS NULL THEN run_at
+                                  ELSE CURRENT_TIMESTAMP + make_interval(secs => %s::float) END,
+                    locked_by = NULL,
+                    locked_until = NULL,
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE id = %s AND locked_by = %s
+                """,
+                (status, error, retry_in, retry_in, job.id, self.worker_id),
+            )
+            await conn.commit()
+
+    async def _heartbeat(self, job: Job):
+        while True:
+            await asyncio.sleep(self.lease.total_seconds() / 3)
+            try:
+                await job.progress()
+            except Exception as e:
+                logging.warning(f"Heartbeat for job {job.id} failed: {e}")
+
+    def _count(self, job: Job, outcome: str):
+        self.stats[outcome] += 1
+        JOBS_TOTAL.labels(kind=job.kind, outcome=outcome).inc()
+
+    async def _fail(self, job: Job, error: str):
+        await self._finish(job, "failed", error)
+        self._count(job, "failed")
+        on_failure = self.failure_handlers.get(job.kind)
+        if on_failure:
+            try:
+                await on_failure(job.payload, job, error)
+            except Exception as e:
+                logging.error(f"❌ Failure hook for job {job.id} ({job.kind}) failed: {e}")
+
+    async def execute(self, job: Job):
+        if job.attempts > job.max_attempts:
+            # Its worker died on the last attempt; the handler never got to clean up
+            await self._fail(job, "lease expired on the final attempt")
+            return
+
+        logging.info(f"🛠️ Job {job.id} ({job.kind}) attempt {job.attempts}/{job.max_attempts} on {self.worker_id}")
+        heartbeat = asyncio.create_task(self._heartbeat(job))
+        try:
+            await self.handlers[job.kind](job.payload, job)
+        except Exception as e:
+            if job.attempts >= job.max_attempts:
+                logging.error(f"❌ Job {job.id} ({job.kind}) failed for good: {e}")
+                await self._fail(job, str(e))
+            else:
+                delay = self._backoff(job.attempts)
+                logging.warning(f"Job {job.id} ({job.kind}) failed, retrying in {delay:.0f}s: {e}")
+                await self._finish(job, "queued", str(e), retry_in=delay)
+                self._count(job, "retried")
+        else:
+            await self._finish(job, "done")
+            self._count(job, "done")
+            logging.info(f"✅ Job {job.id} ({job.kind}) done")
+        finally:
+            heartbeat.cancel()
+
+    async def _listen(self):
+        while not self._stopping.is_set():
+            try:
+                async with await psycopg.AsyncConnection.connect(DB_URL, autocommit=True) as conn:
+                    await conn.execute(f"LISTEN {CHANNEL}")
+                    # Anything queued while we were (re)connecting
+                    self._wake.set()
+                    async for _ in conn.notifies():
+                        self._wake.set()
+            except Exception as e:
+                logging.warning(f"Job listener disconnected ({e}); reconnecting")
+                await asyncio.sleep(self.poll_seconds)
+
+    async def run(self):
+        logging.info(f"🚀 Job worker {self.worker_id} started for {sorted(self.handlers)}")
+        listener = asyncio.create_task(self._listen())
+        slots = asyncio.Semaphore(self.concurrency)
+        running = set()
+
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+            # Claim until the table has nothing ready or every slot is busy
+            while not self._stopping.is_set():
+                await slots.acquire()
+                if self._stopping.is_set():
+                    # stop() came while we waited for a slot
+                    slots.release()
+                    break
+                try:
+                    job = await self.claim()
+                except Exception as e:
+                    logging.error(f"Job claim failed: {e}")
+                    job = None
+                if job is None:
+                    slots.release()
+                    break
+                task = asyncio.create_task(self.execute(job))
+                running.add(task)
+                task.add_done_callback(running.discard)
+                task.add_done_callback(lambda _: slots.release())
+                task.add_done_callback(lambda _: self._wake.set())
+
+        listener.cancel()
+        if running:
+            logging.info(f"Waiting for {len(running)} running job(s) to finish")
+            await asyncio.gather(*running, return_exceptions=True)
+        logging.info(f"🛑 Job worker {self.worker_id} stopped: {self.stats}")
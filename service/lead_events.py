@@ -0,0 +1,135 @@
+import asyncio
+import json
+import logging
+import psycopg
+from database.create_data import get_db_conn
+from database.initdb import DB_URL
+from database.migrations import LEAD_CHANNEL
+
+RESYNC = {"type": "resync"}  # sent when changes may have been missed; the page reloads its rows
+
+
+class LeadEventHub:
+    """
+    Fans lead changes out to live dashboards. One LISTEN connection per
+    process receives the leads trigger's notifications and hands each one
+    to the queues subscribed for that lead's client; the request path does
+    no database work per event. A subscriber that falls queue_size events
+    behind is sent a resync instead of being allowed to grow without bound.
+    """
+
+    def __init__(self, queue_size: int = 100, reconnect_seconds: float = 5):
+        self.queue_size = queue_size
+        self.reconnect_seconds = reconnect_seconds
+        self.subscribers: dict[str, set[asyncio.Queue]] = {}
+        self.stats = {"received": 0, "delivered": 0, "resyncs": 0, "reconnects": 0}
+        self._task: asyncio.Task | None = None
+        self.connected = asyncio.Event()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def subscribe(self, client: str) -> asyncio.Queue:
+        queue = asyncio.Queue(self.queue_size)
+        self.subscribers.setdefault(client, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, client: str, queue: asyncio.Queue):
+        queues = self.subscribers.get(client)
+        if queues:
+            queues.discard(queue)
+            if not queues:
+                del self.subscribers[client]
+
+    def subscriber_count(self) -> int:
+        return sum(len(queues) for queues in self.subscribers.values())
+
+    def metrics(self) -> dict:
+        return dict(self.stats, subscribers=self.subscriber_count())
+
+    def _deliver(self, queue: asyncio.Queue, event: dict):
+        try:
+            queue.put_nowait(event)
+            self.stats["delivered"] += 1
+        except asyncio.QueueFull:
+            # Too far behind to catch up event by event
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(RESYNC)
+            self.stats["resyncs"] += 1
+
+    def publish(self, lead: dict):
+        for queue in list(self.subscribers.get(lead["client"], ())):
+            self._deliver(queue, {"type": "lead", "lead": lead})
+
+    def resync_all(self):
+        for queues in self.subscribers.values():
+            for queue in list(queues):
+                self._deliver(queue, RESYNC)
+
+    async def _fetch(self, partial: dict) -> dict | None:
+        """The full row for a notification that was too big to carry it."""
+        async with get_db_conn() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    """
+                    SELECT id, client, phone_number, username, summary, sentiment_label,
+                           sentiment_score, is_contacted, created_at
+                    FROM leads WHERE id = %s AND created_at = %s
+                    """,
+                    (partial["id"], partial["created_at"]),
+                )
+                row = await cur.fetchone()
+                columns = [column.name for column in cur.description]
+        if row is None:
+            return None
+        lead = dict(zip(columns, row))
+        lead["created_at"] = lead["created_at"].isoformat()
+        return lead
+
+    async def _handle(self, payload: str):
+        self.stats["received"] += 1
+        lead = json.loads(payload)
+        if lead["client"] not in self.subscribers:
+            return
+        if lead.get("partial"):
+            lead = await self._fetch(lead)
+            if lead is None:
+                return
+        self.publish(lead)
+
+    async def _listen(self):
+        while True:
+            try:
+                async with await psycopg.AsyncConnection.connect(DB_URL, autocommit=True) as conn:
+                    await conn.execute(f"LISTEN {LEAD_CHANNEL}")
+                    if self.stats["reconnects"]:
+                        # Changes made while we were disconnected were never delivered
+                        self.resync_all()
+                    self.connected.set()
+                    logging.info("📡 Listening for lead changes")
+                    async for notify in conn.notifies():
+                        try:
+                            await self._handle(notify.payload)
+                        except Exception as e:
+                            logging.warning(f"Bad lead notification: {e}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.warning(f"Lead change listener disconnected ({e}); reconnecting")
+            self.connected.clear()
+            self.stats["reconnects"] += 1
+            await asyncio.sleep(self.reconnect_seconds)
+
+
+hub = LeadEventHub()
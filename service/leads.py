@@ -1,6 +1,7 @@
 import logging
 from datetime import datetime, timezone
 from database.create_data import insert_lead, patch_lead_sentiment # Assuming these exist
+from service.metrics import timed
 
 class LeadService:
     @staticmethod
@@ -12,14 +13,15 @@ class LeadService:
         try:
             logging.info(f"Capturing initial contact for {user_mobile}")
             # Insert with sentiment 0.0 and placeholder summary
-            await insert_lead(
-                client=client,
-                phone_number=user_mobile,
-                username=username,
-                summary="Conversation in progress...",
-                sentiment_label="Neutral",
-                sentiment_score=0.0
-            )
+            with timed("lead_upsert"):
+                await insert_lead(
+                    client=client,
+                    phone_number=user_mobile,
+                    username=username,
+                    summary="Conversation in progress...",
+                    sentiment_label="Neutral",
+                    sentiment_score=0.0
+                )
         except Exception as e:
             logging.error(f"Failed to capture initial lead: {e}")
 
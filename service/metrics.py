@@ -0,0 +1,172 @@
+import time
+from contextlib import contextmanager
+from prometheus_client import REGISTRY, Counter, Histogram
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Tenant (business number) labels are only safe while the set stays small;
+# the webhook is public, so anything past this many goes under "other"
+MAX_TENANT_LABELS = 500
+_tenants: set[str] = set()
+
+
+def tenant_label(business_number: str | None) -> str:
+    if not business_number:
+        return "unknown"
+    if business_number in _tenants:
+        return business_number
+    if len(_tenants) < MAX_TENANT_LABELS:
+        _tenants.add(business_number)
+        return business_number
+    return "other"
+
+
+# -----------------------
+#   Histograms and counters
+# -----------------------
+WEBHOOK_SECONDS = Histogram(
+    "whatsapp_webhook_seconds", "Time to answer one /whatsapp delivery",
+    ["tenant", "outcome"], buckets=LATENCY_BUCKETS,
+)
+STEP_SECONDS = Histogram(
+    "whatsapp_step_seconds",
+    "Time spent in one step of a reply: lead_upsert, embed, vector_query, rerank, "
+    "twilio_send, monitor_enrichment, campaign_select, campaign_personalise, campaign_send, campaign_checkpoint",
+    ["step"], buckets=LATENCY_BUCKETS,
+)
+DB_POOL_WAIT_SECONDS = Histogram(
+    "whatsapp_db_pool_wait_seconds", "Time waiting for a connection from the writer or reader pool",
+    ["pool"], buckets=LATENCY_BUCKETS,
+)
+AGENT_STAGE_SECONDS = Histogram(
+    "whatsapp_agent_stage_seconds", "Time per agent stage (summary and llm are the two LLM calls)",
+    ["graph", "stage", "status"], buckets=LATENCY_BUCKETS,
+)
+INTENT_TOTAL = Counter(
+    "whatsapp_intent_total", "Messages by classified intent and path", ["tenant", "intent", "path"],
+)
+TWILIO_SENDS_TOTAL = Counter(
+    "whatsapp_twilio_sends_total", "Outbound Twilio sends by outcome", ["outcome"],
+)
+JOBS_TOTAL = Counter(
+    "whatsapp_jobs_total", "Background jobs finished by this process: done, retried, failed", ["kind", "outcome"],
+)
+CAMPAIGN_MESSAGES_TOTAL = Counter(
+    "whatsapp_campaign_messages_total",
+    "Campaign messages by outcome (accepted by Twilio, failed, later undelivered) and source (personalised, fallback)", ["outcome", "source"],
+)
+
+
+@contextmanager
+def timed(step: str):
+    """Observe the block's wall time under whatsapp_step_seconds{step}."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        STEP_SECONDS.labels(step=step).observe(time.perf_counter() - started)
+
+
+# -----------------------
+#   Scrape-time stats
+# -----------------------
+class RuntimeCollector:
+    """
+    Exposes stats that components already keep (admission queues, webhook
+    dedup, LLM gateway, DB pools, live dashboard events). Each source is a zero-argument function
+    returning its stats dict, or None while the component isn't up.
+    """
+
+    def __init__(self):
+        self.sources = {}
+
+    def track(self, **sources):
+        self.sources.update(sources)
+
+    def _read(self, name: str):
+        source = self.sources.get(name)
+        return source() if source else None
+
+    def collect(self):
+        admission = self._read("admission")
+        if admission:
+            queued = GaugeMetricFamily("whatsapp_admission_queued", "Messages waiting for an agent slot", labels=["tenant"])
+            running = GaugeMetricFamily("whatsapp_admission_running", "Agent runs in flight", labels=["tenant"])
+            admitted = CounterMetricFamily("whatsapp_admission_admitted", "Messages admitted", labels=["tenant"])
+            shed = CounterMetricFamily("whatsapp_admission_shed", "Messages shed with the busy reply", labels=["tenant"])
+            wait = GaugeMetricFamily("whatsapp_admission_wait_p95_seconds", "Recent p95 queue wait", labels=["tenant"])
+            # Tenants past the label cap are summed under "other"
+            by_label = {}
+            for tenant, stats in admission["tenants"].items():
+                totals = by_label.setdefault(tenant_label(tenant), dict.fromkeys(stats, 0))
+                for key, value in stats.items():
+                    totals[key] = max(totals[key], value) if key.startswith("wait") else totals[key] + value
+            for label, stats in by_label.items():
+                queued.add_metric([label], stats["queued"])
+                running.add_metric([label], stats["running"])
+                admitted.add_metric([label], stats["admitted"])
+                shed.add_metric([label], stats["shed"])
+                wait.add_metric([label], stats["wait_p95_s"])
+            yield from (queued, running, admitted, shed, wait)
+
+        dedup = self._read("deduplicator")
+        if dedup:
+            deliveries = CounterMetricFamily("whatsapp_webhook_deliveries", "Webhook deliveries by dedup result", labels=["result"])
+            for result, count in dedup.items():
+                deliveries.add_metric([result], count)
+            yield deliveries
+
+        gateway = self._read("llm_gateway")
+        if gateway:
+            yield CounterMetricFamily("whatsapp_llm_hedges", "Hedged LLM requests", value=gateway["hedges"])
+            yield CounterMetricFamily("whatsapp_llm_deadline_exceeded", "LLM calls past their deadline",
+                                      value=gateway["deadline_exceeded"])
+            calls = CounterMetricFamily("whatsapp_llm_provider_calls", "LLM provider calls", labels=["provider"])
+            failures = CounterMetricFamily("whatsapp_llm_provider_failures", "LLM provider failures", labels=["provider"])
+            breaker = GaugeMetricFamily("whatsapp_llm_breaker_open", "1 while a provider's breaker is not closed",
+                                        labels=["provider"])
+            for name, stats in gateway["providers"].items():
+                calls.add_metric([name], stats["calls"])
+                failures.add_metric([name], stats["failures"])
+                breaker.add_metric([name], 0 if stats["state"] == "closed" else 1)
+            yield from (calls, failures, breaker)
+
+        pools = self._read("db_pool")
+        if pools:
+            size = GaugeMetricFamily("whatsapp_db_pool_size", "Open connections", labels=["pool"])
+            available = GaugeMetricFamily("whatsapp_db_pool_available", "Idle connections", labels=["pool"])
+            saturation = GaugeMetricFamily("whatsapp_db_pool_saturation", "Connections in use / max_size",
+                                           labels=["pool"])
+            waiting = GaugeMetricFamily("whatsapp_db_pool_waiting", "Requests waiting for a connection", labels=["pool"])
+            requests = CounterMetricFamily("whatsapp_db_pool_requests", "Connection requests", labels=["pool"])
+            queued = CounterMetricFamily("whatsapp_db_pool_queued", "Connection requests that had to wait",
+                                         labels=["pool"])
+            errors = CounterMetricFamily("whatsapp_db_pool_errors", "Connection requests that failed or timed out",
+                                         labels=["pool"])
+            for name, pool in pools.items():
+                in_use = pool.get("pool_size", 0) - pool.get("pool_available", 0)
+                size.add_metric([name], pool.get("pool_size", 0))
+                available.add_metric([name], pool.get("pool_available", 0))
+                saturation.add_metric([name], in_use / pool["pool_max"] if pool.get("pool_max") else 0)
+                waiting.add_metric([name], pool.get("requests_waiting", 0))
+                requests.add_metric([name], pool.get("requests_num", 0))
+                queued.add_metric([name], pool.get("requests_queued", 0))
+                errors.add_metric([name], pool.get("requests_errors", 0))
+            # Wait time is the whatsapp_db_pool_wait_seconds histogram
+            yield from (size, available, saturation, waiting, requests, queued, errors)
+
+        events = self._read("lead_events")
+        if events:
+            yield GaugeMetricFamily("whatsapp_dashboard_subscribers", "Open live dashboard streams",
+                                    value=events["subscribers"])
+            yield CounterMetricFamily("whatsapp_lead_events_received", "Lead change notifications received",
+                                      value=events["received"])
+            yield CounterMetricFamily("whatsapp_lead_events_delivered", "Lead events queued to dashboards",
+                                      value=events["delivered"])
+            yield CounterMetricFamily("whatsapp_lead_events_resyncs", "Dashboards told to reload after falling behind "
+                                      "or a listener reconnect", value=events["resyncs"])
+
+
+runtime = RuntimeCollector()
+REGISTRY.register(runtime)
@@ -0,0 +1,55 @@
+import logging
+import yaml
+from database.create_data import get_db_conn
+from database.initdb import LEAD_PARTITIONS_AHEAD
+from database.migrations import MIGRATIONS_LOCK
+from database.partitions import archive_lead_partitions, ensure_lead_partitions
+from service.jobs import enqueue_job
+
+LEAD_MAINTENANCE_JOB = "lead_maintenance"
+_retention_settings = None
+
+
+def get_retention_settings() -> dict:
+    global _retention_settings
+    if _retention_settings is None:
+        with open("config.yaml", "r") as file:
+            _retention_settings = yaml.safe_load(file).get("lead_retention") or {}
+    return _retention_settings
+
+
+async def run_lead_maintenance() -> dict:
+    """
+    Create the coming months' lead partitions and archive (or drop) the
+    ones past lead_retention.months. Both are metadata-only; DETACH holds
+    a brief exclusive lock on leads. Holds the migrations lock, so starting
+    replicas don't race it to create the same partition.
+    """
+    settings = get_retention_settings()
+    try:
+        async with get_db_conn() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("SELECT pg_advisory_xact_lock(%s)", (MIGRATIONS_LOCK,))
+                created = await ensure_lead_partitions(cur, months_ahead=LEAD_PARTITIONS_AHEAD)
+                archived = []
+                if settings.get("months"):
+                    archived = await archive_lead_partitions(
+                        cur, settings["months"], settings.get("archive_schema", "leads_archive"),
+                    )
+            await conn.commit()
+        return {"created": created, "archived": archived}
+    except Exception as e:
+        logging.error(f"❌ Lead maintenance failed: {e}")
+        raise
+
+
+async def schedule_lead_maintenance(delay: float = 0):
+    """Queue the next maintenance run unless one is already waiting."""
+    await enqueue_job(LEAD_MAINTENANCE_JOB, {}, delay=delay, unique=True)
+
+
+async def lead_maintenance_job(payload: dict, job):
+    """Job handler for LEAD_MAINTENANCE_JOB; reschedules itself."""
+    result = await run_lead_maintenance()
+    await job.progress(**result)
+    await schedule_lead_maintenance(delay=get_retention_settings().get("interval_hours", 24) * 3600)
@@ -0,0 +1,208 @@
+import json
+import logging
+import os
+import socket
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+from database.create_data import get_db_conn, patch_lead_sentiment
+
+
+@dataclass
+class Session:
+    user_phone: str
+    client: str | None
+    username: str | None
+    messages: list[BaseMessage]
+    version: int  # bumped on every turn; enrichment only counts for the version it read
+
+
+def to_records(messages: list[BaseMessage]) -> list[dict]:
+    return [
+        {"role": "ai" if isinstance(message, AIMessage) else "human", "content": str(message.content)}
+        for message in messages
+    ]
+
+
+def from_records(records: list[dict]) -> list[BaseMessage]:
+    return [
+        AIMessage(content=record["content"]) if record["role"] == "ai" else HumanMessage(content=record["content"])
+        for record in records
+    ]
+
+
+# -----------------------
+#   In-process store
+# -----------------------
+class MemorySessionStore:
+    """
+    Sessions in this process only (the single-worker default). Every
+    process running it has its own monitor, so don't use it with
+    --workers N or several replicas.
+    """
+
+    def __init__(self, max_messages: int = 50):
+        self.max_messages = max_messages
+        self.sessions: dict[str, dict] = {}
+
+    async def load_messages(self, user_phone: str) -> list[BaseMessage]:
+        session = self.sessions.get(user_phone)
+        return list(session["messages"]) if session else []
+
+    async def record_turn(self, user_phone: str, client: str, username: str, messages: list[BaseMessage]):
+        session = self.sessions.setdefault(user_phone, {"messages": [], "version": 0, "enriched_version": 0})
+        session.update(client=client, username=username, last_active=datetime.now(timezone.utc))
+        session["messages"] = (session["messages"] + list(messages))[-self.max_messages:]
+        session["version"] += 1
+
+    async def claim_idle(self, idle: timedelta, limit: int) -> list[Session]:
+        now = datetime.now(timezone.utc)
+        due = [
+            Session(phone, s["client"], s["username"], list(s["messages"]), s["version"])
+            for phone, s in self.sessions.items()
+            if s["version"] > s["enriched_version"] and now - s["last_active"] > idle
+        ]
+        return due[:limit]
+
+    async def complete(self, session: Session, summary: str, label: str, score: float) -> bool:
+        await patch_lead_sentiment(
+            phone_number=session.user_phone, summary=summary, sentiment_label=label, sentiment_score=score,
+        )
+        self.sessions[session.user_phone]["enriched_version"] = session.version
+        return True
+
+
+# -----------------------
+#   Shared store
+# -----------------------
+class PostgresSessionStore:
+    """
+    Sessions in Postgres, shared by every worker and replica. Idle sessions
+    are claimed with SELECT ... FOR UPDATE SKIP LOCKED and a time-limited
+    lease, so concurrent monitors split the work instead of repeating it.
+    The lead patch and the lease release commit together, and only while
+    this worker still holds the lease, so each burst of activity is
+    written back exactly once.
+    """
+
+    def __init__(self, max_messages: int = 50, lease_seconds: float = 120, owner: str | None = None):
+        self.max_messages = max_messages
+        self.lease_seconds = lease_seconds
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+    async def load_messages(self, user_phone: str) -> list[BaseMessage]:
+        async with get_db_conn() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    "SELECT messages FROM conversation_sessions WHERE user_phone = %s",
+                    (user_phone,),
+                )
+                row = await cur.fetchone()
+        return from_records(row[0]) if row else []
+
+    async def record_turn(self, user_phone: str, client: str, username: str, messages: list[BaseMessage]):
+        try:
+            async with get_db_conn() as conn:
+                async with conn.cursor() as cur:
+                    # Append and keep the last max_messages
+                    await cur.execute(
+                        """
+                        INSERT INTO conversation_sessions (user_phone, client, username, messages, last_active, version)
+                        VALUES (%(phone)s, %(client)s, %(username)s, %(messages)s::jsonb, CURRENT_TIMESTAMP, 1)
+                        ON CONFLICT (user_phone) DO UPDATE SET
+                            client = EXCLUDED.client,
+                            username = EXCLUDED.username,
+                            messages = jsonb_path_query_array(
+                                conversation_sessions.messages || EXCLUDED.messages,
+                                ('$[last - ' || %(keep)s || ' to last]')::jsonpath
+                            ),
+                            last_active = CURRENT_TIMESTAMP,
+                            version = conversation_sessions.version + 1
+                        """,
+                        {
+                            "phone": user_phone,
+                            "client": client,
+                            "username": username,
+                            "messages": json.dumps(to_records(messages)),
+                            "keep": self.max_messages - 1,
+                        },
+                    )
+                await conn.commit()
+        except Exception as e:
+            logging.error(f"❌ Failed to record session for {user_phone}: {e}")
+            raise
+
+    async def claim_idle(self, idle: timedelta, limit: int) -> list[Session]:
+        async with get_db_conn() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    """
+                    WITH due AS (
+                        SELECT user_phone
+                        FROM conversation_sessions
+                        WHERE version > enriched_version
+                          AND last_active < CURRENT_TIMESTAMP - %(idle)s
+                          AND (lease_expires_at IS NULL OR lease_expires_at < CURRENT_TIMESTAMP)
+                        ORDER BY last_active
+                        LIMIT %(limit)s
+                        FOR UPDATE SKIP LOCKED
+                    )
+                    UPDATE conversation_sessions s
+                    SET lease_owner = %(owner)s,
+                        lease_expires_at = CURRENT_TIMESTAMP + %(lease)s
+                    FROM due
+                    WHERE s.user_phone = due.user_phone
+                    RETURNING s.user_phone, s.client, s.username, s.messages, s.version
+                    """,
+                    {
+                        "idle": idle,
+                        "limit": limit,
+                        "owner": self.owner,
+                        "lease": timedelta(seconds=self.lease_seconds),
+                    },
+                )
+                rows = await cur.fetchall()
+            await conn.commit()
+        return [Session(phone, client, username, from_records(messages), version)
+                for phone, client, username, messages, version in rows]
+
+    async def complete(self, session: Session, summary: str, label: str, score: float) -> bool:
+        """
+        Patch the lead and release the lease in one transaction; False if
+        the lease expired and another worker has taken the session over.
+        """
+        async with get_db_conn() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    """
+                    UPDATE conversation_sessions
+                    SET enriched_version = %s, lease_owner = NULL, lease_expires_at = NULL
+                    WHERE user_phone = %s AND lease_owner = %s
+                    """,
+                    (session.version, session.user_phone, self.owner),
+                )
+                if cur.rowcount == 0:
+                    await conn.rollback()
+                    logging.warning(f"Lease on {session.user_phone} lost before enrichment finished; discarding")
+                    return False
+                await cur.execute(
+                    """
+                    UPDATE leads
+                    SET summary = %s, sentiment_label = %s, sentiment_score = %s
+                    WHERE (id, created_at) = (
+                        SELECT lead_id, created_at FROM lead_phones WHERE phone_number = %s
+                    )
+                    """,
+                    (summary, label, score, session.user_phone),
+                )
+            await conn.commit()
+        return True
+
+
+def create_session_store(config: dict):
+    settings = config.get("sessions") or {}
+    max_messages = settings.get("max_messages", 50)
+    if settings.get("backend", "memory") == "postgres":
+        return PostgresSessionStore(max_messages, settings.get("lease_seconds", 120))
+    return MemorySessionStore(max_messages)
@@ -1,11 +1,13 @@
+import asyncio
 import logging
 from database import initdb  
-from database.create_data import insert_customers
+from database.create_data import insert_customers, upsert_onboarding_status
+from service.jobs import enqueue_job
 from service.security import hash_password
-from scrape.scrape import crawl_website
-from rag.ingest import RagIngest
 
-async def register_new_customer(phone, password, url, location, background_tasks):
+ONBOARDING_JOB = "onboarding"
+
+async def register_new_customer(phone, password, url, location):
     # 1. Validation
     if len(phone) < 12 or not phone.startswith("+") or not phone[-10:].isdigit():
         raise ValueError("Invalid phone number format. Use +1234567890")
@@ -18,8 +20,9 @@ async def register_new_customer(phone, password, url, location, background_tasks
         await insert_customers(phone, hashed_pw, url, location)
         logging.info(f"✅ Customer {phone} saved to DB.")
 
-        # 3. Schedule Heavy Tasks
-        background_tasks.add_task(run_onboarding_sequence, url, phone)
+        # 3. Queue the heavy tasks for a job worker (python -m service.worker)
+        await upsert_onboarding_status(phone, "queued")
+        await enqueue_job(ONBOARDING_JOB, {"url": url, "phone": phone})
         
         return {
             "status": "success", 
@@ -35,20 +38,68 @@ async def register_new_customer(phone, password, url, location, background_tasks
         logging.error(f"Service Layer Error during signup for {phone}: {e}")
         raise
         
-async def run_onboarding_sequence(url: str, phone: str):
+async def run_onboarding_sequence(url: str, phone: str, progress=None):
     """
     Orchestrates the background tasks in a specific order.
+    Progress is recorded in onboarding_status for the dashboard and, when
+    run as a job, passed to the job's progress callback. Errors are
+    recorded and re-raised so the job is retried.
     """
+    loop = asyncio.get_running_loop()
+    last_progress = {"files_done": 0, "files_total": 0}
+
+    def report_progress(files_done: int, files_total: int, chunks_written: int):
+        last_progress.update(files_done=files_done, files_total=files_total)
+        # Called from the ingest thread; hand the DB write back to the event loop
+        async def record():
+            await upsert_onboarding_status(phone, "ingesting", files_done, files_total, chunks_written)
+            if progress:
+                await progress(stage="ingesting", files_done=files_done, files_total=files_total,
+                               chunks_written=chunks_written)
+
+        future = asyncio.run_coroutine_threadsafe(record(), loop)
+        try:
+            future.result(timeout=30)
+        except Exception as e:
+            logging.warning(f"Could not record onboarding progress for {phone}: {e}")
+
     try:
         # Step 1: Wait for scraping to finish
         logging.info(f"Starting crawl for {url}...")
+        await upsert_onboarding_status(phone, "crawling")
+        if progress:
+            await progress(stage="crawling")
+        # from scrape.scrape import crawl_website  (playwright; imported only when crawling)
         #await crawl_website(url, phone, max_pages=1000)
         
         # Step 2: Only start RAG once scraping is 100% done
         logging.info(f"Crawl complete. Starting RAG for {phone}...")
-        rag_ingest = RagIngest()
-        await rag_ingest.ingest_directory(phone)
+        await upsert_onboarding_status(phone, "ingesting")
+
+        # Chunking and embedding are CPU bound; keep them off the event loop
+        def ingest():
+            from rag.ingest import RagIngest
+            rag_ingest = RagIngest()
+            return rag_ingest.ingest_directory(phone, progress=report_progress)
+
+        chunks_written = await asyncio.to_thread(ingest)
     
+        await upsert_onboarding_status(phone, "done", chunks_written=chunks_written, **last_progress)
         logging.info(f"Onboarding sequence finished for {phone}")
     except Exception as e:
-        logging.error(f"Background Sequence Error for {phone}: {e}")
\ No newline at end of file
+        logging.error(f"Background Sequence Error for {phone}: {e}")
+        try:
+            await upsert_onboarding_status(phone, "failed", error=str(e))
+        except Exception:
+            pass
+        raise
+
+
+async def onboarding_job(payload: dict, job):
+    """Job handler for ONBOARDING_JOB."""
+    await run_onboarding_sequence(payload["url"], payload["phone"], progress=job.progress)
+
+
+async def onboarding_failed(payload: dict, job, error: str):
+    """Final-failure hook for ONBOARDING_JOB: a dead worker leaves the status at crawling/ingesting."""
+    await upsert_onboarding_status(payload["phone"], "failed", error=error)
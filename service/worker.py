@@ -0,0 +1,92 @@
+"""
+Job worker: runs queued background jobs (website onboarding, lead
+partition maintenance, follow-up campaigns) outside the web process, so
+crawling, embedding and bulk sends don't compete with replies.
+
+    python -m service.worker [--concurrency N]
+
+Run as many as there are cores/hosts to spare; they share the jobs table.
+SIGTERM/SIGINT finish the running jobs and exit.
+
+Onboarding writes chunks into the vector store, so only a store every
+process shares (vectorstore.type: pgvector) lets it run here. With
+Chroma or NumPy the files, and the collections cached over them, belong
+to the web process, which then onboards in its embedded worker
+(jobs.embedded_worker: auto) and this worker leaves those jobs alone.
+"""
+import argparse
+import asyncio
+import logging
+import signal
+import yaml
+from client.twilio_client import close_twilio_client
+from database.initdb import close_pool, init_db, init_pool
+from rag.vectorstore import is_shared_store
+from service.campaigns import CAMPAIGN_JOB, campaign_failed, campaign_job
+from service.jobs import JobWorker, get_job_settings
+from service.retention import LEAD_MAINTENANCE_JOB, lead_maintenance_job, schedule_lead_maintenance
+from service.signup import ONBOARDING_JOB, onboarding_failed, onboarding_job
+
+HANDLERS = {
+    ONBOARDING_JOB: onboarding_job,
+    LEAD_MAINTENANCE_JOB: lead_maintenance_job,
+    CAMPAIGN_JOB: campaign_job,
+}
+
+# Called once a job has failed for good, including when its worker died mid-run
+FAILURE_HANDLERS = {
+    ONBOARDING_JOB: onboarding_failed,
+    CAMPAIGN_JOB: campaign_failed,
+}
+
+
+def standalone_handlers(config: dict) -> dict:
+    """The jobs a worker outside the web process may run."""
+    if is_shared_store(config):
+        return HANDLERS
+    logging.warning(
+        f"vectorstore.type '{config['vectorstore'].get('type', 'chroma')}' is local to the web process; "
+        f"leaving {ONBOARDING_JOB} jobs to its embedded worker"
+    )
+    return {kind: handler for kind, handler in HANDLERS.items() if kind != ONBOARDING_JOB}
+
+
+def embedded_worker_enabled(config: dict) -> bool:
+    """
+    jobs.embedded_worker: true, false or "auto" (run in the web process
+    unless the vector store is shared, since onboarding must write where
+    the web process reads).
+    """
+    embedded = (config.get("jobs") or {}).get("embedded_worker", "auto")
+    if embedded == "auto":
+        return not is_shared_store(config)
+    return bool(embedded)
+
+
+async def main(concurrency: int | None = None):
+    with open("config.yaml", "r") as file:
+        config = yaml.safe_load(file)
+    settings = dict(get_job_settings())
+    if concurrency:
+        settings["concurrency"] = concurrency
+
+    await init_pool()
+    await init_db()
+    await schedule_lead_maintenance()
+    worker = JobWorker(standalone_handlers(config), settings, failure_handlers=FAILURE_HANDLERS)
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, worker.stop)
+    try:
+        await worker.run()
+    finally:
+        await close_twilio_client()
+        await close_pool()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, help="jobs run at once (default: jobs.concurrency)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    asyncio.run(main(args.concurrency))